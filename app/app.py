@@ -1,12 +1,205 @@
+import argparse
 import sys
+from contextlib import contextmanager
+from datetime import date, datetime
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
 
-from app.data_parser.parser import main_parser
-from app.data_digest.digest import main_digest
+# тяжёлые зависимости (requests, pandas, folium, geopy) импортируются только в нужной подкоманде:
+# запуск из cron не должен платить за импорт того, что ему не нужно
 
-def main():
+
+def _date(value: str) -> str:
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Дата должна быть в формате YYYY-MM-DD: {value}")
+
+
+def _hour(value: str) -> int:
+    try:
+        hour = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Час должен быть числом: {value}")
+    if not 0 <= hour <= 23:
+        raise argparse.ArgumentTypeError("Час должен быть в диапазоне от 0 до 23")
+    return hour
+
+
+def _airports(value: str) -> list:
+    codes = [code.strip().upper() for code in value.split(",") if code.strip()]
+    invalid = [code for code in codes if len(code) != 3]
+    if invalid:
+        raise argparse.ArgumentTypeError(f"Коды аэропортов IATA из трёх букв: {', '.join(invalid)}")
+    return codes
+
+
+def _optional_limit(value: str):
+    # 0 — без ограничения
+    limit = int(value)
+    return None if limit <= 0 else limit
+
+
+def run_parse(args):
+    from app.data_parser.parser import main_parser
+
+    main_parser(
+        args.date_from,
+        args.date_to,
+        args.hour,
+        max_workers=args.workers,
+        max_per_host=args.max_per_host,
+        page_size=args.page_size,
+        max_pages=args.max_pages,
+        mode=args.mode,
+        use_response_cache=not args.no_cache,
+        incremental=not args.full_reports,
+        partitioning=args.partitioning,
+        retention_periods=args.retention_periods,
+        retention_action=args.retention_action,
+        airports=args.airports,
+    )
+
+
+def run_report(args):
+    from app.data_parser.parser import main_report
+
+    main_report(args.date_from, args.date_to, hours=args.hours, airports=args.airports,
+                from_archive=args.from_archive, archive_dir=args.archive_dir, output_dir=args.output_dir)
+
+
+def run_digest(args):
+    from app.data_digest.digest import main_digest
+
+    main_digest(
+        render_mode=args.render_mode,
+        use_sidecar=args.sidecar,
+        days=args.days,
+        max_rows=args.max_rows,
+        incremental=args.incremental,
+        open_browser=not args.no_browser,
+        from_archive=args.from_archive,
+        archive_dir=args.archive_dir,
+    )
+
+
+def run_daemon(args):
+    from app.data_parser.daemon import main_daemon
+
+    main_daemon(
+        airports=args.airports,
+        max_workers=args.workers,
+        page_size=args.page_size,
+        max_pages=args.max_pages,
+        mode=args.mode,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        report_interval=args.report_interval,
+        partitioning=args.partitioning,
+    )
+
+
+def run_archive(args):
+    from app.data_archive.archive import main_archive
+
+    main_archive(args.date_from, args.date_to, archive_dir=args.archive_dir)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    today = date.today().isoformat()
+    arg_parser = argparse.ArgumentParser(prog="app", description="Парсер рейсов FR24, сводки и карта рейсов")
+    arg_parser.add_argument("--metrics-file", default=None, help="записать метрики в формате Prometheus (textfile)")
+    arg_parser.add_argument("--metrics-json", default=None, help="записать сводку метрик в JSON")
+    arg_parser.add_argument("--metrics-port", type=int, default=None, help="отдавать метрики по HTTP на /metrics")
+    arg_parser.add_argument("--profile", choices=("cprofile", "sample"), default=None,
+                            help="профилировать запуск; sample видит и потоки воркеров")
+    arg_parser.add_argument("--profile-output", default=None, help="файл .prof (cprofile) или свёрнутых стеков (sample)")
+    commands = arg_parser.add_subparsers(dest="command")
+
+    parse = commands.add_parser("parse", help="загрузить расписание аэропортов и обновить сводки")
+    parse.add_argument("--date-from", type=_date, default=today, help="начало окна сводок, YYYY-MM-DD")
+    parse.add_argument("--date-to", type=_date, default=today, help="конец окна сводок, YYYY-MM-DD")
+    parse.add_argument("--hour", type=_hour, default=datetime.now().hour, help="час почасовой сводки (0–23)")
+    parse.add_argument("--airports", type=_airports, default=None, help="коды IATA через запятую")
+    parse.add_argument("--workers", type=int, default=8, help="число параллельных аэропортов")
+    parse.add_argument("--max-per-host", type=int, default=4, help="одновременных запросов к FR24")
+    parse.add_argument("--page-size", type=int, default=20)
+    parse.add_argument("--max-pages", type=_optional_limit, default=1, help="страниц на аэропорт, 0 — все")
+    parse.add_argument("--mode", choices=("arrivals", "departures", "both"), default="arrivals")
+    parse.add_argument("--no-cache", action="store_true", help="не использовать кэш ответов FR24")
+    parse.add_argument("--full-reports", action="store_true", help="пересчитать сводки за всё окно")
+    parse.add_argument("--partitioning", choices=("day", "month"), default=None)
+    parse.add_argument("--retention-periods", type=int, default=None)
+    parse.add_argument("--retention-action", choices=("detach", "drop"), default="detach")
+    parse.set_defaults(handler=run_parse)
+
+    report = commands.add_parser("report", help="пересчитать дневную и почасовую сводки без парсинга")
+    report.add_argument("--date-from", type=_date, default=today)
+    report.add_argument("--date-to", type=_date, default=today)
+    report.add_argument("--hours", type=_hour, nargs="+", default=None, help="часы почасовой сводки, по умолчанию все")
+    report.add_argument("--airports", type=_airports, default=None)
+    report.add_argument("--from-archive", action="store_true", help="считать по Parquet-архиву, а не по flights")
+    report.add_argument("--archive-dir", default=None, help="каталог архива (по умолчанию app/data_archive/flights_archive)")
+    report.add_argument("--output-dir", default=None, help="записать сводки в CSV вместо таблиц сводок")
+    report.set_defaults(handler=run_report)
+
+    digest = commands.add_parser("digest", help="сгенерировать HTML-карту рейсов")
+    digest.add_argument("--render-mode", choices=("polyline", "geojson"), default="polyline")
+    digest.add_argument("--sidecar", action="store_true", help="маршруты в отдельном GeoJSON-файле (geojson)")
+    digest.add_argument("--days", type=float, default=7, help="окно рейсов в днях")
+    digest.add_argument("--max-rows", type=_optional_limit, default=1000, help="лимит рейсов, 0 — без лимита")
+    digest.add_argument("--incremental", action="store_true", help="обновить карту только по изменившимся рейсам")
+    digest.add_argument("--no-browser", action="store_true", help="не открывать карту в браузере")
+    digest.add_argument("--from-archive", action="store_true", help="брать рейсы из Parquet-архива")
+    digest.add_argument("--archive-dir", default=None)
+    digest.set_defaults(handler=run_digest)
+
+    daemon = commands.add_parser("daemon", help="непрерывно опрашивать аэропорты с адаптивными интервалами")
+    daemon.add_argument("--airports", type=_airports, default=None)
+    daemon.add_argument("--workers", type=int, default=4)
+    daemon.add_argument("--page-size", type=int, default=100)
+    daemon.add_argument("--max-pages", type=_optional_limit, default=0, help="страниц на аэропорт, 0 — все")
+    daemon.add_argument("--mode", choices=("arrivals", "departures", "both"), default="both")
+    daemon.add_argument("--min-interval", type=float, default=60, help="минимальный интервал опроса, с")
+    daemon.add_argument("--max-interval", type=float, default=1800, help="максимальный интервал опроса, с")
+    daemon.add_argument("--report-interval", type=float, default=300, help="как часто пересчитывать сводки, с")
+    daemon.add_argument("--partitioning", choices=("day", "month"), default=None)
+    daemon.set_defaults(handler=run_daemon)
+
+    archive = commands.add_parser("archive", help="выгрузить рейсы в Parquet-архив по дням")
+    archive.add_argument("--date-from", type=_date, default=None, help="без дат — только изменившиеся дни")
+    archive.add_argument("--date-to", type=_date, default=None)
+    archive.add_argument("--archive-dir", default=None)
+    archive.set_defaults(handler=run_archive)
+
+    return arg_parser
+
+
+@contextmanager
+def instrumentation(args):
+    collect = args.metrics_file or args.metrics_json or args.metrics_port is not None
+    if not collect and not args.profile:
+        yield
+        return
+
+    from app.metrics import metrics, profile
+
+    if collect:
+        metrics.configure(prometheus_file=args.metrics_file, json_file=args.metrics_json, port=args.metrics_port)
+    try:
+        if args.profile:
+            with profile(args.profile, args.profile_output):
+                yield
+        else:
+            yield
+    finally:
+        if collect:
+            metrics.log_summary()
+            metrics.flush()
+
+
+def interactive():
     print("\nВыберите действие:")
     print("1. Запустить парсер рейсов")
     print("2. Сгенерировать HTML-карту и метрики")
@@ -25,12 +218,32 @@ def main():
             print(f"Ошибка: {ve}")
             return
 
+        from app.data_parser.parser import main_parser
+
         # передаём параметры в main_parser
         main_parser(date_from, date_to, hour)
     elif choice == "2":
+        from app.data_digest.digest import main_digest
+
         main_digest()
     else:
         print("Неверный выбор")
 
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # без аргументов — прежнее интерактивное меню
+    if not argv:
+        interactive()
+        return
+
+    args = build_arg_parser().parse_args(argv)
+    if args.command is None:
+        build_arg_parser().print_help()
+        return
+    with instrumentation(args):
+        args.handler(args)
+
+
 if __name__ == "__main__":
     main()
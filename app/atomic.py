@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+import os
+import tempfile
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w", encoding: Optional[str] = None,
+                 newline: Optional[str] = None) -> Iterator[IO]:
+    # пишем во временный файл рядом с целевым и подменяем его через os.replace: читатель (карта, node_exporter,
+    # следующий запуск) видит либо старый файл, либо новый целиком. При ошибке временный файл удаляется
+    if "b" not in mode and encoding is None:
+        encoding = "utf-8"
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, mode, encoding=encoding, newline=newline) as f:
+            yield f
+        # mkstemp создаёт файл с правами 0600 — оставляем права прежнего файла, новому даём обычные 0644
+        try:
+            permissions = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            permissions = 0o644
+        os.chmod(tmp_path, permissions)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,24 +1,41 @@
 # reports.py
-import psycopg2
-from typing import List, Tuple
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+from ..data_parser.pool import ConnectionPool, get_pool
+from .queries import AIRPORT_FLIGHTS_SQL
+from ..metrics import metrics
 import logging
 
+if TYPE_CHECKING:
+    from ..data_archive.archive import FlightArchive
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class FlightReport:
-    def __init__(self, db_config: dict):
+    def __init__(self, db_config: dict, pool: Optional[ConnectionPool] = None,
+                 archive: Optional["FlightArchive"] = None):
         self.db_config = db_config
+        self.pool = pool or get_pool(db_config)
+        # с архивом сводка считается по Parquet, Postgres для чтения не нужен
+        self.archive = archive
 
     def _get_connection(self):
         try:
-            return psycopg2.connect(**self.db_config, connect_timeout=5)
+            return self.pool.getconn()
         except Exception as e:
             logger.error(f"Connection error: {e}")
             return None
 
+    def _release_connection(self, conn):
+        self.pool.putconn(conn)
+
+    @metrics.timed("report_query", report="daily", op="select")
     def get_flight_summary(self, icao_codes: List[str], date_from: str, date_to: str) -> List[Tuple]:
+        if self.archive is not None:
+            return self._summary_from_archive(icao_codes, date_from, date_to)
+
         query = """
             SELECT
                 date_trunc('day', scheduled_time) AS flight_day,
@@ -46,17 +63,42 @@ class FlightReport:
             logger.error(f"Query failed: {e}")
             return []
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    def _summary_from_archive(self, icao_codes: List[str], date_from: str, date_to: str) -> List[Tuple]:
+        from ..data_archive.archive import count_by_bucket
+
+        try:
+            # границы как у BETWEEN в SQL-варианте
+            flights = self.archive.read(["scheduled_time", "airline", "aircraft_model"],
+                                        since=datetime.fromisoformat(str(date_from)),
+                                        until=datetime.fromisoformat(str(date_to)),
+                                        airports=icao_codes, until_inclusive=True)
+            summary = count_by_bucket(flights, "D").sort_values(
+                ["total_flights", "bucket", "airline", "aircraft_model"],
+                ascending=[False, True, True, True], kind="stable")
+            result = [(bucket.to_pydatetime(), airline, model, int(total))
+                      for bucket, airline, model, total in summary.itertuples(index=False)]
+            logger.info(f"Retrieved {len(result)} rows from archive report")
+            return result
+        except Exception as e:
+            logger.error(f"Archive query failed: {e}")
+            return []
 
+    @metrics.timed("report_query", report="daily", op="save")
     def save_summary_to_db(self, summary: List[Tuple]):
         insert_query = """
             INSERT INTO daily_flight_summary (flight_day, airline, aircraft_model, total_flights)
             VALUES (%s, %s, %s, %s)
-            ON CONFLICT DO NOTHING;
+            ON CONFLICT (flight_day, airline, aircraft_model)
+            DO UPDATE SET total_flights = EXCLUDED.total_flights, created_at = CURRENT_TIMESTAMP;
         """
 
+        if not summary:
+            return
+
         conn = self._get_connection()
-        if not conn or not summary:
+        if not conn:
             return
 
         try:
@@ -68,4 +110,98 @@ class FlightReport:
             logger.error(f"Insert failed: {e}")
             conn.rollback()
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    @metrics.timed("report_query", report="daily", op="refresh")
+    def refresh_days(self, days: Iterable[date], icao_codes: List[str]) -> int:
+        # пересчитываем только затронутые дни: стоимость зависит от объёма новых данных, а не от всей истории
+        days = sorted(set(days))
+        if not days:
+            return 0
+
+        query = f"""
+            WITH matched AS ({AIRPORT_FLIGHTS_SQL}),
+            fresh AS (
+                SELECT
+                    scheduled_time::date AS flight_day,
+                    COALESCE(NULLIF(TRIM(airline), ''), 'Unknown Airline') AS airline,
+                    COALESCE(NULLIF(TRIM(aircraft_model), ''), 'Unknown Model') AS aircraft_model,
+                    COUNT(*) AS total_flights
+                FROM matched
+                WHERE scheduled_time::date = ANY(%(days)s)
+                GROUP BY 1, 2, 3
+            ),
+            upserted AS (
+                INSERT INTO daily_flight_summary (flight_day, airline, aircraft_model, total_flights)
+                SELECT flight_day, airline, aircraft_model, total_flights FROM fresh
+                ON CONFLICT (flight_day, airline, aircraft_model)
+                DO UPDATE SET total_flights = EXCLUDED.total_flights, created_at = CURRENT_TIMESTAMP
+                WHERE daily_flight_summary.total_flights <> EXCLUDED.total_flights
+                RETURNING 1
+            ),
+            removed AS (
+                DELETE FROM daily_flight_summary d
+                WHERE d.flight_day = ANY(%(days)s)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM fresh f
+                      WHERE f.flight_day = d.flight_day
+                        AND f.airline = d.airline
+                        AND f.aircraft_model = d.aircraft_model
+                  )
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM upserted), (SELECT COUNT(*) FROM removed);
+        """
+        params = {
+            "codes": icao_codes,
+            "days": days,
+            "time_from": days[0],
+            "time_to": days[-1] + timedelta(days=1),
+        }
+
+        conn = self._get_connection()
+        if not conn:
+            return 0
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                upserted, removed = cur.fetchone()
+                conn.commit()
+                logger.info(f"Refreshed {len(days)} days in daily_flight_summary: {upserted} upserted, {removed} removed")
+                return upserted + removed
+        except Exception as e:
+            logger.error(f"Refresh failed: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            self._release_connection(conn)
+
+    def missing_days(self, days: Iterable[date]) -> List[date]:
+        # дни окна, по которым в сводке нет ни одной строки: первый запуск или окно без новых записей
+        days = sorted(set(days))
+        if not days:
+            return []
+
+        query = """
+            SELECT d::date
+            FROM unnest(%s::date[]) AS d
+            WHERE NOT EXISTS (SELECT 1 FROM daily_flight_summary s WHERE s.flight_day = d)
+            ORDER BY 1;
+        """
+
+        conn = self._get_connection()
+        if not conn:
+            return days
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query, (days,))
+                return [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            # не знаем, что уже посчитано, — пересчитываем всё окно, как rebuild_reports
+            logger.error(f"Summary lookup failed: {e}")
+            conn.rollback()
+            return days
+        finally:
+            self._release_connection(conn)
@@ -1,36 +1,91 @@
 # hourly_reports.py
-import psycopg2
-from typing import List, Tuple
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple, Union
+from ..data_parser.pool import ConnectionPool, get_pool
+from .queries import AIRPORT_FLIGHTS_SQL
+from ..metrics import metrics
 import logging
 
+if TYPE_CHECKING:
+    from ..data_archive.archive import FlightArchive
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _normalize_hours(hours: Union[int, Iterable[int]]) -> List[int]:
+    hours = [hours] if isinstance(hours, int) else list(hours)
+    invalid = [h for h in hours if not 0 <= h <= 23]
+    if invalid:
+        raise ValueError(f"Час должен быть в диапазоне от 0 до 23: {invalid}")
+    return sorted(set(hours))
+
+
+def _day_start(value: Union[str, date]) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return datetime(value.year, value.month, value.day)
+
+
 class HourlyFlightReport:
-    def __init__(self, db_config: dict):
+    def __init__(self, db_config: dict, pool: Optional[ConnectionPool] = None,
+                 archive: Optional["FlightArchive"] = None):
         self.db_config = db_config
+        self.pool = pool or get_pool(db_config)
+        # с архивом сводка считается по Parquet, Postgres для чтения не нужен
+        self.archive = archive
 
     def _get_connection(self):
         try:
-            return psycopg2.connect(**self.db_config, connect_timeout=5)
+            return self.pool.getconn()
         except Exception as e:
             logger.error(f"Connection error: {e}")
             return None
 
-    def get_hourly_summary(self, icao_codes: List[str], hour: int) -> List[Tuple]:
-        query = """
+    def _release_connection(self, conn):
+        self.pool.putconn(conn)
+
+    @metrics.timed("report_query", report="hourly", op="select")
+    def get_hourly_summary(self, icao_codes: List[str], hours: Union[int, Iterable[int]],
+                           date_from: Union[str, date], date_to: Union[str, date]) -> List[Tuple]:
+        # все запрошенные часы за окно [date_from, date_to] считаются одним проходом:
+        # окно режется на часовые слоты, каждый слот — диапазонное условие по scheduled_time
+        hours = _normalize_hours(hours)
+        if not hours:
+            return []
+
+        window_start = _day_start(date_from)
+        window_end = _day_start(date_to) + timedelta(days=1)
+        if self.archive is not None:
+            return self._summary_from_archive(icao_codes, hours, window_start, window_end)
+
+        query = f"""
+            WITH slots AS (
+                SELECT slot_start, slot_start + INTERVAL '1 hour' AS slot_end
+                FROM generate_series(
+                    %(time_from)s::timestamp,
+                    %(time_to)s::timestamp - INTERVAL '1 hour',
+                    INTERVAL '1 hour'
+                ) AS slot_start
+                WHERE EXTRACT(HOUR FROM slot_start) = ANY(%(hours)s)
+            ),
+            matched AS ({AIRPORT_FLIGHTS_SQL})
             SELECT
-                date_trunc('hour', scheduled_time) AS flight_hour,
-                COALESCE(NULLIF(TRIM(airline), ''), 'Unknown Airline') AS airline,
-                COALESCE(NULLIF(TRIM(aircraft_model), ''), 'Unknown Model') AS aircraft_model,
+                s.slot_start AS flight_hour,
+                COALESCE(NULLIF(TRIM(m.airline), ''), 'Unknown Airline') AS airline,
+                COALESCE(NULLIF(TRIM(m.aircraft_model), ''), 'Unknown Model') AS aircraft_model,
                 COUNT(*) AS total_flights
-            FROM flights
-            WHERE (origin = ANY(%s) OR destination = ANY(%s))
-              AND EXTRACT(HOUR FROM scheduled_time) = %s
-            GROUP BY flight_hour, airline, aircraft_model
+            FROM slots s
+            JOIN matched m ON m.scheduled_time >= s.slot_start AND m.scheduled_time < s.slot_end
+            GROUP BY 1, 2, 3
             ORDER BY total_flights DESC, airline;
         """
+        params = {
+            "codes": icao_codes,
+            "hours": hours,
+            "time_from": window_start,
+            "time_to": window_end,
+        }
 
         conn = self._get_connection()
         if not conn:
@@ -38,17 +93,37 @@ class HourlyFlightReport:
 
         try:
             with conn.cursor() as cur:
-                logger.debug(f"Executing query: {cur.mogrify(query, (icao_codes, icao_codes, hour))}")
-                cur.execute(query, (icao_codes, icao_codes, hour))
+                logger.debug(f"Executing query: {cur.mogrify(query, params)}")
+                cur.execute(query, params)
                 result = cur.fetchall()
-                logger.info(f"Retrieved {len(result)} records for hour {hour}")
+                logger.info(f"Retrieved {len(result)} records for hours {hours}")
                 return result
         except Exception as e:
             logger.error(f"Query failed: {e}")
             return []
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    def _summary_from_archive(self, icao_codes: List[str], hours: List[int],
+                              window_start: datetime, window_end: datetime) -> List[Tuple]:
+        from ..data_archive.archive import count_by_bucket
 
+        try:
+            flights = self.archive.read(["scheduled_time", "airline", "aircraft_model"],
+                                        since=window_start, until=window_end, airports=icao_codes)
+            flights = flights[flights["scheduled_time"].dt.hour.isin(hours)]
+            summary = count_by_bucket(flights, "h").sort_values(
+                ["total_flights", "airline", "bucket", "aircraft_model"],
+                ascending=[False, True, True, True], kind="stable")
+            result = [(bucket.to_pydatetime(), airline, model, int(total))
+                      for bucket, airline, model, total in summary.itertuples(index=False)]
+            logger.info(f"Retrieved {len(result)} archive records for hours {hours}")
+            return result
+        except Exception as e:
+            logger.error(f"Archive query failed: {e}")
+            return []
+
+    @metrics.timed("report_query", report="hourly", op="save")
     def save_hourly_summary(self, summary: List[Tuple]):
         if not summary:
             return
@@ -74,4 +149,95 @@ class HourlyFlightReport:
             logger.error(f"Failed to save hourly data: {e}")
             conn.rollback()
         finally:
-            conn.close()
\ No newline at end of file
+            self._release_connection(conn)
+
+    @metrics.timed("report_query", report="hourly", op="refresh")
+    def refresh_hours(self, hours: Iterable[datetime], icao_codes: List[str]) -> int:
+        hours = sorted(set(hours))
+        if not hours:
+            return 0
+
+        query = f"""
+            WITH matched AS ({AIRPORT_FLIGHTS_SQL}),
+            fresh AS (
+                SELECT
+                    date_trunc('hour', scheduled_time) AS flight_hour,
+                    COALESCE(NULLIF(TRIM(airline), ''), 'Unknown Airline') AS airline,
+                    COALESCE(NULLIF(TRIM(aircraft_model), ''), 'Unknown Model') AS aircraft_model,
+                    COUNT(*) AS total_flights
+                FROM matched
+                WHERE date_trunc('hour', scheduled_time) = ANY(%(hours)s)
+                GROUP BY 1, 2, 3
+            ),
+            upserted AS (
+                INSERT INTO hourly_flight_summary (flight_hour, airline, aircraft_model, total_flights)
+                SELECT flight_hour, airline, aircraft_model, total_flights FROM fresh
+                ON CONFLICT (flight_hour, airline, aircraft_model)
+                DO UPDATE SET total_flights = EXCLUDED.total_flights
+                WHERE hourly_flight_summary.total_flights <> EXCLUDED.total_flights
+                RETURNING 1
+            ),
+            removed AS (
+                DELETE FROM hourly_flight_summary h
+                WHERE h.flight_hour = ANY(%(hours)s)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM fresh f
+                      WHERE f.flight_hour = h.flight_hour
+                        AND f.airline = h.airline
+                        AND f.aircraft_model = h.aircraft_model
+                  )
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM upserted), (SELECT COUNT(*) FROM removed);
+        """
+        params = {
+            "codes": icao_codes,
+            "hours": hours,
+            "time_from": hours[0],
+            "time_to": hours[-1] + timedelta(hours=1),
+        }
+
+        conn = self._get_connection()
+        if not conn:
+            return 0
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                upserted, removed = cur.fetchone()
+                conn.commit()
+                logger.info(f"Refreshed {len(hours)} hours in hourly_flight_summary: {upserted} upserted, {removed} removed")
+                return upserted + removed
+        except Exception as e:
+            logger.error(f"Refresh failed: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            self._release_connection(conn)
+
+    def missing_hours(self, hours: Iterable[datetime]) -> List[datetime]:
+        hours = sorted(set(hours))
+        if not hours:
+            return []
+
+        query = """
+            SELECT h
+            FROM unnest(%s::timestamp[]) AS h
+            WHERE NOT EXISTS (SELECT 1 FROM hourly_flight_summary s WHERE s.flight_hour = h)
+            ORDER BY 1;
+        """
+
+        conn = self._get_connection()
+        if not conn:
+            return hours
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query, (hours,))
+                return [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            logger.error(f"Summary lookup failed: {e}")
+            conn.rollback()
+            return hours
+        finally:
+            self._release_connection(conn)
@@ -0,0 +1,13 @@
+# OR по origin/destination индекс не обслужит, поэтому рейсы наших аэропортов выбираются двумя ветками:
+# по (destination, scheduled_time) и по (origin, scheduled_time) без уже попавших в первую ветку прилётов
+AIRPORT_FLIGHTS_SQL = """
+    SELECT scheduled_time, airline, aircraft_model
+    FROM flights
+    WHERE destination = ANY(%(codes)s)
+      AND scheduled_time >= %(time_from)s AND scheduled_time < %(time_to)s
+    UNION ALL
+    SELECT scheduled_time, airline, aircraft_model
+    FROM flights
+    WHERE origin = ANY(%(codes)s) AND NOT (destination = ANY(%(codes)s))
+      AND scheduled_time >= %(time_from)s AND scheduled_time < %(time_to)s
+"""
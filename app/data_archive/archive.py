@@ -0,0 +1,267 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import os
+import shutil
+import pandas as pd
+import logging
+from ..atomic import atomic_write
+from ..data_parser.database import LAST_UPDATE_OVERLAP
+from ..data_parser.pool import ConnectionPool, get_pool
+from ..metrics import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # архив — необязательная часть, без pyarrow остальное приложение работает
+    pa = ds = pq = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), "flights_archive")
+STATE_FILE = "_archive_state.json"  # префикс "_" — pyarrow.dataset такие файлы не читает
+PART_FILE = "part-0.parquet"
+ARCHIVE_COLUMNS = (
+    "flight_number", "airline", "origin", "destination", "aircraft_model",
+    "scheduled_time", "scheduled_departure", "status", "icao_code", "last_update",
+)
+DICTIONARY_COLUMNS = frozenset({"airline", "origin", "destination", "aircraft_model", "status", "icao_code"})
+TIMESTAMP_COLUMNS = frozenset({"scheduled_time", "scheduled_departure", "last_update"})
+EXPORT_CHUNK_SIZE = 50000
+ROW_GROUP_SIZE = 64 * 1024
+COMPRESSION = "zstd"
+UNKNOWN_AIRLINE = "Unknown Airline"
+UNKNOWN_MODEL = "Unknown Model"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Flights archive needs pyarrow: pip install pyarrow")
+
+
+def count_by_bucket(flights: pd.DataFrame, freq: str) -> pd.DataFrame:
+    # те же правила, что в SQL сводок: пустые и NULL авиакомпания/модель — 'Unknown ...'
+    def normalized(column: str, unknown: str) -> pd.Series:
+        values = flights[column].astype(object).str.strip()
+        return values.mask(values.isna() | (values == ""), unknown)
+
+    buckets = pd.DataFrame({
+        "bucket": flights["scheduled_time"].dt.floor(freq),
+        "airline": normalized("airline", UNKNOWN_AIRLINE),
+        "aircraft_model": normalized("aircraft_model", UNKNOWN_MODEL),
+    })
+    return buckets.groupby(["bucket", "airline", "aircraft_model"], sort=False).size() \
+        .rename("total_flights").reset_index()
+
+
+class FlightArchive:
+    def __init__(self, root: str = ARCHIVE_DIR, db_config: Optional[dict] = None,
+                 pool: Optional[ConnectionPool] = None, overlap: timedelta = LAST_UPDATE_OVERLAP):
+        _require_pyarrow()
+        self.root = root
+        self.db_config = db_config
+        # для чтения архива база не нужна: пул создаётся только при экспорте
+        self.pool = pool or (get_pool(db_config) if db_config else None)
+        self.overlap = overlap
+        self.partitioning = ds.partitioning(pa.schema([("flight_day", pa.date32())]), flavor="hive")
+        self.schema = pa.schema([
+            (column,
+             pa.timestamp("us") if column in TIMESTAMP_COLUMNS
+             else pa.dictionary(pa.int32(), pa.string()) if column in DICTIONARY_COLUMNS
+             else pa.string())
+            for column in ARCHIVE_COLUMNS
+        ])
+
+    def _day_dir(self, day: date) -> str:
+        return os.path.join(self.root, f"flight_day={day.isoformat()}")
+
+    def _chunk_table(self, rows: List[tuple]) -> "pa.Table":
+        arrays = []
+        for index, field in enumerate(self.schema):
+            values = [row[index] for row in rows]
+            if field.name in DICTIONARY_COLUMNS:
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, field.type))
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def _export_day(self, conn, day: date) -> int:
+        # сортировка по аэропортам даёт узкие min/max в статистике row group — фильтр по аэропорту их пропускает
+        query = f"""
+            SELECT {', '.join(ARCHIVE_COLUMNS)}
+            FROM flights
+            WHERE scheduled_time >= %s AND scheduled_time < %s
+            ORDER BY origin, destination, scheduled_time
+        """
+        day_dir = self._day_dir(day)
+        rows_written = 0
+        try:
+            with conn.cursor(name="archive_flights") as cur:
+                cur.itersize = EXPORT_CHUNK_SIZE
+                start = datetime(day.year, day.month, day.day)
+                cur.execute(query, (start, start + timedelta(days=1)))
+                rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    # день ушёл из flights (retention) — в архиве остаётся прежняя копия
+                    return 0
+
+                os.makedirs(day_dir, exist_ok=True)
+                with atomic_write(os.path.join(day_dir, PART_FILE), "wb") as f, \
+                        pq.ParquetWriter(f, self.schema, compression=COMPRESSION,
+                                         use_dictionary=sorted(DICTIONARY_COLUMNS)) as writer:
+                    while rows:
+                        writer.write_table(self._chunk_table(rows), row_group_size=ROW_GROUP_SIZE)
+                        rows_written += len(rows)
+                        rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+            return rows_written
+        finally:
+            conn.rollback()
+
+    @metrics.timed("archive_export")
+    def export_days(self, days: Iterable[date]) -> int:
+        if self.pool is None:
+            raise ValueError("Archive export needs db_config or pool")
+
+        days = sorted(set(days))
+        total = 0
+        try:
+            with self.pool.connection() as conn:
+                for day in days:
+                    rows = self._export_day(conn, day)
+                    total += rows
+                    logger.info(f"Archived {rows} flights for {day}")
+        except Exception as e:
+            logger.error(f"Archive export failed: {e}")
+            return -1
+
+        metrics.inc("archived_total", total)
+        logger.info(f"Archived {total} flights for {len(days)} days into {self.root}")
+        return total
+
+    def export_range(self, date_from: date, date_to: date) -> int:
+        return self.export_days(date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1))
+
+    def _load_state(self) -> Dict[str, Any]:
+        path = os.path.join(self.root, STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load archive state: {e}")
+            return {}
+
+    def _save_state(self, state: Dict[str, Any]):
+        os.makedirs(self.root, exist_ok=True)
+        with atomic_write(os.path.join(self.root, STATE_FILE)) as f:
+            json.dump(state, f)
+
+    def export_changed(self) -> int:
+        # перевыгружаются только дни, где рейсы вставлены или изменились с прошлой выгрузки
+        if self.pool is None:
+            raise ValueError("Archive export needs db_config or pool")
+
+        state = self._load_state()
+        watermark = datetime.fromisoformat(state["watermark"]) if state.get("watermark") else None
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT MAX(last_update) FROM flights")
+                    latest = cur.fetchone()[0]
+                    if watermark is None:
+                        cur.execute("SELECT DISTINCT scheduled_time::date FROM flights")
+                    else:
+                        cur.execute("SELECT DISTINCT scheduled_time::date FROM flights WHERE last_update > %s",
+                                    (watermark - self.overlap,))
+                    days = [row[0] for row in cur.fetchall()]
+                conn.rollback()
+        except Exception as e:
+            logger.error(f"Could not find changed days: {e}")
+            return -1
+
+        if not days:
+            logger.info("Archive is up to date")
+            return 0
+
+        total = self.export_days(days)
+        if total >= 0 and latest is not None:
+            self._save_state({"watermark": max(latest, watermark or latest).isoformat()})
+        return total
+
+    def days(self) -> List[date]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            date.fromisoformat(name.split("=", 1)[1])
+            for name in os.listdir(self.root)
+            if name.startswith("flight_day=") and os.path.exists(os.path.join(self.root, name, PART_FILE))
+        )
+
+    def drop_days(self, days: Iterable[date]):
+        for day in days:
+            shutil.rmtree(self._day_dir(day), ignore_errors=True)
+
+    @metrics.timed("archive_read")
+    def read(self, columns: Optional[List[str]] = None, since: Optional[datetime] = None,
+             until: Optional[datetime] = None, airports: Optional[List[str]] = None,
+             changed_since: Optional[datetime] = None, since_inclusive: bool = True,
+             until_inclusive: bool = False) -> pd.DataFrame:
+        columns = list(columns or ARCHIVE_COLUMNS)
+        unknown = [column for column in columns if column not in ARCHIVE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown flight columns: {', '.join(unknown)}")
+
+        if not self.days():
+            return self._empty_frame(columns)
+
+        # условие по flight_day отсекает целые каталоги, остальное проверяется по статистике row group
+        conditions = []
+        scheduled = ds.field("scheduled_time")
+        if since is not None:
+            conditions.append(ds.field("flight_day") >= pd.Timestamp(since).date())
+            conditions.append(scheduled >= since if since_inclusive else scheduled > since)
+        if until is not None:
+            conditions.append(ds.field("flight_day") <= pd.Timestamp(until).date())
+            conditions.append(scheduled <= until if until_inclusive else scheduled < until)
+        if airports is not None:
+            codes = pa.array(list(airports), pa.string())
+            conditions.append(ds.field("origin").isin(codes) | ds.field("destination").isin(codes))
+        if changed_since is not None:
+            conditions.append(ds.field("last_update") > changed_since)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        dataset = ds.dataset(self.root, format="parquet", partitioning=self.partitioning)
+        table = dataset.to_table(columns=columns, filter=expression)
+        df = table.to_pandas()
+        for column in TIMESTAMP_COLUMNS.intersection(columns):
+            # pandas 2 сохраняет единицы arrow (us) — приводим к ns, как у загрузки из Postgres
+            df[column] = df[column].astype("datetime64[ns]")
+        logger.info(f"Read {len(df)} flights from archive")
+        return df
+
+    @staticmethod
+    def _empty_frame(columns: List[str]) -> pd.DataFrame:
+        return pd.DataFrame({
+            column: pd.Series([], dtype="datetime64[ns]") if column in TIMESTAMP_COLUMNS
+            else pd.Categorical([]) if column in DICTIONARY_COLUMNS
+            else pd.Series([], dtype=object)
+            for column in columns
+        })
+
+
+def main_archive(date_from: Optional[str] = None, date_to: Optional[str] = None, archive_dir: Optional[str] = None):
+    # общие настройки БД парсера; импорт здесь, чтобы чтение архива (report/digest --from-archive) его не тянуло
+    from ..data_parser.parser import DB_CONFIG
+
+    archive = FlightArchive(archive_dir or ARCHIVE_DIR, db_config=DB_CONFIG)
+    if date_from or date_to:
+        date_from = date.fromisoformat(date_from or date_to)
+        archive.export_range(date_from, date.fromisoformat(date_to) if date_to else date_from)
+    else:
+        archive.export_changed()
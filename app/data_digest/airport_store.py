@@ -0,0 +1,233 @@
+from typing import Dict, Iterable, Optional, Tuple
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from ..atomic import atomic_write
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AIRPORT_STORE_FILE = os.path.join(os.path.dirname(__file__), "airport_coords.sqlite3")
+AIRPORTS_DATASET = os.path.join(os.path.dirname(__file__), "data", "airports.csv")
+
+# выжимка из airports.csv OurAirports (https://ourairports.com/data/): действующие аэропорты с кодом IATA,
+# порядок типов — приоритет при повторе кода
+DATASET_TYPES = ("large_airport", "medium_airport", "small_airport")
+DATASET_COLUMNS = ("ident", "type", "name", "latitude_deg", "longitude_deg", "iso_country", "iata_code")
+
+SOURCE_DATASET = "dataset"
+SOURCE_GEOCODER = "geocoder"
+SOURCE_CACHE = "json_cache"
+
+Coordinates = Tuple[float, float]
+
+
+class AirportStore:
+    def __init__(self, path: str = AIRPORT_STORE_FILE, hit_ttl: Optional[float] = 180 * 86400,
+                 miss_ttl: float = 7 * 86400, busy_timeout: float = 30.0):
+        self.path = path
+        self.hit_ttl = hit_ttl  # None — найденные геокодером координаты не устаревают
+        self.miss_ttl = miss_ttl
+        self.busy_timeout = busy_timeout
+        # sqlite3-соединение нельзя делить между потоками — держим по одному на поток
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            # WAL: читатели не блокируются писателем, параллельные процессы дайджеста не портят файл
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS airport_coords (
+                    iata TEXT PRIMARY KEY,
+                    latitude REAL,
+                    longitude REAL,
+                    source TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+
+    def _fresh(self, latitude: Optional[float], source: str, updated_at: float, now: float) -> bool:
+        if source in (SOURCE_DATASET, SOURCE_CACHE):
+            return True
+        if latitude is None:
+            return now - updated_at <= self.miss_ttl
+        return self.hit_ttl is None or now - updated_at <= self.hit_ttl
+
+    def get_many(self, codes: Iterable[str]) -> Dict[str, Optional[Coordinates]]:
+        # в результат попадают только известные коды: координаты или None для запомненного промаха
+        codes = list(dict.fromkeys(codes))
+        if not codes:
+            return {}
+
+        now = time.time()
+        found = {}
+        conn = self._connection()
+        # SQLite ограничивает число параметров запроса, поэтому читаем пачками
+        for start in range(0, len(codes), 500):
+            chunk = codes[start:start + 500]
+            rows = conn.execute(
+                f"SELECT iata, latitude, longitude, source, updated_at FROM airport_coords "
+                f"WHERE iata IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for iata, latitude, longitude, source, updated_at in rows:
+                if self._fresh(latitude, source, updated_at, now):
+                    found[iata] = (latitude, longitude) if latitude is not None else None
+        return found
+
+    def put_many(self, items: Dict[str, Optional[Coordinates]], source: str = SOURCE_GEOCODER,
+                 overwrite_dataset: bool = False):
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (code, coords[0] if coords else None, coords[1] if coords else None, source, now)
+            for code, coords in items.items()
+        ]
+        # данные из справочника не затираем результатами геокодера, если не попросили явно
+        guard = "" if overwrite_dataset else f"WHERE airport_coords.source != '{SOURCE_DATASET}'"
+        with self._connection() as conn:
+            conn.executemany(f"""
+                INSERT INTO airport_coords (iata, latitude, longitude, source, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (iata) DO UPDATE SET
+                    latitude = excluded.latitude,
+                    longitude = excluded.longitude,
+                    source = excluded.source,
+                    updated_at = excluded.updated_at
+                {guard}
+            """, rows)
+
+    def put(self, code: str, coords: Optional[Coordinates], source: str = SOURCE_GEOCODER):
+        self.put_many({code: coords}, source)
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value: str):
+        conn.execute(
+            "INSERT INTO store_meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def seed_from_csv(self, path: str = AIRPORTS_DATASET) -> int:
+        # формат OurAirports: iata_code, latitude_deg, longitude_deg; повторно грузим только изменившийся файл
+        try:
+            stamp = f"{os.path.getsize(path)}:{os.path.getmtime(path)}"
+        except OSError as e:
+            logger.warning(f"Airport dataset is not available: {e}")
+            return 0
+        if self._meta(f"seed:{path}") == stamp:
+            return 0
+
+        rows = []
+        now = time.time()
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                for record in csv.DictReader(f):
+                    code = (record.get("iata_code") or "").strip().upper()
+                    if len(code) != 3:
+                        continue
+                    try:
+                        rows.append((code, float(record["latitude_deg"]), float(record["longitude_deg"]),
+                                     SOURCE_DATASET, now))
+                    except (KeyError, TypeError, ValueError):
+                        continue
+        except Exception as e:
+            logger.warning(f"Could not read airport dataset {path}: {e}")
+            return 0
+
+        with self._connection() as conn:
+            conn.executemany("""
+                INSERT INTO airport_coords (iata, latitude, longitude, source, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (iata) DO UPDATE SET
+                    latitude = excluded.latitude,
+                    longitude = excluded.longitude,
+                    source = excluded.source,
+                    updated_at = excluded.updated_at
+            """, rows)
+            self._set_meta(conn, f"seed:{path}", stamp)
+
+        logger.info(f"Seeded {len(rows)} airports from {path}")
+        return len(rows)
+
+    def migrate_json_cache(self, path: str) -> int:
+        if not os.path.exists(path) or self._meta(f"migrated:{path}"):
+            return 0
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            items = {
+                code.upper(): (float(coords[0]), float(coords[1]))
+                for code, coords in cache.items()
+                if coords and len(coords) == 2
+            }
+        except Exception as e:
+            logger.warning(f"Could not migrate coordinates cache {path}: {e}")
+            return 0
+
+        self.put_many(items, SOURCE_CACHE)
+        with self._connection() as conn:
+            self._set_meta(conn, f"migrated:{path}", str(time.time()))
+
+        logger.info(f"Migrated {len(items)} airports from {path}")
+        return len(items)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def build_dataset(source: str, path: str = AIRPORTS_DATASET, types: Iterable[str] = DATASET_TYPES) -> int:
+    # source — полный airports.csv OurAirports; в репозиторий кладём только нужные карте колонки и типы
+    rank = {kind: i for i, kind in enumerate(types)}
+    rows = {}
+    with open(source, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            code = (record.get("iata_code") or "").strip().upper()
+            if record.get("type") not in rank or len(code) != 3:
+                continue
+            # при повторе кода оставляем аэропорт крупнее
+            if code in rows and rank[rows[code]["type"]] <= rank[record["type"]]:
+                continue
+            rows[code] = dict({column: record.get(column, "") for column in DATASET_COLUMNS}, iata_code=code)
+
+    with atomic_write(path, newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=DATASET_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows[code] for code in sorted(rows))
+
+    logger.info(f"Wrote {len(rows)} airports from {source} to {path}")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m app.data_digest.airport_store airports.csv — обновить встроенный справочник
+    build_dataset(sys.argv[1], *sys.argv[2:3])
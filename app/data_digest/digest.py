@@ -1,28 +1,37 @@
 import hashlib
+import html
+import math
 import pandas as pd
+from pandas.api.types import union_categoricals
 import folium
+from folium.plugins import MarkerCluster
+from branca.element import MacroElement
+from jinja2 import Template
 import webbrowser
 from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
 import time
 import logging
-from typing import Optional, Tuple, Dict, Any, List
+from typing import TYPE_CHECKING, Optional, Tuple, Dict, Any, List, NamedTuple
 import json
 import os
-from sqlalchemy import create_engine
+from datetime import datetime, timedelta
+from ..data_parser.pool import ConnectionPool, get_pool
+from ..metrics import metrics
+from .airport_store import AirportStore
+from .routes import RouteGeometry, RouteGeometryCache
+from .legend import build_legend_html
 
+if TYPE_CHECKING:
+    from ..data_archive.archive import FlightArchive
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('flight_visualizer.log'),
-        logging.StreamHandler()
-    ]
-)
+
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+LOG_FILE = 'flight_visualizer.log'
+
 COORDS_CACHE_FILE = os.path.join(os.path.dirname(__file__), "airport_coords_cache.json")
 MAP_OUTPUT_FILE = "flights_map.html"
 DB_CONFIG = {
@@ -33,36 +42,23 @@ DB_CONFIG = {
     "port": "5432"
 }
 MAX_FLIGHTS = 1000
+LOAD_CHUNK_SIZE = 10000
+FLIGHT_VIEW_COLUMNS = (
+    "flight_number", "airline", "origin", "destination", "aircraft_model",
+    "scheduled_time", "scheduled_departure", "status", "icao_code", "last_update",
+)
+# icao_code и last_update карте не нужны — по умолчанию их не тянем
+LOAD_COLUMNS = FLIGHT_VIEW_COLUMNS[:-2]
+CATEGORICAL_COLUMNS = frozenset({"airline", "origin", "destination", "aircraft_model", "status", "icao_code"})
+TIMESTAMP_COLUMNS = frozenset({"scheduled_time", "scheduled_departure", "last_update"})
+ROUTE_POPUP_MAX_FLIGHTS = 50
+RENDER_MODES = ("polyline", "geojson")
+ROUTES_SIDECAR_FILE = "flights_routes.geojson"
 
 
 class AirportGeocoder:
 
-    BASE_COORDS = {
-        "PEE": (56.2503, 48.0538),
-        "PKV": (58.4313, 31.3155),
-        "IWA": (56.8522, 60.6544),
-        "KVX": (57.1902, 40.5847),
-        "MSQ": (53.88, 27.55),
-        "MCX": (46.2208, 48.0384),
-        "LED": (59.806084, 30.3083),
-        "AER": (43.4489, 39.9569),
-        "SVO": (55.9726, 37.4146),
-        "DME": (55.4146, 37.8994),
-        "VKO": (55.6033, 37.2922),
-        "IST": (41.2611, 28.7422),
-        "KUF": (53.5066, 50.1644),
-        "TLV": (32.0114, 34.8867),
-        "VAR": (43.2321, 27.8251),
-        "DUS": (51.2809, 6.7573),
-        "KUT": (42.178349, 42.491012),
-        "AAQ": (44.8953, 37.3194),
-        "BOJ": (42.5667, 27.5),
-        "BUS": (41.6103, 41.6056),
-        "MAN": (53.3650, -2.2725),
-        "ALA": (43.3506, 77.0275),
-    }
-
-    def __init__(self):
+    def __init__(self, store: Optional[AirportStore] = None):
         self.geolocator = Nominatim(user_agent="rosatom_flight_visualizer")
         self.geocode = RateLimiter(
             self.geolocator.geocode,
@@ -70,38 +66,20 @@ class AirportGeocoder:
             max_retries=2,
             error_wait_seconds=5
         )
-        self.cache = self._load_cache()
+        self.store = store or AirportStore()
+        self.store.seed_from_csv()
+        self.store.migrate_json_cache(COORDS_CACHE_FILE)
+        # координаты — только из справочника data/airports.csv (через AirportStore) и геокодера
+        self.cache: Dict[str, Optional[Tuple[float, float]]] = {}
 
-    def _load_cache(self) -> Dict[str, Tuple[float, float]]:
-        if os.path.exists(COORDS_CACHE_FILE):
-            try:
-                with open(COORDS_CACHE_FILE, 'r', encoding='utf-8') as f:
-                    cache = json.load(f)
-                    return {**self.BASE_COORDS, **cache}
-            except Exception as e:
-                logger.warning(f"Could not load coordinates cache: {e}")
-        return self.BASE_COORDS.copy()
-
-    def _save_cache(self):
-        try:
-            new_coords = {
-                k: v for k, v in self.cache.items()
-                if k not in self.BASE_COORDS or v != self.BASE_COORDS.get(k)
-            }
-            with open(COORDS_CACHE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(new_coords, f, indent=2)
-        except Exception as e:
-            logger.warning(f"Could not save coordinates cache: {e}")
-
-    def get_coordinates(self, iata_code: str) -> Optional[Tuple[float, float]]:
-        if not iata_code or len(iata_code) != 3:
+    @staticmethod
+    def _normalize(iata_code: str) -> Optional[str]:
+        if not isinstance(iata_code, str) or len(iata_code) != 3:
             return None
+        return iata_code.upper()
 
-        iata_code = iata_code.upper()
-
-        if iata_code in self.cache:
-            return self.cache[iata_code]
-
+    @metrics.timed("geocode")
+    def _geocode(self, iata_code: str) -> Optional[Tuple[float, float]]:
         queries = [
             f"{iata_code} airport",
             f"{iata_code} international airport",
@@ -109,157 +87,343 @@ class AirportGeocoder:
             iata_code
         ]
 
+        # паузы между запросами выдерживает RateLimiter
         for query in queries:
             try:
                 location = self.geocode(query, exactly_one=True)
                 if location:
                     coords = (location.latitude, location.longitude)
-                    self.cache[iata_code] = coords
-                    self._save_cache()
                     logger.info(f"Found coordinates for {iata_code}: {coords}")
                     return coords
-                time.sleep(1)
             except Exception as e:
                 logger.warning(f"Geocoding error for {iata_code} ({query}): {e}")
-                time.sleep(2)
 
         logger.warning(f"Could not find coordinates for airport: {iata_code}")
         return None
 
+    def get_many(self, iata_codes) -> Dict[str, Optional[Tuple[float, float]]]:
+        codes = {code: self._normalize(code) for code in iata_codes}
+        normalized = {code for code in codes.values() if code}
+        wanted = {code for code in normalized if code not in self.cache}
+
+        metrics.inc("airport_lookups_total", len(normalized) - len(wanted), source="memory")
+        if wanted:
+            stored = self.store.get_many(wanted)
+            self.cache.update(stored)
+            metrics.inc("airport_lookups_total", len(stored), source="store")
+            # в сеть идут только коды, которых нет ни в справочнике, ни среди свежих промахов
+            for code in sorted(wanted - self.cache.keys()):
+                metrics.inc("airport_lookups_total", source="nominatim")
+                coords = self._geocode(code)
+                self.store.put(code, coords)
+                self.cache[code] = coords
+
+        return {code: self.cache.get(normalized) if normalized else None for code, normalized in codes.items()}
+
+    def get_coordinates(self, iata_code: str) -> Optional[Tuple[float, float]]:
+        return self.get_many([iata_code])[iata_code]
+
+
+class RenderResult(NamedTuple):
+    flight_map: folium.Map
+    routes_added: int
+    missing_airports: List[str]
+    page_signature: str
+
+
+class RouteLayer(MacroElement):
+    # все маршруты — один L.geoJson; popup собирается только при клике из свойств feature
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(null, {
+            style: function(feature) {
+                return {color: feature.properties.color, weight: feature.properties.weight, opacity: 0.7};
+            },
+            onEachFeature: function(feature, layer) {
+                layer.bindTooltip(feature.properties.route);
+                layer.bindPopup(function() { return feature.properties.popup; }, {maxWidth: 600});
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {%- if this.data_url %}
+        fetch({{ this.data_url|tojson }})
+            .then(function(response) { return response.json(); })
+            .then(function(data) { {{ this.get_name() }}.addData(data); });
+        {%- else %}
+        {{ this.get_name() }}.addData({{ this.data_json }});
+        {%- endif %}
+        {% endmacro %}
+    """)
+
+    def __init__(self, data: Optional[dict] = None, data_url: Optional[str] = None):
+        super().__init__()
+        self._name = "RouteLayer"
+        self.data_url = data_url
+        # json.dumps без html-экранирования tojson в разы компактнее; "</" экранируем, чтобы не закрыть <script>
+        self.data_json = json.dumps(data, ensure_ascii=False, separators=(',', ':')).replace("</", "<\\/") if data else "null"
+
 
 class FlightVisualizer:
 
-    def __init__(self, db_config: Dict[str, Any]):
+    def __init__(self, db_config: Dict[str, Any], pool: Optional[ConnectionPool] = None,
+                 archive: Optional["FlightArchive"] = None):
         self.db_config = db_config
-        self.engine = create_engine(
-            f"postgresql+psycopg2://{db_config['user']}:{db_config['password']}@"
-            f"{db_config['host']}:{db_config['port']}/{db_config['dbname']}"
-        )
+        self.pool = pool or get_pool(db_config)
+        self.archive = archive
         self.geocoder = AirportGeocoder()
+        self.route_geometry = RouteGeometryCache()
+
+    @staticmethod
+    def _chunk_frame(rows: List[tuple], columns: List[str]) -> pd.DataFrame:
+        # psycopg2 уже отдаёт datetime — тип задаём сразу при сборке колонки, без повторного pd.to_datetime
+        data = {}
+        for index, column in enumerate(columns):
+            values = [row[index] for row in rows]
+            if column in TIMESTAMP_COLUMNS:
+                data[column] = pd.Series(values, dtype='datetime64[ns]')
+            elif column in CATEGORICAL_COLUMNS:
+                data[column] = pd.Categorical(values)
+            else:
+                data[column] = pd.Series(values, dtype=object)
+        return pd.DataFrame(data)
+
+    @staticmethod
+    def concat_frames(chunks: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+        if not chunks:
+            return FlightVisualizer._chunk_frame([], columns)
+        if len(chunks) == 1:
+            return chunks[0]
+
+        data = {}
+        for column in columns:
+            if column in CATEGORICAL_COLUMNS:
+                # объединяем словари категорий, иначе concat откатится к object
+                data[column] = union_categoricals([chunk[column] for chunk in chunks])
+            else:
+                data[column] = pd.concat([chunk[column] for chunk in chunks], ignore_index=True)
+        return pd.DataFrame(data)
+
+    @metrics.timed("map_load")
+    def load_flights_data(self, days: float = 7, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                          max_rows: Optional[int] = MAX_FLIGHTS, columns: Optional[List[str]] = None,
+                          chunk_size: int = LOAD_CHUNK_SIZE, changed_since: Optional[datetime] = None) -> pd.DataFrame:
+        columns = list(columns or LOAD_COLUMNS)
+        unknown = [column for column in columns if column not in FLIGHT_VIEW_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown flight columns: {', '.join(unknown)}")
 
-    def load_flights_data(self) -> pd.DataFrame:
         try:
+            # границы окна передаются параметрами, а не NOW(): так планировщик отсекает лишние секции flights
+            since = since or datetime.now() - timedelta(days=days)
+            if self.archive is not None:
+                return self._load_from_archive(columns, since, until, max_rows, changed_since)
+
+            conditions = ["scheduled_time > %s"]
+            params: List[Any] = [since]
+            if until is not None:
+                conditions.append("scheduled_time <= %s")
+                params.append(until)
+            if changed_since is not None:
+                conditions.append("last_update > %s")
+                params.append(changed_since)
+
             query = f"""
-                SELECT 
-                    flight_number, 
-                    airline, 
-                    origin, 
-                    destination, 
-                    aircraft_model,
-                    scheduled_time,
-                    scheduled_departure,
-                    status,
-                    icao_code
+                SELECT {', '.join(columns)}
                 FROM flights
-                WHERE scheduled_time > NOW() - INTERVAL '7 days'
+                WHERE {' AND '.join(conditions)}
                 ORDER BY scheduled_time DESC
-                LIMIT {MAX_FLIGHTS}
             """
-            df = pd.read_sql(query, self.engine)
-
-            df['scheduled_time'] = pd.to_datetime(df['scheduled_time'])
-            df['scheduled_departure'] = pd.to_datetime(df['scheduled_departure'])
-
+            if max_rows is not None:
+                query += " LIMIT %s"
+                params.append(max_rows)
+
+            chunks = []
+            with self.pool.connection() as conn:
+                # именованный (серверный) курсор: в памяти одновременно только одна пачка строк
+                with conn.cursor(name="digest_flights") as cur:
+                    cur.itersize = chunk_size
+                    cur.execute(query, params)
+                    while True:
+                        rows = cur.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        chunks.append(self._chunk_frame(rows, columns))
+                conn.rollback()
+
+            df = self.concat_frames(chunks, columns)
+            logger.info(f"Loaded {len(df)} flights since {since:%Y-%m-%d %H:%M} "
+                        f"({df.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MiB)")
             return df
 
         except Exception as e:
             logger.error(f"Database error: {e}")
             raise
 
+    def _load_from_archive(self, columns: List[str], since: datetime, until: Optional[datetime],
+                           max_rows: Optional[int], changed_since: Optional[datetime]) -> pd.DataFrame:
+        # те же границы и порядок, что у запроса к flights: (since, until], новые рейсы первыми
+        df = self.archive.read(columns, since=since, until=until, changed_since=changed_since,
+                               since_inclusive=False, until_inclusive=True)
+        df = df.sort_values('scheduled_time', ascending=False, kind='stable')
+        if max_rows is not None:
+            df = df.head(max_rows)
+        df = df.reset_index(drop=True)
+        logger.info(f"Loaded {len(df)} archived flights since {since:%Y-%m-%d %H:%M} "
+                    f"({df.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MiB)")
+        return df
+
     @staticmethod
     def _generate_color(airline: str) -> str:
         return f"#{hashlib.md5(airline.encode()).hexdigest()[:6]}"
 
-    def _add_airport_markers(self, flight_map: folium.Map, flights_df: pd.DataFrame):
-        airports = set(flights_df['origin']).union(set(flights_df['destination']))
+    def _resolve_coordinates(self, codes) -> Dict[str, Optional[Tuple[float, float]]]:
+        return self.geocoder.get_many(codes)
 
-        for airport in airports:
-            coords = self.geocoder.get_coordinates(airport)
-            if coords:
+    @staticmethod
+    def _escaped(series: pd.Series, placeholder: str = "") -> pd.Series:
+        # экранируем каждое уникальное значение один раз и раскладываем по строкам через map
+        series = series.astype(object)
+        values = series.dropna().unique()
+        return series.map({v: html.escape(str(v)) for v in values}).fillna(placeholder).astype(str)
+
+    def _add_airport_markers(self, flight_map: folium.Map, coords: Dict[str, Optional[Tuple[float, float]]],
+                             cluster: bool = False):
+        parent = MarkerCluster(name="Аэропорты").add_to(flight_map) if cluster else flight_map
+        for airport, location in coords.items():
+            if location:
                 folium.Marker(
-                    location=coords,
+                    location=location,
                     popup=f"Аэропорт: {airport}",
                     icon=folium.Icon(color='blue', icon='plane', prefix='fa')
-                ).add_to(flight_map)
-
-    def _add_aircraft_legend(self, flight_map: folium.Map, flights_df: pd.DataFrame):
-        grouped = flights_df.groupby(['airline', 'aircraft_model'])['flight_number'] \
-            .apply(lambda x: sorted([f for f in x if pd.notna(f)])) \
-            .reset_index()
-
-        legend_html = """
-        <div style="
-            position: fixed; 
-            bottom: 50px;
-            left: 50px;
-            width: 300px;
-            max-height: 500px;
-            overflow: auto;
-            background-color: white;
-            border: 2px solid grey;
-            padding: 10px;
-            font-size: 12px;
-            z-index: 9999;
-        ">
-            <h4 style="margin-top:0; text-align: center;">Авиакомпании и модели самолетов</h4>
-        """
-
-        current_airline = None
-        for _, row in grouped.iterrows():
-            airline = row['airline']
-            model = row['aircraft_model']
-            flights = row['flight_number']
-
-            if not flights:
-                continue
-
-            if airline != current_airline:
-                color = self._generate_color(airline)
-                legend_html += f"""
-                <div style="
-                    margin: 10px 0 5px 0; 
-                    border-bottom: 1px solid #ccc; 
-                    padding-bottom: 3px;
-                ">
-                    <i style="
-                        background: {color};
-                        width: 15px;
-                        height: 15px;
-                        display: inline-block;
-                        margin-right: 5px;
-                        vertical-align: middle;
-                    "></i>
-                    <b>{airline}</b>
-                </div>
-                """
-                current_airline = airline
-
-            legend_html += f"""
-            <div style="margin-left: 20px; margin-bottom: 10px;">
-                <div style="font-weight: bold; margin-bottom: 3px;">{model if pd.notna(model) else 'Не указано'}</div>
-                <div style="
-                    margin-left: 10px; 
-                    font-size: 11px;
-                    column-count: 2;
-                    column-gap: 10px;
-                ">
-                    {', '.join(flights)}
-                </div>
-            </div>
-            """
+                ).add_to(parent)
 
-        legend_html += "</div>"
+    def _add_aircraft_legend(self, flight_map: folium.Map, flights_df: pd.DataFrame) -> str:
+        legend_html = build_legend_html(flights_df, self._generate_color)
         flight_map.get_root().html.add_child(folium.Element(legend_html))
+        return legend_html
+
+    def _build_routes(self, flights_df: pd.DataFrame) -> pd.DataFrame:
+        # одна строка на направление origin→destination: число рейсов, цвет основной авиакомпании и таблица рейсов для popup
+        departure = flights_df['scheduled_departure'].dt.strftime('%Y-%m-%d %H:%M').fillna('—')
+        arrival = flights_df['scheduled_time'].dt.strftime('%Y-%m-%d %H:%M').fillna('—')
+        rows_html = (
+            "<tr><td>" + self._escaped(flights_df['flight_number'])
+            + "</td><td>" + self._escaped(flights_df['airline'])
+            + "</td><td>" + departure
+            + "</td><td>" + arrival
+            + "</td><td>" + self._escaped(flights_df['status'])
+            + "</td><td>" + self._escaped(flights_df['aircraft_model'])
+            + "</td></tr>"
+        )
+
+        keys = ['origin', 'destination']
+        routes = flights_df.groupby(keys, sort=False, observed=True).size().rename('flights').to_frame()
+        popup_rows = flights_df[keys].assign(rows_html=rows_html) \
+            .groupby(keys, sort=False, observed=True).head(ROUTE_POPUP_MAX_FLIGHTS)
+        routes['rows_html'] = popup_rows.groupby(keys, sort=False, observed=True)['rows_html'].agg(''.join)
+
+        main_airline = flights_df.groupby(['origin', 'destination', 'airline'], sort=False, observed=True).size() \
+            .rename('n').reset_index() \
+            .sort_values('n', ascending=False, kind='stable') \
+            .drop_duplicates(['origin', 'destination']) \
+            .set_index(['origin', 'destination'])['airline']
+        routes['airline'] = main_airline.astype(object).reindex(routes.index).fillna('Unknown')
+        return routes.reset_index()
+
+    @staticmethod
+    def _route_popup(origin: str, destination: str, flights: int, rows_html: str, distance_km: float) -> str:
+        hidden = flights - min(flights, ROUTE_POPUP_MAX_FLIGHTS)
+        more = f"<p>… и ещё {hidden}</p>" if hidden else ""
+        return (
+            f'<div style="max-height: 300px; overflow: auto">'
+            f"<h4>{html.escape(origin)} → {html.escape(destination)}: {flights} ({distance_km:.0f} км)</h4>"
+            f'<table style="font-size: 11px">'
+            f"<tr><th>Flight</th><th>Airline</th><th>Departure</th><th>Arrival</th><th>Status</th><th>Aircraft</th></tr>"
+            f"{rows_html}</table>{more}</div>"
+        )
+
+    @staticmethod
+    def _route_weight(flights: int) -> float:
+        return 2 + min(6, math.log2(flights))
+
+    def _add_routes_polylines(self, flight_map: folium.Map, routes: pd.DataFrame,
+                              geometry: Dict[Tuple[str, str], RouteGeometry]):
+        colors = {airline: self._generate_color(airline) for airline in routes['airline'].unique()}
+
+        for origin, destination, flights, rows_html, airline, distance_km in routes[
+                ['origin', 'destination', 'flights', 'rows_html', 'airline', 'distance_km']
+        ].itertuples(index=False, name=None):
+            folium.PolyLine(
+                locations=geometry[(origin, destination)].points.tolist(),
+                popup=folium.Popup(self._route_popup(origin, destination, flights, rows_html, distance_km), max_width=600),
+                tooltip=f"{origin} → {destination} ({flights})",
+                color=colors[airline],
+                weight=self._route_weight(flights),
+                opacity=0.7
+            ).add_to(flight_map)
 
-    def create_map(self) -> Tuple[folium.Map, int, List[str]]:
-        flights_df = self.load_flights_data()
+    def _routes_feature_collection(self, routes: pd.DataFrame,
+                                   geometry: Dict[Tuple[str, str], RouteGeometry]) -> dict:
+        colors = {airline: self._generate_color(airline) for airline in routes['airline'].unique()}
+
+        features = [
+            {
+                "type": "Feature",
+                # GeoJSON хранит [lon, lat]; 4 знака (~10 м) достаточно для карты и заметно сокращают файл
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": geometry[(origin, destination)].points[:, ::-1].round(4).tolist(),
+                },
+                "properties": {
+                    "route": f"{origin} → {destination} ({flights})",
+                    "color": colors[airline],
+                    "weight": round(self._route_weight(flights), 2),
+                    "distance_km": round(distance_km, 1),
+                    "popup": self._route_popup(origin, destination, flights, rows_html, distance_km),
+                },
+            }
+            for origin, destination, flights, rows_html, airline, distance_km in routes[
+                ['origin', 'destination', 'flights', 'rows_html', 'airline', 'distance_km']
+            ].itertuples(index=False, name=None)
+        ]
+        return {"type": "FeatureCollection", "features": features}
+
+    def _add_routes_geojson(self, flight_map: folium.Map, routes: pd.DataFrame,
+                            geometry: Dict[Tuple[str, str], RouteGeometry], sidecar_file: Optional[str] = None):
+        collection = self._routes_feature_collection(routes, geometry)
+
+        if not sidecar_file:
+            RouteLayer(data=collection).add_to(flight_map)
+            return
+
+        with open(sidecar_file, 'w', encoding='utf-8') as f:
+            json.dump(collection, f, ensure_ascii=False, separators=(',', ':'))
+        # карта подгружает файл относительным путём, поэтому он должен лежать рядом с HTML
+        # и открываться через HTTP: браузеры не дают fetch для file://
+        RouteLayer(data_url=os.path.basename(sidecar_file)).add_to(flight_map)
+        logger.info(f"Routes written to {sidecar_file}")
+
+    def create_map(self, render_mode: str = "polyline", sidecar_file: Optional[str] = None,
+                   **load_options) -> Tuple[folium.Map, int, List[str]]:
+        flights_df = self.load_flights_data(**load_options)
+        result = self.render_map(flights_df, render_mode, sidecar_file)
+        return result.flight_map, result.routes_added, result.missing_airports
+
+    @metrics.timed("map_render")
+    def render_map(self, flights_df: pd.DataFrame, render_mode: str = "polyline",
+                   sidecar_file: Optional[str] = None) -> RenderResult:
+        if render_mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {render_mode}")
 
         if flights_df.empty:
             logger.warning("No flight data found")
-            return folium.Map(), 0, []
+            return RenderResult(folium.Map(), 0, [], "")
+
+        # координаты ищем один раз на уникальный код, дальше только map по колонкам
+        codes = pd.unique(flights_df[['origin', 'destination']].to_numpy().ravel())
+        coords = self._resolve_coordinates(codes)
 
         first_airport = flights_df.iloc[0]['origin']
-        center = self.geocoder.get_coordinates(first_airport) or (55, 37)
+        center = coords.get(first_airport) or (55, 37)
 
         flight_map = folium.Map(
             location=center,
@@ -267,59 +431,87 @@ class FlightVisualizer:
             tiles='CartoDB positron'
         )
 
-        missing_airports = set()
-        routes_added = 0
-
-        for _, row in flights_df.iterrows():
-            origin_coords = self.geocoder.get_coordinates(row['origin'])
-            dest_coords = self.geocoder.get_coordinates(row['destination'])
-
-            if not origin_coords:
-                missing_airports.add(row['origin'])
-            if not dest_coords:
-                missing_airports.add(row['destination'])
-            if not origin_coords or not dest_coords:
-                continue
-
-            popup_content = f"""
-            <div style="width: 250px">
-                <h4>{row['flight_number']} - {row['airline']}</h4>
-                <p><b>From:</b> {row['origin']} ({row.get('icao_code', '')})</p>
-                <p><b>To:</b> {row['destination']}</p>
-                <p><b>Departure:</b> {row['scheduled_departure'].strftime('%Y-%m-%d %H:%M')}</p>
-                <p><b>Arrival:</b> {row['scheduled_time'].strftime('%Y-%m-%d %H:%M')}</p>
-                <p><b>Status:</b> {row['status']}</p>
-                <p><b>Aircraft:</b> {row['aircraft_model']}</p>
-            </div>
-            """
+        located = [code for code, location in coords.items() if location]
+        has_origin = flights_df['origin'].isin(located)
+        has_destination = flights_df['destination'].isin(located)
+        missing_airports = set(flights_df.loc[~has_origin, 'origin']) | set(flights_df.loc[~has_destination, 'destination'])
 
-            folium.PolyLine(
-                locations=[origin_coords, dest_coords],
-                popup=popup_content,
-                tooltip=f"{row['flight_number']} ({row['airline']})",
-                color=self._generate_color(row['airline']),
-                weight=2,
-                opacity=0.7
-            ).add_to(flight_map)
-            routes_added += 1
+        routes_df = flights_df[has_origin & has_destination]
+        routes_added = len(routes_df)
 
-        self._add_airport_markers(flight_map, flights_df)
-        self._add_aircraft_legend(flight_map, flights_df)
+        if routes_added:
+            routes = self._build_routes(routes_df)
+            pairs = list(zip(routes['origin'], routes['destination']))
+            geometry = self.route_geometry.get_many(pairs, coords)
+            routes['distance_km'] = [geometry[pair].distance_km for pair in pairs]
+            self.route_geometry.save()
 
-        return flight_map, routes_added, sorted(missing_airports)
+            if render_mode == "geojson":
+                self._add_routes_geojson(flight_map, routes, geometry, sidecar_file)
+            else:
+                self._add_routes_polylines(flight_map, routes, geometry)
 
+        self._add_airport_markers(flight_map, coords, cluster=render_mode == "geojson")
+        legend_html = self._add_aircraft_legend(flight_map, flights_df)
+
+        # всё, что попадает в HTML помимо маршрутов: если не изменилось, при sidecar достаточно переписать данные
+        page_signature = hashlib.sha256("|".join(
+            [render_mode, str(sidecar_file), repr(center), ",".join(sorted(located)), legend_html]
+        ).encode("utf-8")).hexdigest()
+
+        return RenderResult(flight_map, routes_added, sorted(missing_airports), page_signature)
 
-def main_digest():
-    try:
-        logger.info("Starting flight data visualization...")
 
-        visualizer = FlightVisualizer(DB_CONFIG)
-        flight_map, routes_count, missing_airports = visualizer.create_map()
+def _setup_file_logging(path: str = LOG_FILE):
+    # файл лога открывается только при запуске дайджеста, а не при импорте модуля
+    root = logging.getLogger()
+    target = os.path.abspath(path)
+    if any(isinstance(h, logging.FileHandler) and h.baseFilename == target for h in root.handlers):
+        return
+    handler = logging.FileHandler(target)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    root.addHandler(handler)
 
-        flight_map.save(MAP_OUTPUT_FILE)
-        logger.info(f"Flight map saved to {MAP_OUTPUT_FILE}")
 
-        webbrowser.open(MAP_OUTPUT_FILE)
+def main_digest(render_mode: str = "polyline", use_sidecar: bool = False, days: float = 7,
+                max_rows: Optional[int] = MAX_FLIGHTS, incremental: bool = False, open_browser: bool = True,
+                from_archive: bool = False, archive_dir: Optional[str] = None):
+    _setup_file_logging()
+    try:
+        logger.info("Starting flight data visualization...")
+
+        started = time.perf_counter()
+        archive = None
+        if from_archive:
+            from ..data_archive.archive import ARCHIVE_DIR, FlightArchive
+
+            archive = FlightArchive(archive_dir or ARCHIVE_DIR)
+        visualizer = FlightVisualizer(DB_CONFIG, archive=archive)
+        sidecar_file = ROUTES_SIDECAR_FILE if render_mode == "geojson" and use_sidecar else None
+
+        if incremental:
+            from .incremental import IncrementalDigest
+
+            result = IncrementalDigest(visualizer).refresh(render_mode, sidecar_file, MAP_OUTPUT_FILE, days, max_rows)
+            if result is None:
+                return
+            routes_count, missing_airports = result.routes_added, result.missing_airports
+        else:
+            flight_map, routes_count, missing_airports = visualizer.create_map(
+                render_mode, sidecar_file, days=days, max_rows=max_rows)
+            with metrics.timer("map_save"):
+                flight_map.save(MAP_OUTPUT_FILE)
+
+        elapsed = time.perf_counter() - started
+
+        output_size = os.path.getsize(MAP_OUTPUT_FILE)
+        if sidecar_file and os.path.exists(sidecar_file):
+            output_size += os.path.getsize(sidecar_file)
+        logger.info(f"Flight map saved to {MAP_OUTPUT_FILE} ({render_mode}): "
+                    f"{output_size / 1024:.0f} KiB, rendered in {elapsed:.2f}s")
+
+        if open_browser:
+            webbrowser.open(MAP_OUTPUT_FILE)
 
         logger.info(f"Successfully visualized {routes_count} flight routes")
         if missing_airports:
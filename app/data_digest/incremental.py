@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+import pandas as pd
+import os
+import pickle
+import logging
+from .digest import FlightVisualizer, RenderResult, LOAD_COLUMNS, MAP_OUTPUT_FILE
+from ..atomic import atomic_write
+from ..data_parser.database import LAST_UPDATE_OVERLAP
+from ..metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIGEST_STATE_FILE = os.path.join(os.path.dirname(__file__), "digest_state.pkl")
+STATE_COLUMNS = list(LOAD_COLUMNS) + ["last_update"]
+FLIGHT_KEY = ["flight_number", "scheduled_time"]
+
+
+class DigestState(NamedTuple):
+    params: tuple
+    flights: pd.DataFrame
+    watermark: datetime
+    page_signature: str
+    built_at: datetime
+
+
+class IncrementalDigest:
+    def __init__(self, visualizer: FlightVisualizer, state_file: str = DIGEST_STATE_FILE,
+                 overlap: timedelta = LAST_UPDATE_OVERLAP, full_rebuild_after: timedelta = timedelta(hours=24)):
+        self.visualizer = visualizer
+        self.state_file = state_file
+        self.overlap = overlap
+        # удалённые из flights строки по last_update не увидеть — раз в сутки строим карту заново
+        self.full_rebuild_after = full_rebuild_after
+
+    def _load_state(self) -> Optional[DigestState]:
+        if not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file, "rb") as f:
+                return DigestState(*pickle.load(f))
+        except Exception as e:
+            logger.warning(f"Could not load digest state: {e}")
+            return None
+
+    def _save_state(self, state: DigestState):
+        try:
+            with atomic_write(self.state_file, "wb") as f:
+                pickle.dump(tuple(state), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Could not save digest state: {e}")
+
+    @staticmethod
+    def _window(flights: pd.DataFrame, since: datetime, max_rows: Optional[int]) -> pd.DataFrame:
+        # порядок как у полной загрузки (ORDER BY scheduled_time DESC): от него зависят центр карты и обрезка
+        flights = flights[flights['scheduled_time'] > since].sort_values('scheduled_time', ascending=False, kind='stable')
+        return flights.head(max_rows) if max_rows is not None else flights
+
+    @staticmethod
+    def _within_cap(cached: pd.DataFrame, delta: pd.DataFrame, max_rows: Optional[int]) -> pd.DataFrame:
+        # кэш обрезан по max_rows: строки старше границы обрезки на карту не попадут, это не изменения.
+        # на самой границе оставляем только уже известные рейсы — неизвестные там отрезал LIMIT
+        if max_rows is None or len(cached) < max_rows or delta.empty:
+            return delta
+        boundary = cached['scheduled_time'].min()
+        known = delta[FLIGHT_KEY].merge(cached[FLIGHT_KEY].drop_duplicates(), on=FLIGHT_KEY, how='left', indicator=True)
+        keep = (delta['scheduled_time'] > boundary).to_numpy() | (known['_merge'] == 'both').to_numpy()
+        return delta[keep]
+
+    @staticmethod
+    def _unseen(cached: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+        # из-за перекрытия часть строк уже в кэше с тем же last_update — это не изменения
+        if delta.empty or cached.empty:
+            return delta
+        columns = FLIGHT_KEY + ['last_update']
+        marked = delta[columns].merge(cached[columns].drop_duplicates(), on=columns, how='left', indicator=True)
+        return delta[(marked['_merge'] == 'left_only').to_numpy()]
+
+    def _patch(self, cached: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+        merged = self.visualizer.concat_frames([cached, delta], STATE_COLUMNS)
+        return merged.drop_duplicates(FLIGHT_KEY, keep='last').reset_index(drop=True)
+
+    def refresh(self, render_mode: str = "polyline", sidecar_file: Optional[str] = None,
+                output_file: str = MAP_OUTPUT_FILE, days: float = 7,
+                max_rows: Optional[int] = None) -> Optional[RenderResult]:
+        now = datetime.now()
+        since = now - timedelta(days=days)
+        params = (render_mode, sidecar_file, output_file, days, max_rows)
+        state = self._load_state()
+
+        rebuild = (
+            state is None
+            or state.params != params
+            or now - state.built_at > self.full_rebuild_after
+            or not os.path.exists(output_file)
+            or (sidecar_file is not None and not os.path.exists(sidecar_file))
+        )
+
+        if not rebuild:
+            windowed = state.flights[state.flights['scheduled_time'] > since]
+            aged_out = len(windowed) < len(state.flights)
+            # кэш обрезан по max_rows: строки за границей обрезки в нём отсутствуют, дочитать их можно только заново
+            if aged_out and max_rows is not None and len(state.flights) >= max_rows:
+                rebuild = True
+
+        if rebuild:
+            flights = self.visualizer.load_flights_data(since=since, max_rows=max_rows, columns=STATE_COLUMNS)
+            built_at = now
+            watermark = flights['last_update'].max().to_pydatetime() if not flights.empty else since
+        else:
+            delta = self.visualizer.load_flights_data(
+                since=since, max_rows=None, columns=STATE_COLUMNS, changed_since=state.watermark - self.overlap)
+            delta = self._unseen(state.flights, self._within_cap(state.flights, delta, max_rows))
+
+            if delta.empty and not aged_out:
+                logger.info(f"No flight changes since {state.watermark:%Y-%m-%d %H:%M:%S}, map is up to date")
+                return None
+
+            flights = self._window(self._patch(windowed, delta), since, max_rows)
+            built_at = state.built_at
+            watermark = max(state.watermark, delta['last_update'].max().to_pydatetime()) if not delta.empty else state.watermark
+            logger.info(f"Patched digest with {len(delta)} changed flights")
+
+        result = self.visualizer.render_map(flights, render_mode, sidecar_file)
+
+        if sidecar_file and not rebuild and result.page_signature == state.page_signature:
+            logger.info(f"Page unchanged, only {sidecar_file} was rewritten")
+        else:
+            with metrics.timer("map_save"):
+                result.flight_map.save(output_file)
+
+        self._save_state(DigestState(params, flights, watermark, result.page_signature, built_at))
+        return result
@@ -0,0 +1,89 @@
+from string import Template
+from typing import Callable
+import html
+import pandas as pd
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEGEND_MAX_FLIGHTS = 30
+UNKNOWN_MODEL = "Не указано"
+
+LEGEND_TEMPLATE = Template("""
+<div style="
+    position: fixed;
+    bottom: 50px;
+    left: 50px;
+    width: 300px;
+    max-height: 500px;
+    overflow: auto;
+    background-color: white;
+    border: 2px solid grey;
+    padding: 10px;
+    font-size: 12px;
+    z-index: 9999;
+">
+    <h4 style="margin-top:0; text-align: center;">Авиакомпании и модели самолетов</h4>
+$body
+</div>
+""")
+
+AIRLINE_TEMPLATE = Template("""
+<div style="margin: 10px 0 5px 0; border-bottom: 1px solid #ccc; padding-bottom: 3px;">
+    <i style="background: $color; width: 15px; height: 15px; display: inline-block; margin-right: 5px; vertical-align: middle;"></i>
+    <b>$airline</b>
+</div>""")
+
+MODEL_TEMPLATE = Template("""
+<div style="margin-left: 20px; margin-bottom: 10px;">
+    <div style="font-weight: bold; margin-bottom: 3px;">$model</div>
+    <div style="margin-left: 10px; font-size: 11px; column-count: 2; column-gap: 10px;">$flights$more</div>
+</div>""")
+
+
+def _escape_column(series: pd.Series) -> pd.Series:
+    # каждое уникальное значение экранируется один раз
+    values = series.unique()
+    return series.map({v: html.escape(str(v)) for v in values})
+
+
+def build_legend_html(flights_df: pd.DataFrame, color_for: Callable[[str], str],
+                      max_flights: int = LEGEND_MAX_FLIGHTS) -> str:
+    # повторяющиеся по дням номера рейса показываем один раз
+    legend = flights_df[['airline', 'aircraft_model', 'flight_number']] \
+        .dropna(subset=['flight_number']) \
+        .astype({'airline': object, 'aircraft_model': object, 'flight_number': object}) \
+        .fillna({'airline': 'Unknown', 'aircraft_model': UNKNOWN_MODEL}) \
+        .drop_duplicates() \
+        .sort_values(['airline', 'aircraft_model', 'flight_number'], kind='stable')
+
+    if legend.empty:
+        return LEGEND_TEMPLATE.substitute(body="")
+
+    keys = ['airline', 'aircraft_model']
+    legend['flight_number'] = _escape_column(legend['flight_number'])
+    grouped = legend.groupby(keys, sort=False)
+    groups = grouped.size().rename('total').to_frame()
+    groups['flights'] = grouped.head(max_flights).groupby(keys, sort=False)['flight_number'].agg(', '.join)
+    groups = groups.reset_index()
+
+    airlines = groups['airline']
+    first_of_airline = airlines.ne(airlines.shift()).to_numpy()
+    colors = {airline: color_for(airline) for airline in airlines.unique()}
+    airline_html = _escape_column(airlines)
+    model_html = _escape_column(groups['aircraft_model'])
+
+    parts = []
+    for is_first, airline, airline_escaped, model_escaped, flights, total in zip(
+            first_of_airline, airlines, airline_html, model_html, groups['flights'], groups['total']):
+        if is_first:
+            parts.append(AIRLINE_TEMPLATE.substitute(color=colors[airline], airline=airline_escaped))
+        hidden = total - min(total, max_flights)
+        parts.append(MODEL_TEMPLATE.substitute(
+            model=model_escaped,
+            flights=flights,
+            more=f" … и ещё {hidden}" if hidden else "",
+        ))
+
+    return LEGEND_TEMPLATE.substitute(body="".join(parts))
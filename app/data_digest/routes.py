@@ -0,0 +1,142 @@
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+import numpy as np
+import os
+import pickle
+import threading
+import logging
+from ..atomic import atomic_write
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROUTE_GEOMETRY_FILE = os.path.join(os.path.dirname(__file__), "route_geometry_cache.pkl")
+EARTH_RADIUS_KM = 6371.0
+KM_PER_POINT = 100.0
+MIN_ARC_POINTS = 2
+MAX_ARC_POINTS = 64
+
+Coordinates = Tuple[float, float]
+RouteKey = Tuple[str, str]
+
+
+class RouteGeometry(NamedTuple):
+    origin: Coordinates
+    destination: Coordinates
+    distance_km: float
+    points: np.ndarray  # (n, 2): lat, lon
+
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def great_circle_distances(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # haversine, устойчив для близких точек
+    lat1, lon1 = np.radians(starts[:, 0]), np.radians(starts[:, 1])
+    lat2, lon2 = np.radians(ends[:, 0]), np.radians(ends[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def arc_point_counts(distances: np.ndarray) -> np.ndarray:
+    return np.clip(np.ceil(distances / KM_PER_POINT).astype(int) + 1, MIN_ARC_POINTS, MAX_ARC_POINTS)
+
+
+def great_circle_arcs(starts: np.ndarray, ends: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # все дуги считаются одним проходом: точки разных маршрутов лежат подряд в плоском массиве,
+    # а для каждой точки известны индекс маршрута и доля пути t (slerp между единичными векторами)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    route = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(counts.sum()) - offsets[route]
+    t = step / (counts[route] - 1)
+
+    a, b = _unit_vectors(starts[:, 0], starts[:, 1]), _unit_vectors(ends[:, 0], ends[:, 1])
+    omega = np.arccos(np.clip(np.einsum("ij,ij->i", a, b), -1.0, 1.0))[route]
+    sin_omega = np.sin(omega)
+    degenerate = sin_omega < 1e-12
+    safe = np.where(degenerate, 1.0, sin_omega)
+    wa = np.where(degenerate, 1.0 - t, np.sin((1.0 - t) * omega) / safe)
+    wb = np.where(degenerate, t, np.sin(t * omega) / safe)
+    v = wa[:, None] * a[route] + wb[:, None] * b[route]
+
+    lat = np.degrees(np.arctan2(v[:, 2], np.hypot(v[:, 0], v[:, 1])))
+    lon = np.degrees(np.arctan2(v[:, 1], v[:, 0]))
+
+    # через антимеридиан линия не должна перескакивать через всю карту: накапливаем сдвиги ±360 внутри дуги
+    jumps = np.zeros_like(lon)
+    jumps[1:] = -360.0 * np.round(np.diff(lon) / 360.0)
+    jumps[offsets] = 0.0
+    shift = np.cumsum(jumps)
+    lon = lon + shift - np.repeat(shift[offsets], counts)
+
+    return np.column_stack((lat, lon))
+
+
+class RouteGeometryCache:
+    def __init__(self, path: Optional[str] = ROUTE_GEOMETRY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._routes: Dict[RouteKey, RouteGeometry] = self._load()
+        self._dirty = False
+
+    def _load(self) -> Dict[RouteKey, RouteGeometry]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "rb") as f:
+                return {key: RouteGeometry(*value) for key, value in pickle.load(f).items()}
+        except Exception as e:
+            logger.warning(f"Could not load route geometry cache: {e}")
+            return {}
+
+    def get_many(self, pairs: Iterable[RouteKey],
+                 coords: Dict[str, Optional[Coordinates]]) -> Dict[RouteKey, RouteGeometry]:
+        pairs = list(dict.fromkeys(pairs))
+        result = {}
+        missing = []
+
+        with self._lock:
+            for key in pairs:
+                origin, destination = coords.get(key[0]), coords.get(key[1])
+                if origin is None or destination is None:
+                    continue
+                cached = self._routes.get(key)
+                # координаты аэропорта могли уточниться — тогда дугу пересчитываем
+                if cached is not None and cached.origin == tuple(origin) and cached.destination == tuple(destination):
+                    result[key] = cached
+                else:
+                    missing.append((key, tuple(origin), tuple(destination)))
+
+        if missing:
+            starts = np.array([m[1] for m in missing], dtype=float)
+            ends = np.array([m[2] for m in missing], dtype=float)
+            distances = great_circle_distances(starts, ends)
+            counts = arc_point_counts(distances)
+            arcs = np.split(great_circle_arcs(starts, ends, counts), np.cumsum(counts)[:-1])
+
+            computed = {
+                key: RouteGeometry(origin, destination, float(distance), points)
+                for (key, origin, destination), distance, points in zip(missing, distances, arcs)
+            }
+            with self._lock:
+                self._routes.update(computed)
+                self._dirty = True
+            result.update(computed)
+            logger.info(f"Computed great-circle geometry for {len(computed)} routes")
+
+        return result
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+
+        with self._lock:
+            snapshot = {key: tuple(value) for key, value in self._routes.items()}
+            self._dirty = False
+
+        try:
+            with atomic_write(self.path, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Could not save route geometry cache: {e}")
@@ -0,0 +1,254 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import heapq
+import itertools
+import random
+import signal
+import threading
+import time
+import logging
+from .database import FlightDatabase
+from .parser import AIRPORTS, DB_CONFIG, AirportResult, FlightParser
+from .partitions import PartitionManager
+from .pool import ConnectionPool, get_pool
+from .response_cache import ResponseCache
+from ..metrics import metrics
+from ..collections_day_and_hour.day_collections import FlightReport
+from ..collections_day_and_hour.hour_collections import HourlyFlightReport
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ScheduleKey = Tuple[str, str]
+
+
+class AirportSchedule:
+    def __init__(self, airport: str, direction: str, interval: float):
+        self.airport = airport
+        self.direction = direction
+        self.interval = interval
+        self.density = 0.0  # сглаженное число рейсов в расписании за опрос
+        self.change_rate = 0.0  # сглаженная доля опросов, в которых что-то изменилось
+        self.polls = 0
+        self.failures = 0
+
+    @property
+    def key(self) -> ScheduleKey:
+        return self.airport, self.direction
+
+
+class PollingDaemon:
+    def __init__(self, parser: FlightParser, airports: List[str], pool: ConnectionPool,
+                 reporter: Optional[FlightReport] = None, hourly_reporter: Optional[HourlyFlightReport] = None,
+                 max_workers: int = 4, min_interval: float = 60.0, max_interval: float = 1800.0,
+                 initial_interval: float = 300.0, jitter: float = 0.15, density_reference: float = 20.0,
+                 smoothing: float = 0.3, report_interval: float = 300.0, max_write_latency: float = 5.0):
+        self.parser = parser
+        self.pool = pool
+        self.reporter = reporter
+        self.hourly_reporter = hourly_reporter
+        self.max_workers = max(1, max_workers)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        # при density_reference рейсов за опрос и больше верхняя граница интервала уменьшается пропорционально
+        self.density_reference = density_reference
+        self.smoothing = smoothing
+        self.report_interval = report_interval
+        # пул рассчитан на всех воркеров, очереди к нему не бывает — перегрузку БД видно по времени записи:
+        # если сглаженная запись страницы дольше max_write_latency секунд, опросы идут по одному
+        self.max_write_latency = max_write_latency
+        self.airports = list(airports)
+
+        self.schedules: Dict[ScheduleKey, AirportSchedule] = {}
+        self._heap: List[Tuple[float, int, ScheduleKey]] = []
+        self._sequence = itertools.count()
+        self._in_flight: Dict[ScheduleKey, Future] = {}
+        # RLock: stop() из обработчика сигнала может прийти, пока главный поток держит блокировку
+        self._wakeup = threading.Condition(threading.RLock())
+        self._stop = threading.Event()
+
+        now = time.monotonic()
+        for index, (airport, direction) in enumerate(
+                (airport, direction) for airport in self.airports for direction in parser.directions):
+            schedule = AirportSchedule(airport, direction, initial_interval)
+            self.schedules[schedule.key] = schedule
+            # первый проход размазываем по интервалу, чтобы не бить в FR24 пачкой
+            self._push(schedule.key, now + random.uniform(0, min(initial_interval, 2.0 * index + 1)))
+
+    def _push(self, key: ScheduleKey, run_at: float):
+        heapq.heappush(self._heap, (run_at, next(self._sequence), key))
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _density_cap(self, schedule: AirportSchedule) -> float:
+        if schedule.density <= self.density_reference:
+            return self.max_interval
+        return max(self.min_interval, self.max_interval * self.density_reference / schedule.density)
+
+    def next_interval(self, schedule: AirportSchedule, result: AirportResult) -> float:
+        if not result.ok:
+            schedule.failures += 1
+            breaker = self.parser.client.breaker
+            if breaker.is_open(schedule.airport):
+                return max(schedule.interval, breaker.reset_timeout)
+            # ошибки — экспоненциально реже, но не реже max_interval
+            return min(self.max_interval, schedule.interval * 2)
+
+        schedule.failures = 0
+        schedule.polls += 1
+        seen = result.inserted + result.updated + result.unchanged + result.skipped
+        changed = result.inserted + result.updated > 0
+        alpha = self.smoothing
+        # закэшированные страницы рейсов не разбирались — плотность по ним не обновляем
+        if seen or not result.cached:
+            schedule.density = seen if schedule.polls == 1 else alpha * seen + (1 - alpha) * schedule.density
+        schedule.change_rate = alpha * changed + (1 - alpha) * schedule.change_rate
+
+        # AIMD по изменениям: изменилось — опрашиваем вдвое чаще, нет — в полтора раза реже
+        interval = schedule.interval * (0.5 if changed else 1.5)
+        return min(max(interval, self.min_interval), self._density_cap(schedule))
+
+    def _backpressure(self) -> bool:
+        latency = self.parser.db.write_latency
+        return latency is not None and latency > self.max_write_latency
+
+    def _concurrency_limit(self) -> int:
+        # один опрос идёт всегда: иначе время записи не обновится и демон не выйдет из торможения
+        return 1 if self._backpressure() else self.max_workers
+
+    def _poll(self, key: ScheduleKey) -> AirportResult:
+        airport, direction = key
+        try:
+            return self.parser.ingest_airport(airport, direction)
+        except Exception as e:
+            logger.error(f"Polling {airport}/{direction} failed: {e}")
+            return AirportResult(airport, False, 0, 0.0, str(e), direction=direction)
+
+    def _on_done(self, key: ScheduleKey, future: Future):
+        result = future.result()
+        with self._wakeup:
+            schedule = self.schedules[key]
+            schedule.interval = self.next_interval(schedule, result)
+            delay = self._jittered(schedule.interval)
+            self._in_flight.pop(key, None)
+            metrics.set("poll_interval_seconds", schedule.interval, airport=key[0], direction=key[1])
+            if not self._stop.is_set():
+                self._push(key, time.monotonic() + delay)
+            self._wakeup.notify()
+
+        logger.info(
+            f"{key[0]}/{key[1]}: "
+            + (f"+{result.inserted} ~{result.updated} ={result.unchanged}" if result.ok else f"error ({result.error})")
+            + f", density {schedule.density:.0f}, next poll in {delay:.0f}s"
+        )
+
+    def _refresh_reports(self):
+        touched_hours = self.parser.db.pop_touched_hours()
+        if not touched_hours:
+            return
+        if self.reporter:
+            self.reporter.refresh_days({h.date() for h in touched_hours}, self.airports)
+        if self.hourly_reporter:
+            self.hourly_reporter.refresh_hours(touched_hours, self.airports)
+
+    def _maintenance(self):
+        try:
+            self._refresh_reports()
+        except Exception as e:
+            logger.error(f"Summary refresh failed: {e}")
+        if self.parser.db.partitions:
+            # будущие секции — заранее и отдельно от записи, чтобы опросы не упирались в DDL на flights
+            self.parser.db.partitions.maintain()
+        if self.parser.response_cache:
+            self.parser.response_cache.save()
+        if metrics.enabled:
+            for name, value in self.pool.stats().items():
+                metrics.set("db_pool", value, stat=name)
+            if self.parser.db.write_latency is not None:
+                metrics.set("db_write_latency_seconds", self.parser.db.write_latency)
+        metrics.flush()
+
+    def stop(self, *_):
+        if not self._stop.is_set():
+            logger.info("Shutdown requested, waiting for in-flight polls to finish...")
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def install_signal_handlers(self):
+        try:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        except ValueError:
+            # сигналы можно перехватывать только из главного потока
+            logger.warning("Signal handlers not installed: daemon is not running in the main thread")
+
+    def run(self, duration: Optional[float] = None):
+        started = time.monotonic()
+        next_maintenance = started + self.report_interval
+        logger.info(f"Polling daemon started: {len(self.schedules)} schedules, {self.max_workers} workers")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="poll") as executor:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if duration is not None and now - started >= duration:
+                    break
+                if now >= next_maintenance:
+                    self._maintenance()
+                    next_maintenance = now + self.report_interval
+
+                with self._wakeup:
+                    due = []
+                    limit = self._concurrency_limit()
+                    while (self._heap and self._heap[0][0] <= now
+                           and len(self._in_flight) + len(due) < limit):
+                        due.append(heapq.heappop(self._heap)[2])
+
+                    for key in due:
+                        future = executor.submit(self._poll, key)
+                        self._in_flight[key] = future
+                        future.add_done_callback(lambda f, key=key: self._on_done(key, f))
+
+                    # спим до ближайшего опроса, завершения опроса, сигнала или обслуживания
+                    wait_until = min(self._heap[0][0] if self._heap else now + self.max_interval, next_maintenance)
+                    if len(self._in_flight) >= limit:
+                        # писатель в БД не успевает или все воркеры заняты — ждём освобождения
+                        wait_until = min(wait_until, now + 1.0)
+                    if not self._stop.is_set():
+                        self._wakeup.wait(timeout=max(0.05, wait_until - time.monotonic()))
+
+            self._stop.set()
+
+        # executor дождался текущих опросов — досчитываем сводки и сохраняем кэш
+        self._maintenance()
+        logger.info(f"Polling daemon stopped at {datetime.now():%Y-%m-%d %H:%M:%S}, pool stats: {self.pool.stats()}")
+
+
+def main_daemon(airports: Optional[List[str]] = None, max_workers: int = 4, page_size: int = 100,
+                max_pages: Optional[int] = None, mode: str = "both", min_interval: float = 60.0,
+                max_interval: float = 1800.0, report_interval: float = 300.0,
+                partitioning: Optional[str] = None, duration: Optional[float] = None):
+    airports = list(airports or AIRPORTS)
+    # соединения держим открытыми весь срок работы: воркерам парсера плюс одно на сводки
+    pool = get_pool(DB_CONFIG, min_size=min(2, max_workers), max_size=max_workers + 1)
+    pool.warm()
+
+    partitions = None
+    if partitioning:
+        partitions = PartitionManager(pool, granularity=partitioning)
+        if not partitions.maintain():
+            partitions = None
+
+    db = FlightDatabase(DB_CONFIG, pool=pool, partitions=partitions)
+    parser = FlightParser(db, max_per_host=max_workers, page_size=page_size, max_pages=max_pages, mode=mode,
+                          tracked_airports=airports, response_cache=ResponseCache())
+    daemon = PollingDaemon(parser, airports, pool,
+                           reporter=FlightReport(DB_CONFIG, pool=pool),
+                           hourly_reporter=HourlyFlightReport(DB_CONFIG, pool=pool),
+                           max_workers=max_workers, min_interval=min_interval, max_interval=max_interval,
+                           report_interval=report_interval)
+    daemon.install_signal_handlers()
+    daemon.run(duration=duration)
@@ -1,77 +1,257 @@
-import psycopg2
-from typing import List, Dict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+from .pool import ConnectionPool, get_pool
+from .partitions import PartitionManager
+from ..metrics import metrics
+import threading
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+WRITE_LATENCY_SMOOTHING = 0.3
+# last_update = CURRENT_TIMESTAMP — время начала транзакции записи, а не её коммита: строки долгой транзакции
+# становятся видны позже своего last_update. Кто дочитывает flights по водяной отметке last_update
+# (инкрементальная карта, архив), перечитывает этот интервал до отметки, чтобы не пропустить такие строки
+LAST_UPDATE_OVERLAP = timedelta(minutes=5)
+FLIGHT_COLUMNS = (
+    "flight_number", "airline", "origin",
+    "destination", "scheduled_time", "scheduled_departure",
+    "status", "aircraft_model", "icao_code"
+)
+
+# временная таблица живёт вместе с соединением из пула и чистится перед каждым батчем: строки переживают commit,
+# чтобы между COPY и merge можно было отдельной транзакцией создать секции;
+# seq нумерует строки в порядке COPY — при повторе ключа в батче побеждает последняя
+STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS flights_staging (
+        seq BIGINT GENERATED ALWAYS AS IDENTITY,
+        flight_number VARCHAR(10),
+        airline VARCHAR(50),
+        origin CHAR(3),
+        destination CHAR(3),
+        scheduled_time TIMESTAMP,
+        scheduled_departure TIMESTAMP,
+        status VARCHAR(50),
+        aircraft_model VARCHAR(50),
+        icao_code CHAR(4)
+    ) ON COMMIT PRESERVE ROWS
+"""
+STAGING_BOUNDS_SQL = "SELECT MIN(scheduled_time), MAX(scheduled_time) FROM flights_staging"
+
+COPY_SQL = f"COPY flights_staging ({', '.join(FLIGHT_COLUMNS)}) FROM STDIN"
+
+_UPDATABLE_COLUMNS = tuple(c for c in FLIGHT_COLUMNS if c not in ("flight_number", "scheduled_time"))
+
+# одна операция на весь батч: новые рейсы вставляются, изменившиеся обновляются,
+# неизменившиеся строки не трогаются вовсе (нет лишних версий строк и раздувания индексов)
+_MERGE_TEMPLATE = f"""
+    WITH staged AS (
+        SELECT DISTINCT ON (flight_number, scheduled_time) {', '.join(FLIGHT_COLUMNS)}
+        FROM flights_staging
+        ORDER BY flight_number, scheduled_time, seq DESC
+    ),
+    existing AS (
+        -- CTE видят снимок до вставки: это число уже существовавших ключей батча
+        SELECT COUNT(*) AS n
+        FROM flights f
+        JOIN staged s USING (flight_number, scheduled_time)
+    ),
+    merged AS (
+        INSERT INTO flights ({', '.join(FLIGHT_COLUMNS)})
+        SELECT {', '.join(FLIGHT_COLUMNS)} FROM staged
+        ON CONFLICT (flight_number, scheduled_time) DO UPDATE SET
+            {', '.join(f"{c} = EXCLUDED.{c}" for c in _UPDATABLE_COLUMNS)},
+            last_update = CURRENT_TIMESTAMP
+        WHERE ({', '.join(f"flights.{c}" for c in _UPDATABLE_COLUMNS)})
+            IS DISTINCT FROM ({', '.join(f"EXCLUDED.{c}" for c in _UPDATABLE_COLUMNS)})
+        RETURNING flight_number, scheduled_time, status
+    ){{history_cte}}
+    SELECT
+        (SELECT COUNT(*) FROM staged) AS total,
+        (SELECT COUNT(*) FROM staged) - (SELECT n FROM existing) AS inserted,
+        (SELECT COUNT(*) FROM merged) - ((SELECT COUNT(*) FROM staged) - (SELECT n FROM existing)) AS updated,
+        ARRAY(SELECT DISTINCT date_trunc('hour', scheduled_time) FROM merged) AS touched_hours,
+        {{status_changes}} AS status_changes
+"""
+
+# в историю попадают только строки, которые merge действительно записал, и только со сменой статуса:
+# flights здесь читается в снимке до вставки, так что f.status — статус до батча (NULL — рейс новый)
+STATUS_HISTORY_CTE = """,
+    transitions AS (
+        INSERT INTO flight_status_history (flight_number, scheduled_time, old_status, new_status)
+        SELECT m.flight_number, m.scheduled_time, f.status, m.status
+        FROM merged m
+        LEFT JOIN flights f USING (flight_number, scheduled_time)
+        WHERE f.status IS DISTINCT FROM m.status
+        RETURNING 1
+    )"""
+
+MERGE_SQL = _MERGE_TEMPLATE.format(history_cte="", status_changes="0")
+MERGE_WITH_HISTORY_SQL = _MERGE_TEMPLATE.format(history_cte=STATUS_HISTORY_CTE,
+                                                status_changes="(SELECT COUNT(*) FROM transitions)")
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyRowStream:
+    # file-like обёртка над генератором строк для cursor.copy_expert: читает ровно столько, сколько просит драйвер
+    def __init__(self, rows: Iterable[Tuple]):
+        self._rows = iter(rows)
+        self._pending = ""
+        self.rows = 0
+
+    def read(self, size: int = -1) -> str:
+        chunks = [self._pending] if self._pending else []
+        length = len(self._pending)
+        self._pending = ""
+
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = "\t".join(map(_copy_value, row)) + "\n"
+            chunks.append(line)
+            length += len(line)
+            self.rows += 1
+
+        data = "".join(chunks)
+        if 0 <= size < len(data):
+            self._pending = data[size:]
+            data = data[:size]
+        return data
+
+
 class FlightDatabase:
-    def __init__(self, db_config: dict):
+    def __init__(self, db_config: dict, pool: Optional[ConnectionPool] = None,
+                 partitions: Optional[PartitionManager] = None, status_history: Optional[bool] = None):
         self.db_config = db_config
+        self.pool = pool or get_pool(db_config)
+        self.partitions = partitions
+        # None — писать историю статусов, если таблица flight_status_history создана (проверяется один раз)
+        self.status_history = status_history
+        # часы, в которых что-то вставилось или поменялось — по ним пересчитываются сводки
+        self._touched_hours: Set[datetime] = set()
+        self._touched_lock = threading.Lock()
+        # сглаженное время записи страницы, включая ожидание соединения — по нему демон видит перегрузку БД
+        self.write_latency: Optional[float] = None
+
+    def pop_touched_hours(self) -> Set[datetime]:
+        with self._touched_lock:
+            touched, self._touched_hours = self._touched_hours, set()
+        return touched
 
     def _get_connection(self):
         try:
-            conn = psycopg2.connect(
-                **self.db_config,
-                connect_timeout=5
-            )
-            conn.autocommit = False
-            return conn
+            return self.pool.getconn()
         except Exception as e:
             logger.error(f"Connection error: {e}")
             return None
 
-    def save_flights(self, flights: List[Dict]) -> bool:
-        if not flights:
+    def _release_connection(self, conn):
+        self.pool.putconn(conn)
+
+    def _merge_sql(self, cur) -> str:
+        if self.status_history is None:
+            cur.execute("SELECT to_regclass('flight_status_history') IS NOT NULL")
+            self.status_history = cur.fetchone()[0]
+            if not self.status_history:
+                logger.info("flight_status_history table not found, status changes are not recorded")
+        return MERGE_WITH_HISTORY_SQL if self.status_history else MERGE_SQL
+
+    @staticmethod
+    def _flight_rows(flights: Iterable[Union[Dict, Tuple]]) -> Iterator[Tuple]:
+        for f in flights:
+            # FlightRecord уже лежит в порядке FLIGHT_COLUMNS, словари (parse_flight) раскладываем
+            if isinstance(f, tuple):
+                yield f
+            else:
+                yield tuple(f.get(column) for column in FLIGHT_COLUMNS)
+
+    def save_flights(self, flights: Iterable[Union[Dict, Tuple]]) -> bool:
+        return self.upsert_flights(flights) is not None
+
+    @metrics.timed("db_write")
+    def upsert_flights(self, flights: Iterable[Union[Dict, Tuple]]) -> Optional[Dict[str, int]]:
+        if isinstance(flights, list) and not flights:
             logger.warning("No flights data to save")
-            return False
+            return None
 
+        started = time.perf_counter()
         conn = self._get_connection()
         if not conn:
-            return False
+            return None
 
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    DELETE FROM flights 
-                    WHERE flight_number = %s 
-                    AND scheduled_time = %s
-                """, (
-                    flights[0]['flight_number'],
-                    flights[0]['scheduled_time']
-                ))
-
-                insert_sql = """
-                    INSERT INTO flights (
-                        flight_number, airline, origin, 
-                        destination, scheduled_time, scheduled_departure,
-                        status, aircraft_model, icao_code
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-
-                records = [
-                    (
-                        f.get('flight_number'),
-                        f.get('airline'),
-                        f.get('origin'),
-                        f.get('destination'),
-                        f.get('scheduled_time'),
-                        f.get('scheduled_departure'),
-                        f.get('status'),
-                        f.get('aircraft_model'),
-                        f.get('icao_code')
-                    )
-                    for f in flights
-                ]
-
-                cur.executemany(insert_sql, records)
+                cur.execute(STAGING_DDL)
+                cur.execute("TRUNCATE flights_staging")
+
+                stream = CopyRowStream(self._flight_rows(flights))
+                cur.copy_expert(COPY_SQL, stream)
+                if not stream.rows:
+                    conn.rollback()
+                    logger.warning("No flights data to save")
+                    return None
+
+                if self.partitions:
+                    # секции обычно созданы заранее (PartitionManager.maintain), здесь — страховка для старых/дальних
+                    # дат. Границы батча берём из staging, а не копим рейсы в памяти; DDL идёт своей транзакцией
+                    # между COPY и merge — в транзакции merge его быть не должно
+                    cur.execute(STAGING_BOUNDS_SQL)
+                    time_from, time_to = cur.fetchone()
+                    conn.commit()
+                    try:
+                        self.partitions.ensure_partitions(time_from, time_to, conn=conn)
+                    except Exception as e:
+                        logger.error(f"Could not create partitions: {e}")
+                        metrics.inc("stage_errors_total", stage="db_write")
+                        return None
+
+                cur.execute(self._merge_sql(cur))
+                total, inserted, updated, touched_hours, status_changes = cur.fetchone()
+                cur.execute("TRUNCATE flights_staging")
                 conn.commit()
-                logger.info(f"Saved {len(flights)} flights")
-                return True
+
+                with self._touched_lock:
+                    self._touched_hours.update(touched_hours or ())
+                    elapsed = time.perf_counter() - started
+                    self.write_latency = elapsed if self.write_latency is None else \
+                        WRITE_LATENCY_SMOOTHING * elapsed + (1 - WRITE_LATENCY_SMOOTHING) * self.write_latency
+
+                counts = {
+                    "inserted": inserted,
+                    "updated": updated,
+                    "unchanged": total - inserted - updated,
+                }
+                for outcome, count in counts.items():
+                    metrics.inc("written_total", count, outcome=outcome)
+                metrics.inc("status_changes_total", status_changes)
+                counts["status_changes"] = status_changes
+                logger.info(
+                    f"Saved {stream.rows} flights: {counts['inserted']} inserted, "
+                    f"{counts['updated']} updated, {counts['unchanged']} unchanged, "
+                    f"{status_changes} status changes"
+                )
+                return counts
 
         except Exception as e:
             conn.rollback()
             logger.error(f"Database error: {e}")
-            return False
+            metrics.inc("stage_errors_total", stage="db_write")
+            return None
         finally:
-            conn.close()
+            self._release_connection(conn)
@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FlightRecord(NamedTuple):
+    # порядок полей совпадает с FLIGHT_COLUMNS в database.py — запись уходит в COPY как есть
+    flight_number: str
+    airline: str
+    origin: str
+    destination: str
+    scheduled_time: datetime
+    scheduled_departure: Optional[datetime]
+    status: str
+    aircraft_model: str
+    icao_code: str
+
+
+_EMPTY: Dict[str, Any] = {}
+
+
+def _node(parent: dict, key: str) -> dict:
+    # промежуточный узел пути; не-dict (None, строка, список) читается как пустой — как _safe_get в parse_flight
+    value = parent.get(key)
+    return value if value.__class__ is dict else _EMPTY
+
+
+def extract_fields(record: dict) -> tuple:
+    # один проход по записи: общие узлы ("flight", "airport", ...) разыменовываются по одному разу,
+    # а не заново на каждое поле, как в parse_flight; умолчания — те же, что у parse_flight
+    flight = _node(record, "flight") if record.__class__ is dict else _EMPTY
+    airport = _node(flight, "airport")
+    origin = _node(_node(airport, "origin"), "code")
+    scheduled = _node(_node(flight, "time"), "scheduled")
+    model = _node(_node(flight, "aircraft"), "model")
+
+    number = _node(_node(flight, "identification"), "number").get("default")
+    airline = _node(flight, "airline").get("name")
+    origin_iata = origin.get("iata")
+    destination_iata = _node(_node(airport, "destination"), "code").get("iata")
+    arrival_ts = scheduled.get("arrival")
+    departure_ts = scheduled.get("departure")
+    status = _node(flight, "status").get("text")
+    return (
+        "UNKNOWN" if number is None else number,
+        "Unknown" if airline is None else airline,
+        "XXX" if origin_iata is None else origin_iata,
+        origin.get("icao"),
+        "XXX" if destination_iata is None else destination_iata,
+        0 if arrival_ts is None else arrival_ts,
+        0 if departure_ts is None else departure_ts,
+        "Unknown" if status is None else status,
+        model.get("text"),
+        model.get("code"),
+    )
+
+
+_EPOCH = datetime.fromtimestamp(0)
+# JSON отдаёт время числом; всё остальное (строка, dict, list) parse_flight тоже не разбирал — запись пропускается
+_NUMBERS = (int, float)
+
+
+def convert_timestamps(stamps: Iterable[Any]) -> Dict[Any, datetime]:
+    # расписание одного аэропорта состоит из повторяющихся значений времени — конвертируем каждое один раз
+    converted = {}
+    for ts in set(ts for ts in stamps if ts and isinstance(ts, _NUMBERS)):
+        try:
+            converted[ts] = datetime.fromtimestamp(ts)
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            logger.error(f"Flight parsing error: bad timestamp {ts!r}: {e}")
+    return converted
+
+
+class FlightExtractor:
+    @staticmethod
+    def _log_bad_timestamp(ts: Any):
+        # числа, которые не перевелись во время, уже залогированы в convert_timestamps
+        if not isinstance(ts, _NUMBERS):
+            logger.error(f"Flight parsing error: bad timestamp {ts!r}")
+
+    def extract_page(self, flights_data: List[dict], airport: str, direction: str = "arrivals",
+                     airport_icao: str = "N/A") -> List[FlightRecord]:
+        rows = [extract_fields(flight) for flight in flights_data]
+        timestamps = convert_timestamps(stamp for row in rows for stamp in (row[5], row[6]))
+        departures = direction == "departures"
+
+        records = []
+        for (flight_number, airline, origin_iata, origin_icao, destination_iata,
+             arrival_ts, departure_ts, status, model_text, model_code) in rows:
+            # как в parse_flight: пустое время прилёта — эпоха, пустое время вылета — None,
+            # неразбираемое значение в любом из них — запись пропускается
+            scheduled_time = _EPOCH
+            if arrival_ts:
+                scheduled_time = timestamps.get(arrival_ts) if isinstance(arrival_ts, _NUMBERS) else None
+                if scheduled_time is None:
+                    self._log_bad_timestamp(arrival_ts)
+                    continue
+            scheduled_departure = None
+            if departure_ts:
+                scheduled_departure = timestamps.get(departure_ts) if isinstance(departure_ts, _NUMBERS) else None
+                if scheduled_departure is None:
+                    self._log_bad_timestamp(departure_ts)
+                    continue
+
+            if departures:
+                origin, destination = airport, destination_iata
+                icao_code = origin_icao or airport_icao
+            else:
+                origin, destination = origin_iata, airport
+                icao_code = origin_icao or "N/A"
+
+            records.append(FlightRecord(
+                flight_number,
+                airline,
+                origin,
+                destination,
+                scheduled_time,
+                scheduled_departure,
+                status,
+                model_text or model_code or "Unknown",
+                icao_code,
+            ))
+        return records
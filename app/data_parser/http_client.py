@@ -0,0 +1,176 @@
+import requests
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import random
+import threading
+import time
+import logging
+from ..metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 120.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                # half-open: пропускаем одну пробную попытку, при неудаче цепь снова разомкнётся
+                self._opened_at[key] = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, key: str):
+        with self._lock:
+            self._failures.pop(key, None)
+            self._opened_at.pop(key, None)
+
+    def record_failure(self, key: str):
+        with self._lock:
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+            if failures >= self.failure_threshold:
+                if key not in self._opened_at:
+                    logger.warning(f"Circuit opened for {key} after {failures} failed requests")
+                self._opened_at[key] = time.monotonic()
+
+    def is_open(self, key: str) -> bool:
+        with self._lock:
+            return key in self._opened_at
+
+
+class FR24Client:
+    def __init__(self, session: requests.Session, max_retries: int = 5, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, rate: float = 4.0, burst: float = 8.0, max_per_host: int = 4,
+                 timeout: float = 15, breaker: Optional[CircuitBreaker] = None):
+        self.session = session
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.max_per_host = max(1, max_per_host)
+        # один bucket и один breaker на все воркеры парсера
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = breaker or CircuitBreaker()
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_per_host)
+                self._host_slots[host] = slot
+            return slot
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: равномерно в [0, base * 2^attempt], чтобы воркеры не били в API синхронно
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, url: str, params: Optional[dict] = None, key: Optional[str] = None,
+            headers: Optional[dict] = None) -> requests.Response:
+        key = key or urlsplit(url).netloc
+        if not self.breaker.allow(key):
+            metrics.inc("fr24_circuit_open_total")
+            raise CircuitOpenError(f"Circuit open for {key}, skipping request")
+
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self._backoff(attempt - 1)
+                if isinstance(last_error, requests.exceptions.HTTPError) and last_error.response is not None:
+                    retry_after = self._retry_after(last_error.response)
+                    if retry_after is not None:
+                        delay = min(max(delay, retry_after), self.backoff_max * 4)
+                logger.info(f"Retrying {key} in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries + 1}): {last_error}")
+                metrics.inc("fr24_retries_total")
+                time.sleep(delay)
+
+            # ожидание собственного rate limit отдельно от сети: видно, кто тормозит — мы или FR24
+            with metrics.timer("rate_limit_wait"):
+                self.bucket.acquire()
+            try:
+                with self._host_slot(url), metrics.timer("http_fetch"):
+                    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.inc("fr24_responses_total", status=type(e).__name__)
+                last_error = e
+                continue
+
+            metrics.inc("fr24_responses_total", status=response.status_code)
+
+            if response.status_code in RETRY_STATUSES:
+                last_error = requests.exceptions.HTTPError(
+                    f"HTTP {response.status_code} for url: {response.url}", response=response
+                )
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                # 4xx кроме 429 повторять бессмысленно
+                self.breaker.record_failure(key)
+                raise
+
+            self.breaker.record_success(key)
+            return response
+
+        self.breaker.record_failure(key)
+        raise last_error
@@ -1,7 +1,21 @@
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+import csv
+import json
+import os
+import queue
+import threading
 import time
 from .database import FlightDatabase
+from .extractor import FlightExtractor, FlightRecord
+from .http_client import FR24Client
+from .response_cache import ResponseCache
+from .pool import get_pool
+from ..metrics import metrics
+from .partitions import PartitionManager
 from ..collections_day_and_hour.day_collections import FlightReport
 from ..collections_day_and_hour.hour_collections import HourlyFlightReport
 import logging
@@ -9,14 +23,119 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+API_URL = "https://api.flightradar24.com/common/v1/airport.json"
+MAX_PAGE_SIZE = 100  # больше FR24 за одну страницу не отдаёт
+DIRECTIONS = ("arrivals", "departures")
+# при таких результатах повторный запрос ничего не изменит
+NON_RETRYABLE_ERRORS = frozenset({"no flights data", "no valid flights"})
+MODES = DIRECTIONS + ("both",)
+
+_END_OF_PAGES = object()
+
+
+def prefetch(items: Iterable, depth: int) -> Iterator:
+    # фоновый поток тянет следующие страницы, пока вызывающий код пишет текущую в БД;
+    # очередь ограничена depth, поэтому в памяти никогда не больше depth + 1 страниц
+    if depth <= 0:
+        yield from items
+        return
+
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        error = None
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            error = e
+        put((_END_OF_PAGES, error))
+
+    thread = threading.Thread(target=produce, name="page-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _END_OF_PAGES:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+class SchedulePage(NamedTuple):
+    flights_data: List[dict]
+    total_pages: int
+    cache_key: str
+    content_hash: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    unchanged: bool = False  # 304 или байт-в-байт тот же ответ — парсить и писать нечего
+
+
+class AirportResult(NamedTuple):
+    airport: str
+    ok: bool
+    flights: int
+    elapsed: float
+    error: Optional[str] = None
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    pages: int = 0
+    direction: str = "arrivals"
+    skipped: int = 0
+    cached: int = 0
+
+
 class FlightParser:
-    def __init__(self, db_handler: FlightDatabase):
+    def __init__(self, db_handler: FlightDatabase, max_per_host: int = 4, page_size: int = 20,
+                 max_pages: Optional[int] = 1, prefetch_pages: int = 1, mode: str = "arrivals",
+                 tracked_airports: Optional[Iterable[str]] = None, client: Optional[FR24Client] = None,
+                 response_cache: Optional[ResponseCache] = None, api_url: str = API_URL):
+        if mode not in MODES:
+            raise ValueError(f"Unknown schedule mode: {mode}")
+
         self.db = db_handler
+        self.api_url = api_url  # подменяется на локальный стенд в benchmarks/
+        self.mode = mode
+        self.directions = DIRECTIONS if mode == "both" else (mode,)
+        # рейс между двумя нашими аэропортами в режиме both пишется один раз: вылет пропускается, только если
+        # сторона прилёта уже записала этот рейс с тем же статусом (см. _already_written)
+        self.tracked_airports = frozenset(tracked_airports or ())
+        self._arrivals_written: Dict[str, Dict[str, Dict[Tuple[str, datetime], str]]] = {}
+        self._arrivals_lock = threading.Lock()
+        self._airport_icao: Dict[str, str] = {}
+        self.extractor = FlightExtractor()
+        self.max_per_host = max(1, max_per_host)
+        self.page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+        self.max_pages = max_pages  # None — пройти все страницы расписания
+        self.prefetch_pages = prefetch_pages
         self.session = requests.Session()
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0",
             "Accept": "application/json"
         })
+        # пул соединений urllib3 должен вмещать все параллельные запросы к одному хосту
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, self.max_per_host))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # ретраи, rate limit и circuit breaker — общие для всех воркеров
+        self.client = client or FR24Client(self.session, max_per_host=self.max_per_host)
+        self.response_cache = response_cache
 
     def _safe_get(self, data: dict, keys: list, default=None):
         for key in keys:
@@ -26,22 +145,29 @@ class FlightParser:
                 return default
         return data
 
-    def parse_flight(self, flight: dict, airport: str):
+    def parse_flight(self, flight: dict, airport: str, direction: str = "arrivals"):
         try:
             scheduled_arrival_ts = self._safe_get(flight, ['flight', 'time', 'scheduled', 'arrival'], 0)
             scheduled_departure_ts = self._safe_get(flight, ['flight', 'time', 'scheduled', 'departure'], 0)
 
-            origin_iata = self._safe_get(flight, ['flight', 'airport', 'origin', 'code', 'iata'], 'XXX')
-            origin_icao = self._safe_get(flight, ['flight', 'airport', 'origin', 'code', 'icao'], 'N/A')
+            if direction == "departures":
+                origin_iata = airport
+                origin_icao = self._safe_get(flight, ['flight', 'airport', 'origin', 'code', 'icao']) \
+                    or self._airport_icao.get(airport, 'N/A')
+                destination = self._safe_get(flight, ['flight', 'airport', 'destination', 'code', 'iata'], 'XXX')
+            else:
+                origin_iata = self._safe_get(flight, ['flight', 'airport', 'origin', 'code', 'iata'], 'XXX')
+                origin_icao = self._safe_get(flight, ['flight', 'airport', 'origin', 'code', 'icao'], 'N/A')
+                destination = airport
 
-            model_data = self._safe_get(flight, ['flight', 'aircraft', 'model'], {})
+            model_data = self._safe_get(flight, ['flight', 'aircraft', 'model']) or {}
             aircraft_model = model_data.get('text') or model_data.get('code') or 'Unknown'
 
             return {
                 'flight_number': self._safe_get(flight, ['flight', 'identification', 'number', 'default'], 'UNKNOWN'),
                 'airline': self._safe_get(flight, ['flight', 'airline', 'name'], 'Unknown'),
                 'origin': origin_iata,
-                'destination': airport,
+                'destination': destination,
                 'scheduled_time': datetime.fromtimestamp(scheduled_arrival_ts),
                 'scheduled_departure': datetime.fromtimestamp(scheduled_departure_ts) if scheduled_departure_ts else None,
                 'status': self._safe_get(flight, ['flight', 'status', 'text'], 'Unknown'),
@@ -53,77 +179,319 @@ class FlightParser:
             logger.error(f"Flight parsing error: {e}")
             return None
 
+    def _fetch_schedule_page(self, airport: str, page: int, direction: str = "arrivals") -> SchedulePage:
+        params = {
+            "code": airport,
+            "plugin[]": "schedule",
+            "plugin-setting[schedule][mode]": direction,
+            "page": page,
+            "limit": self.page_size
+        }
+
+        cache_key = ResponseCache.key(airport, direction, page)
+        cached = self.response_cache.get(cache_key) if self.response_cache else None
+        headers = self.response_cache.conditional_headers(cache_key) if cached else None
+
+        response = self.client.get(self.api_url, params=params, key=airport, headers=headers)
+
+        if cached and response.status_code == 304:
+            return SchedulePage([], cached.get("total_pages", 1), cache_key, unchanged=True)
+
+        content_hash = ResponseCache.content_hash(response.content) if self.response_cache else None
+        if cached and content_hash == cached.get("content_hash"):
+            return SchedulePage([], cached.get("total_pages", 1), cache_key, content_hash, unchanged=True)
+
+        with metrics.timer("json_decode"):
+            payload = json.loads(response.content)
+        plugin_data = self._safe_get(payload, ['result', 'response', 'airport', 'pluginData'], {})
+        airport_icao = self._safe_get(plugin_data, ['details', 'code', 'icao'])
+        if airport_icao:
+            self._airport_icao[airport] = airport_icao
+
+        schedule = self._safe_get(plugin_data, ['schedule', direction], {})
+        return SchedulePage(
+            self._safe_get(schedule, ['data'], []) or [],
+            self._safe_get(schedule, ['page', 'total'], 1) or 1,
+            cache_key,
+            content_hash,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    def iter_schedule_pages(self, airport: str, direction: str = "arrivals") -> Iterator[SchedulePage]:
+        page = 1
+        while True:
+            schedule_page = self._fetch_schedule_page(airport, page, direction)
+            if not schedule_page.flights_data and not schedule_page.unchanged:
+                return
+            yield schedule_page
+
+            if page >= schedule_page.total_pages or (self.max_pages is not None and page >= self.max_pages):
+                return
+            page += 1
+
+    def _remember_page(self, schedule_page: SchedulePage, flights_hash: Optional[str]):
+        if self.response_cache:
+            self.response_cache.update(
+                schedule_page.cache_key,
+                content_hash=schedule_page.content_hash,
+                etag=schedule_page.etag,
+                last_modified=schedule_page.last_modified,
+                flights_hash=flights_hash,
+                total_pages=schedule_page.total_pages,
+            )
+
+    def _remember_arrivals(self, airport: str, cache_key: str, flights: List[FlightRecord]):
+        # что страница прилётов реально записала в БД; одна запись на страницу — память не растёт между опросами
+        if self.mode != "both" or airport not in self.tracked_airports:
+            return
+        written = {(f.flight_number, f.scheduled_time): f.status for f in flights}
+        with self._arrivals_lock:
+            self._arrivals_written.setdefault(airport, {})[cache_key] = written
+
+    def _already_written(self, record: FlightRecord, direction: str) -> bool:
+        if self.mode != "both" or direction != "departures" or record.destination not in self.tracked_airports:
+            return False
+        # прилёты могли не дойти до этого рейса (max_pages), упасть или ещё не опрашиваться —
+        # тогда вылет пишем сами, upsert по (flight_number, scheduled_time) повтор всё равно схлопнет
+        key = (record.flight_number, record.scheduled_time)
+        with self._arrivals_lock:
+            pages = self._arrivals_written.get(record.destination, {})
+            return any(written.get(key) == record.status for written in pages.values())
+
     def process_airport(self, airport: str) -> bool:
+        return all([self.ingest_airport(airport, direction).ok for direction in self.directions])
+
+    def ingest_airport(self, airport: str, direction: Optional[str] = None) -> AirportResult:
+        direction = direction or self.directions[0]
+        started = time.perf_counter()
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        pages = 0
+        saved = 0
+        skipped = 0
+        cached = 0
+
+        def result(ok: bool, error: Optional[str] = None) -> AirportResult:
+            return AirportResult(airport, ok, saved, time.perf_counter() - started, error,
+                                 pages=pages, direction=direction, skipped=skipped, cached=cached, **counts)
+
         try:
-            logger.info(f"Processing {airport}...")
-
-            url = "https://api.flightradar24.com/common/v1/airport.json"
-            params = {
-                "code": airport,
-                "plugin[]": "schedule",
-                "plugin-setting[schedule][mode]": "arrivals",
-                "limit": 20 # в данном случае мы останавливаемся на 20 записях для наглядного предстовления итогового результата, если в дальнейшем нам понадобится взять все данные из каждого перелёта огрпничение можно убрать
-            }
+            logger.info(f"Processing {airport} {direction}...")
 
-            response = self.session.get(url, params=params, timeout=15)
-            response.raise_for_status()
+            # каждая страница парсится и пишется сразу, пока следующая уже качается
+            for schedule_page in prefetch(self.iter_schedule_pages(airport, direction), self.prefetch_pages):
+                pages += 1
+                if schedule_page.unchanged:
+                    cached += 1
+                    self.response_cache.touch(schedule_page.cache_key)
+                    continue
 
-            data = response.json()
-            flights_data = self._safe_get(data, ['result', 'response', 'airport', 'pluginData', 'schedule', 'arrivals', 'data'], [])
+                with metrics.timer("parse"):
+                    records = self.extractor.extract_page(
+                        schedule_page.flights_data, airport, direction, self._airport_icao.get(airport, 'N/A'))
+                metrics.inc("parsed_total", len(records))
 
-            if not flights_data:
-                logger.warning(f"No flights data for {airport}")
-                return False
+                flights = []
+                for record in records:
+                    if self._already_written(record, direction):
+                        skipped += 1
+                        continue
+                    flights.append(record)
+
+                # ответ мог поменяться только в служебных полях (timestamp и т.п.) — сами рейсы те же
+                flights_hash = None
+                if self.response_cache:
+                    flights_hash = ResponseCache.flights_hash(flights)
+                    previous = self.response_cache.get(schedule_page.cache_key)
+                    if previous and previous.get("flights_hash") == flights_hash:
+                        cached += 1
+                        self._remember_page(schedule_page, flights_hash)
+                        if direction == "arrivals":
+                            self._remember_arrivals(airport, schedule_page.cache_key, flights)
+                        continue
 
-            flights = []
-            for flight in flights_data:
-                parsed = self.parse_flight(flight, airport)
-                if parsed:
-                    flights.append(parsed)
+                if not flights:
+                    # страница без рейсов для записи (пустая или всё уже записано со стороны прилёта) —
+                    # ETag и хэш всё равно запоминаем, иначе она будет скачиваться и разбираться каждый опрос
+                    self._remember_page(schedule_page, flights_hash)
+                    continue
 
-            if not flights:
+                page_counts = self.db.upsert_flights(flights)
+                if page_counts is None:
+                    return result(False, "database write failed")
+                self._remember_page(schedule_page, flights_hash)
+                if direction == "arrivals":
+                    self._remember_arrivals(airport, schedule_page.cache_key, flights)
+                saved += len(flights)
+                for key in counts:
+                    counts[key] += page_counts[key]
+
+            if not pages:
+                logger.warning(f"No flights data for {airport}")
+                return result(False, "no flights data")
+
+            if not saved and not skipped and not cached:
                 logger.warning(f"No valid flights found for {airport}")
-                return False
+                return result(False, "no valid flights")
 
-            return self.db.save_flights(flights)
+            return result(True)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Request failed for {airport}: {e}")
-            return False
-        # в идеале расписать обработку парсинга порядка 5 раз но мне не хватило на это выделенного времени, я не успел адекватно реализовать в своей голове структуру этого кейса
+            return result(False, str(e))
         except Exception as e:
             logger.error(f"Unexpected error for {airport}: {e}")
-            return False
+            return result(False, str(e))
 
-def main_parser(date_from: str, date_to: str, hour: int):
+    def _run_tasks(self, tasks: List[Tuple[str, str]], max_workers: int) -> List[AirportResult]:
+        if max_workers <= 1:
+            return [self.ingest_airport(*task) for task in tasks]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="airport") as executor:
+            return list(executor.map(lambda task: self.ingest_airport(*task), tasks))
 
-    # защитить доступ к важной информацией переменной окружения (занести в докерфайл)
-    db_config = {
-        "host": "localhost",
-        "database": "air_data",
-        "user": "postgres",
-        "password": "rosatom",
-        "port": "5432"
-    }
+    def process_airports(self, airports: List[str], max_workers: int = 8, retry_rounds: int = 1,
+                         retry_delay: float = 10.0) -> List[AirportResult]:
+        started = time.perf_counter()
+
+        # прилёты и вылеты одного аэропорта — независимые задачи в общем пуле
+        tasks = [(airport, direction) for airport in airports for direction in self.directions]
+        results = self._run_tasks(tasks, max_workers)
 
+        # повторяем только упавшие аэропорты, а не весь прогон
+        for round_number in range(1, retry_rounds + 1):
+            failed_indexes = [
+                i for i, r in enumerate(results)
+                if not r.ok and r.error not in NON_RETRYABLE_ERRORS
+            ]
+            if not failed_indexes:
+                break
+            logger.info(
+                f"Retry round {round_number}: "
+                f"{', '.join(f'{results[i].airport}/{results[i].direction}' for i in failed_indexes)}"
+            )
+            time.sleep(retry_delay)
+            retried = self._run_tasks([tasks[i] for i in failed_indexes], max_workers)
+            for i, result in zip(failed_indexes, retried):
+                results[i] = result
 
-    db = FlightDatabase(db_config)
-    parser = FlightParser(db)
-    reporter = FlightReport(db_config)
-    hourly_reporter = HourlyFlightReport(db_config)
+        elapsed = time.perf_counter() - started
+        failed = [f"{r.airport}/{r.direction} ({r.error})" for r in results if not r.ok]
+        slowest = max(results, key=lambda r: r.elapsed, default=None)
+        logger.info(
+            f"Processed {len(results)} airport schedules in {elapsed:.2f}s "
+            f"({len(results) - len(failed)} ok, {len(failed)} failed)"
+            + (f", slowest {slowest.airport} {slowest.elapsed:.2f}s" if slowest else "")
+        )
+        if failed:
+            logger.warning(f"Failed airports: {', '.join(failed)}")
+        if self.response_cache:
+            self.response_cache.save()
+        return results
 
-    airports = ["AER", "GDZ", "AAQ", "SIP", "KHE", "NLV", "ODS", "CND", "VAR", "BOJ", "IST", "ONQ", "NOP", "SZF", "OGU", "TZX", "RZV", "BUS", "KUT"]
-    for airport in airports:
-        parser.process_airport(airport)
 
+DB_CONFIG = {
+    "host": "localhost",
+    "database": "air_data",
+    "user": "postgres",
+    "password": "rosatom",
+    "port": "5432"
+}
+AIRPORTS = ["AER", "GDZ", "AAQ", "SIP", "KHE", "NLV", "ODS", "CND", "VAR", "BOJ", "IST", "ONQ", "NOP", "SZF", "OGU", "TZX", "RZV", "BUS", "KUT"]
+
+
+def _write_csv(path: str, header: Tuple[str, ...], rows: List[Tuple]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    logger.info(f"Wrote {len(rows)} rows to {path}")
+
+
+def rebuild_reports(pool, date_from: str, date_to: str, hour: Union[int, Iterable[int]], airports: List[str],
+                    archive=None, output_dir: Optional[str] = None):
+    reporter = FlightReport(DB_CONFIG, pool=pool, archive=archive)
+    hourly_reporter = HourlyFlightReport(DB_CONFIG, pool=pool, archive=archive)
 
     summary = reporter.get_flight_summary(icao_codes=airports, date_from=date_from, date_to=date_to)
-    data = hourly_reporter.get_hourly_summary(icao_codes=airports, hour=hour)
+    data = hourly_reporter.get_hourly_summary(icao_codes=airports, hours=hour, date_from=date_from, date_to=date_to)
+
+    if output_dir:
+        # сводки в файлы — вместе с архивом отчёт строится без Postgres
+        os.makedirs(output_dir, exist_ok=True)
+        _write_csv(os.path.join(output_dir, "daily_flight_summary.csv"),
+                   ("flight_day", "airline", "aircraft_model", "total_flights"), summary)
+        _write_csv(os.path.join(output_dir, "hourly_flight_summary.csv"),
+                   ("flight_hour", "airline", "aircraft_model", "total_flights"), data)
+        return
 
     reporter.save_summary_to_db(summary)
     hourly_reporter.save_hourly_summary(data)
 
 
+def refresh_reports(pool, touched_hours: Iterable[datetime], date_from: str, date_to: str, hour: int,
+                    airports: List[str]):
+    # пересчитываем только те дни/часы окна, в которых рейсы реально вставились или изменились
+    reporter = FlightReport(DB_CONFIG, pool=pool)
+    hourly_reporter = HourlyFlightReport(DB_CONFIG, pool=pool)
+    day_from = datetime.fromisoformat(date_from).date()
+    day_to = datetime.fromisoformat(date_to).date()
+    touched_hours = [h for h in touched_hours if day_from <= h.date() <= day_to]
+    window_days = [day_from + timedelta(days=i) for i in range((day_to - day_from).days + 1)]
+    window_hours = [datetime(d.year, d.month, d.day, hour) for d in window_days]
+    # дни/часы окна, которых в сводках ещё нет (первый запуск, окно без новых записей), считаем целиком —
+    # иначе инкрементальный режим никогда не построил бы запрошенное окно, как это делал rebuild_reports
+    reporter.refresh_days({h.date() for h in touched_hours} | set(reporter.missing_days(window_days)), airports)
+    hourly_reporter.refresh_hours({h for h in touched_hours if h.hour == hour}
+                                  | set(hourly_reporter.missing_hours(window_hours)), airports)
+
+
+def main_parser(date_from: str, date_to: str, hour: int, max_workers: int = 8, max_per_host: int = 4,
+                page_size: int = 20, max_pages: Optional[int] = 1, mode: str = "arrivals",
+                use_response_cache: bool = True, incremental: bool = True,
+                partitioning: Optional[str] = None, retention_periods: Optional[int] = None,
+                retention_action: str = "detach", airports: Optional[List[str]] = None):
+
+    # защитить доступ к важной информацией переменной окружения (занести в докерфайл)
+    db_config = DB_CONFIG
+    airports = list(airports or AIRPORTS)
+
+    # один пул на парсер и оба отчёта: каждому воркеру по соединению
+    pool = get_pool(db_config, min_size=min(2, max_workers), max_size=max(2, max_workers))
+    # partitioning="day"|"month" — flights секционирована по scheduled_time (см. README)
+    partitions = None
+    if partitioning:
+        partitions = PartitionManager(pool, granularity=partitioning, retention_periods=retention_periods,
+                                      retention_action=retention_action)
+        if not partitions.maintain():
+            partitions = None
+    db = FlightDatabase(db_config, pool=pool, partitions=partitions)
+
+    # page_size=20 и max_pages=1 — прежнее поведение (20 записей для наглядности);
+    # для полного расписания: page_size=100, max_pages=None
+    parser = FlightParser(db, max_per_host=max_per_host, page_size=page_size, max_pages=max_pages,
+                          mode=mode, tracked_airports=airports,
+                          response_cache=ResponseCache() if use_response_cache else None)
+    parser.process_airports(airports, max_workers=max_workers)
+
+
+    if incremental:
+        refresh_reports(pool, db.pop_touched_hours(), date_from, date_to, hour, airports)
+    else:
+        rebuild_reports(pool, date_from, date_to, hour, airports)
+
+    logger.info(f"Connection pool stats: {pool.stats()}")
 
 
+def main_report(date_from: str, date_to: str, hours: Optional[Iterable[int]] = None,
+                airports: Optional[List[str]] = None, from_archive: bool = False,
+                archive_dir: Optional[str] = None, output_dir: Optional[str] = None):
+    # без часов — почасовая сводка за все 24 часа окна
+    pool = get_pool(DB_CONFIG, min_size=1, max_size=2)
+    archive = None
+    if from_archive:
+        from ..data_archive.archive import ARCHIVE_DIR, FlightArchive
 
+        archive = FlightArchive(archive_dir or ARCHIVE_DIR)
+    rebuild_reports(pool, date_from, date_to, range(24) if hours is None else hours, list(airports or AIRPORTS),
+                    archive=archive, output_dir=output_dir)
+    logger.info(f"Connection pool stats: {pool.stats()}")
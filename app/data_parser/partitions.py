@@ -0,0 +1,197 @@
+import psycopg2
+from psycopg2 import extensions, sql
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set
+from .pool import ConnectionPool
+import re
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("day", "month")
+RETENTION_ACTIONS = ("detach", "drop")
+DDL_LOCK_TIMEOUT = "5s"
+DDL_ATTEMPTS = 3
+
+
+class PartitionManager:
+    def __init__(self, pool: ConnectionPool, granularity: str = "month", premake: int = 2,
+                 retention_periods: Optional[int] = None, retention_action: str = "detach",
+                 table: str = "flights"):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown partition granularity: {granularity}")
+        if retention_action not in RETENTION_ACTIONS:
+            raise ValueError(f"Unknown retention action: {retention_action}")
+
+        self.pool = pool
+        self.granularity = granularity
+        self.premake = premake
+        self.retention_periods = retention_periods  # None — хранить всё
+        self.retention_action = retention_action
+        self.table = table
+        self._name_pattern = re.compile(rf"^{re.escape(table)}_p(\d{{8}}|\d{{6}})$")
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def period_start(self, ts: datetime) -> datetime:
+        if self.granularity == "day":
+            return datetime(ts.year, ts.month, ts.day)
+        return datetime(ts.year, ts.month, 1)
+
+    def next_period(self, start: datetime) -> datetime:
+        if self.granularity == "day":
+            return start + timedelta(days=1)
+        return datetime(start.year + 1, 1, 1) if start.month == 12 else datetime(start.year, start.month + 1, 1)
+
+    def shift_periods(self, start: datetime, periods: int) -> datetime:
+        if self.granularity == "day":
+            return start + timedelta(days=periods)
+        month_index = start.year * 12 + start.month - 1 + periods
+        return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+    def partition_name(self, start: datetime) -> str:
+        suffix = start.strftime("%Y%m%d" if self.granularity == "day" else "%Y%m")
+        return f"{self.table}_p{suffix}"
+
+    def _parse_name(self, name: str) -> Optional[datetime]:
+        match = self._name_pattern.match(name)
+        if not match:
+            return None
+        suffix = match.group(1)
+        return datetime.strptime(suffix, "%Y%m%d" if len(suffix) == 8 else "%Y%m")
+
+    def is_partitioned(self) -> bool:
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT EXISTS (
+                        SELECT 1
+                        FROM pg_partitioned_table pt
+                        JOIN pg_class c ON c.oid = pt.partrelid
+                        WHERE c.relname = %s
+                    )
+                """, (self.table,))
+                return cur.fetchone()[0]
+
+    def list_partitions(self) -> List[str]:
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.relname
+                    FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    JOIN pg_class p ON p.oid = i.inhparent
+                    WHERE p.relname = %s
+                    ORDER BY c.relname
+                """, (self.table,))
+                return [row[0] for row in cur.fetchall()]
+
+    def missing_partitions(self, start: datetime, end: datetime) -> List[datetime]:
+        periods = []
+        period = self.period_start(start)
+        last = self.period_start(end)
+        while period <= last:
+            if self.partition_name(period) not in self._known:
+                periods.append(period)
+            period = self.next_period(period)
+        return periods
+
+    def create_partitions(self, cur, periods: Iterable[datetime]) -> List[str]:
+        names = []
+        for period in periods:
+            name = self.partition_name(period)
+            cur.execute(sql.SQL(
+                "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)"
+            ).format(sql.Identifier(name), sql.Identifier(self.table)), (period, self.next_period(period)))
+            names.append(name)
+        return names
+
+    @contextmanager
+    def _ddl_connection(self, conn: Optional[extensions.connection]):
+        if conn is None:
+            with self.pool.connection() as conn:
+                yield conn
+            return
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+
+    def ensure_partitions(self, start: datetime, end: datetime, conn: Optional[extensions.connection] = None) -> int:
+        # CREATE ... PARTITION OF берёт эксклюзивную блокировку родителя, поэтому секции создаются
+        # отдельной короткой транзакцией, никогда внутри записи рейсов; кэш известных секций избавляет от повторного DDL.
+        # conn — соединение писателя между транзакциями, чтобы не брать из пула второе
+        with self._lock:
+            missing = self.missing_partitions(start, end)
+            if not missing:
+                return 0
+
+            for attempt in range(1, DDL_ATTEMPTS + 1):
+                try:
+                    with self._ddl_connection(conn) as ddl_conn:
+                        with ddl_conn.cursor() as cur:
+                            # не ждём долгие отчёты: пока DDL стоит в очереди за блокировкой, за ним встают все писатели
+                            cur.execute(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'")
+                            names = self.create_partitions(cur, missing)
+                        ddl_conn.commit()
+                    break
+                except psycopg2.Error as e:
+                    # другой процесс создал ту же секцию одновременно (IF NOT EXISTS не спасает от гонки
+                    # в каталоге) или не дождались блокировки — повторяем, уже созданные секции пропустятся
+                    if attempt == DDL_ATTEMPTS:
+                        raise
+                    logger.warning(f"Creating partitions of {self.table} failed (attempt {attempt}): {e}")
+                    time.sleep(0.2 * attempt)
+            self._known.update(names)
+
+        logger.info(f"Ensured {len(names)} {self.granularity} partitions of {self.table}")
+        return len(names)
+
+    def premake_future(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.now()
+        return self.ensure_partitions(now, self.shift_periods(self.period_start(now), self.premake))
+
+    def apply_retention(self, now: Optional[datetime] = None) -> List[str]:
+        if self.retention_periods is None:
+            return []
+
+        cutoff = self.shift_periods(self.period_start(now or datetime.now()), -self.retention_periods)
+        expired = [
+            name for name in self.list_partitions()
+            if (start := self._parse_name(name)) is not None and self.next_period(start) <= cutoff
+        ]
+        if not expired:
+            return []
+
+        with self._lock:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    for name in expired:
+                        if self.retention_action == "drop":
+                            cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                        else:
+                            cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                                sql.Identifier(self.table), sql.Identifier(name)))
+                        conn.commit()
+                        self._known.discard(name)
+
+        logger.info(f"Retention: {self.retention_action} {len(expired)} partitions of {self.table}: {', '.join(expired)}")
+        return expired
+
+    def maintain(self, now: Optional[datetime] = None) -> bool:
+        try:
+            if not self.is_partitioned():
+                logger.warning(f"Table {self.table} is not partitioned, partition maintenance skipped")
+                return False
+            self._known.update(self.list_partitions())
+            self.premake_future(now)
+            self.apply_retention(now)
+            return True
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+            return False
@@ -0,0 +1,266 @@
+import psycopg2
+from psycopg2 import extensions
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional, Tuple
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, db_config: dict, min_size: int = 1, max_size: int = 10, timeout: float = 30.0,
+                 health_check_after: float = 30.0, connect_timeout: int = 5):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+
+        self.db_config = dict(db_config)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.connect_timeout = connect_timeout
+
+        self._cond = threading.Condition()
+        self._idle: Deque[Tuple[extensions.connection, float]] = deque()
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._warmed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "creations": 0,
+            "discards": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+        }
+
+    def _connect(self) -> extensions.connection:
+        conn = psycopg2.connect(**self.db_config, connect_timeout=self.connect_timeout)
+        conn.autocommit = False
+        return conn
+
+    def _is_alive(self, conn: extensions.connection) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn: extensions.connection):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def warm(self):
+        # заранее открываем min_size соединений, чтобы первые запросы не ждали рукопожатия
+        with self._cond:
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+            self._warmed = True
+
+        for _ in range(max(missing, 0)):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                logger.warning(f"Pool warm-up failed: {e}")
+                continue
+            with self._cond:
+                self._stats["creations"] += 1
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self) -> extensions.connection:
+        if not self._warmed:
+            self.warm()
+
+        deadline = time.monotonic() + self.timeout
+        wait_started: Optional[float] = None
+
+        while True:
+            conn = None
+            released_at = 0.0
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("Connection pool is closed")
+                    if self._idle:
+                        # LIFO: берём самое "тёплое" соединение
+                        conn, released_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"No free connection in pool after {self.timeout}s")
+                    if wait_started is None:
+                        wait_started = time.monotonic()
+                        self._stats["waits"] += 1
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if wait_started is not None:
+                    self._stats["wait_time"] += time.monotonic() - wait_started
+                    wait_started = None
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["creations"] += 1
+                    self._stats["checkouts"] += 1
+                return conn
+
+            stale = time.monotonic() - released_at > self.health_check_after
+            if not conn.closed and stale:
+                with self._cond:
+                    self._stats["health_checks"] += 1
+                if not self._is_alive(conn):
+                    with self._cond:
+                        self._stats["health_check_failures"] += 1
+                    self._discard(conn)
+                    continue
+            elif conn.closed:
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+            return conn
+
+    def _discard(self, conn: extensions.connection):
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._stats["discards"] += 1
+            self._cond.notify()
+
+    def putconn(self, conn: extensions.connection, discard: bool = False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                discard = True
+
+        if discard or conn.closed or self._closed:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def grow(self, min_size: int, max_size: int):
+        # пул общий на процесс: следующий пользователь с большими запросами расширяет его, но не сужает
+        with self._cond:
+            if max_size > self.max_size:
+                self.max_size = max_size
+                self._cond.notify_all()
+            if min_size > self.min_size:
+                self.min_size = min(min_size, self.max_size)
+                self._warmed = False
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        return stats
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(db_config: dict) -> tuple:
+    # psycopg2 понимает и "database", и "dbname" — считаем их одним и тем же
+    normalized = {("dbname" if k == "database" else k): str(v) for k, v in db_config.items()}
+    return tuple(sorted(normalized.items()))
+
+
+def get_pool(db_config: dict, **pool_kwargs) -> ConnectionPool:
+    key = _pool_key(db_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_config, **pool_kwargs)
+            _pools[key] = pool
+            return pool
+
+    # размер берём максимальный из запрошенных, остальные настройки задаёт первый вызов
+    pool.grow(pool_kwargs.pop("min_size", pool.min_size), pool_kwargs.pop("max_size", pool.max_size))
+    ignored = {k: v for k, v in pool_kwargs.items() if getattr(pool, k, v) != v}
+    if ignored:
+        logger.warning(f"Connection pool already exists, settings ignored: {ignored}")
+    return pool
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
@@ -0,0 +1,106 @@
+from typing import Dict, Iterable, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from ..atomic import atomic_write
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_FILE = os.path.join(os.path.dirname(__file__), "fr24_response_cache.json")
+
+
+class ResponseCache:
+    def __init__(self, path: Optional[str] = RESPONSE_CACHE_FILE, ttl: float = 3600.0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = self._load()
+
+    @staticmethod
+    def key(airport: str, direction: str, page: int) -> str:
+        return f"{airport}:{direction}:{page}"
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def flights_hash(records: Iterable[tuple]) -> str:
+        digest = hashlib.sha256()
+        for record in records:
+            digest.update(repr(tuple(record)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return now - entry.get("stored_at", 0) > self.ttl
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            now = time.time()
+            return {k: v for k, v in entries.items() if not self._expired(v, now)}
+        except Exception as e:
+            logger.warning(f"Could not load response cache: {e}")
+            return {}
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                del self._entries[key]
+                return None
+            return dict(entry)
+
+    def conditional_headers(self, key: str) -> dict:
+        entry = self.get(key)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, key: str, **fields):
+        with self._lock:
+            entry = self._entries.get(key, {})
+            entry.update(fields)
+            entry["stored_at"] = time.time()
+            self._entries[key] = entry
+
+    def touch(self, key: str):
+        # сервер подтвердил, что страница не изменилась (304 или тот же ответ) — запись снова свежая,
+        # иначе стабильное расписание раз в ttl всё равно разбиралось бы и писалось заново
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["stored_at"] = time.time()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def save(self):
+        if not self.path:
+            return
+
+        with self._lock:
+            now = time.time()
+            self._entries = {k: v for k, v in self._entries.items() if not self._expired(v, now)}
+            # копируем и сами записи: update из воркеров меняет их на месте, пока идёт json.dump
+            snapshot = {k: dict(v) for k, v in self._entries.items()}
+
+        try:
+            with atomic_write(self.path) as f:
+                json.dump(snapshot, f)
+        except Exception as e:
+            logger.warning(f"Could not save response cache: {e}")
@@ -0,0 +1,393 @@
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
+import bisect
+import json
+import math
+import os
+import sys
+import threading
+import time
+import logging
+from .atomic import atomic_write
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PREFIX = "flights_"
+STAGE_SECONDS = "stage_seconds"
+# от миллисекунды (разбор страницы) до минуты (геокодер с паузами, большая карта)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROFILE_MODES = ("cprofile", "sample")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, LabelKey]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина — +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        # оценка сверху: граница корзины, в которую попал квантиль, но не больше наблюдавшегося максимума
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Timer:
+    __slots__ = ("registry", "stage", "labels", "started")
+
+    def __init__(self, registry: "MetricsRegistry", stage: str, labels: Dict[str, str]):
+        self.registry = registry
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(STAGE_SECONDS, time.perf_counter() - self.started, stage=self.stage, **self.labels)
+        if exc_type is not None:
+            self.registry.inc("stage_errors_total", stage=self.stage, **self.labels)
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (
+        f'{name}="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        # выключенный реестр ничего не считает: каждый вызов — одна проверка флага
+        self.enabled = enabled
+        self.buckets = buckets
+        self.prometheus_file: Optional[str] = None
+        self.json_file: Optional[str] = None
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, float] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, Histogram] = {}
+        self._server: Optional["ThreadingHTTPServer"] = None
+
+    def configure(self, prometheus_file: Optional[str] = None, json_file: Optional[str] = None,
+                  port: Optional[int] = None, host: str = "0.0.0.0"):
+        self.enabled = True
+        self.prometheus_file = prometheus_file
+        self.json_file = json_file
+        if port is not None:
+            self.serve(port, host)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def timer(self, stage: str, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    def timed(self, stage: str, **labels) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, stage, labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _snapshot(self):
+        with self._lock:
+            histograms = {}
+            for key, h in self._histograms.items():
+                copy = Histogram(h.buckets)
+                copy.counts, copy.count, copy.sum, copy.max = list(h.counts), h.count, h.sum, h.max
+                histograms[key] = copy
+            return dict(self._counters), dict(self._gauges), histograms
+
+    def to_prometheus(self) -> str:
+        counters, gauges, histograms = self._snapshot()
+        lines: List[str] = []
+
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            typed = set()
+            for (name, labels), value in sorted(values.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                    typed.add(name)
+                lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_number(value)}")
+
+        typed = set()
+        for (name, labels), h in sorted(histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(h.buckets + (math.inf,), h.counts):
+                cumulative += count
+                le = (("le", _format_number(bound)),)
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {_format_number(h.sum)}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {h.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        counters, gauges, histograms = self._snapshot()
+
+        def name_of(key: MetricKey) -> str:
+            name, labels = key
+            return name + _format_labels(labels)
+
+        return {
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "counters": {name_of(key): value for key, value in sorted(counters.items())},
+            "gauges": {name_of(key): value for key, value in sorted(gauges.items())},
+            "timings": {
+                name_of(key): {
+                    "count": h.count,
+                    "total_s": round(h.sum, 6),
+                    "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else None,
+                    "p50_ms": round(h.quantile(0.5) * 1000, 3),
+                    "p99_ms": round(h.quantile(0.99) * 1000, 3),
+                    "max_ms": round(h.max * 1000, 3),
+                }
+                for key, h in sorted(histograms.items())
+            },
+        }
+
+    def write_prometheus(self, path: str):
+        # textfile-коллектор node_exporter не должен увидеть наполовину записанный файл
+        with atomic_write(path) as f:
+            f.write(self.to_prometheus())
+
+    def write_json(self, path: str):
+        with atomic_write(path) as f:
+            f.write(json.dumps(self.summary(), ensure_ascii=False, indent=2))
+
+    def flush(self):
+        if not self.enabled:
+            return
+        try:
+            if self.prometheus_file:
+                self.write_prometheus(self.prometheus_file)
+            if self.json_file:
+                self.write_json(self.json_file)
+        except Exception as e:
+            logger.error(f"Could not export metrics: {e}")
+
+    def log_summary(self, top: int = 15):
+        timings = self.summary()["timings"]
+        slowest = sorted(timings.items(), key=lambda item: item[1]["total_s"], reverse=True)[:top]
+        for name, timing in slowest:
+            logger.info(f"{name}: {timing['count']} calls, {timing['total_s']:.2f}s total, "
+                        f"p50 {timing['p50_ms']:.1f}ms, p99 {timing['p99_ms']:.1f}ms")
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> "ThreadingHTTPServer":
+        # http.server нужен только с --metrics-port — не тянем его при каждом запуске парсера
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") == "/metrics":
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path.rstrip("/") == "/metrics.json":
+                    body, content_type = json.dumps(registry.summary(), ensure_ascii=False), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+metrics = MetricsRegistry()
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        # стеки всех потоков, а не только главного: парсер работает в пуле потоков
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def top(self, limit: int = 25) -> List[Tuple[str, int, int]]:
+        # собственное время — функция на вершине стека, общее — функция где-либо в стеке
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [(name, own[name], total[name]) for name, _ in total.most_common(limit)]
+
+    def write_folded(self, path: str):
+        # формат flamegraph.pl / speedscope: "a;b;c count"
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile(mode: str = "cprofile", output: Optional[str] = None, top: int = 25,
+            interval: float = 0.005) -> Iterator[None]:
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+    if mode == "cprofile":
+        import cProfile
+        import io
+        import pstats
+
+        # cProfile видит только вызвавший поток; для пула воркеров парсера — mode="sample"
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+                logger.info(f"cProfile stats written to {output}")
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+            logger.info(f"cProfile top {top} by cumulative time:\n{report.getvalue()}")
+        return
+
+    sampler = SamplingProfiler(interval)
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        if output:
+            sampler.write_folded(output)
+            logger.info(f"Folded stacks written to {output}")
+        lines = [f"{own:>7} {total:>7}  {name}" for name, own, total in sampler.top(top)]
+        logger.info(f"Sampled {sampler.samples} times every {interval * 1000:.0f}ms, top {top} (own, total):\n"
+                    + "\n".join(lines))
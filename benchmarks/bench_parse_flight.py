@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.data_parser.parser import FlightParser
+from app.data_parser.extractor import FlightExtractor
+
+SAMPLE_PAYLOAD = Path(__file__).parent / "data" / "fr24_aer_arrivals_sample.json"
+
+
+def load_flights(path: Path, scale: int):
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    flights = payload["result"]["response"]["airport"]["pluginData"]["schedule"]["arrivals"]["data"]
+    return flights * scale
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="parse_flight vs FlightExtractor.extract_page")
+    arg_parser.add_argument("--payload", type=Path, default=SAMPLE_PAYLOAD)
+    arg_parser.add_argument("--scale", type=int, default=25, help="сколько раз размножить страницу")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    flights = load_flights(args.payload, args.scale)
+    parser = FlightParser(db_handler=None)
+    extractor = FlightExtractor()
+
+    def legacy():
+        return [p for p in (parser.parse_flight(f, "AER") for f in flights) if p]
+
+    def extracted():
+        return extractor.extract_page(flights, "AER")
+
+    assert len(legacy()) == len(extracted())
+
+    results = {}
+    for name, fn in (("parse_flight", legacy), ("extract_page", extracted)):
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        results[name] = best
+        print(f"{name:>13}: {best * 1000:8.2f} ms  {len(flights) / best:12,.0f} flights/s")
+
+    print(f"      speedup: {results['parse_flight'] / results['extract_page']:.2f}x on {len(flights)} flights")
+
+
+if __name__ == "__main__":
+    main()
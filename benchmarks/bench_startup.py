@@ -0,0 +1,91 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# что импортирует каждая подкоманда CLI; "cli" — сам app.app без подкоманды
+TARGETS = {
+    "cli": "import app.app",
+    "parse": "import app.app; import app.data_parser.parser",
+    "report": "import app.app; import app.data_parser.parser",
+    "digest": "import app.app; import app.data_digest.digest",
+}
+
+# тяжёлые модули, которые подкоманда грузит только там, где они нужны: появление их в импорте при старте —
+# регрессия времени запуска (HTTP-сервер метрик и профилировщики — только с --metrics-port / --profile)
+_INSTRUMENTATION = ("http.server", "cProfile", "pstats")
+_PARSER_LAZY = ("pandas", "folium", "geopy", "pyarrow") + _INSTRUMENTATION
+LAZY_MODULES = {
+    "cli": _PARSER_LAZY,
+    "parse": _PARSER_LAZY,
+    "report": _PARSER_LAZY,
+    # pyarrow здесь не проверяем: pandas сам импортирует его, если он установлен
+    "digest": _INSTRUMENTATION,
+}
+
+
+def import_profile(statement: str):
+    # -X importtime пишет в stderr: "import time: self [us] | cumulative | imported package"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = line.replace("import time:", "|", 1).split("|")
+        # вложенность импорта передаётся отступом в имени — его сохраняем
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def eager_imports(command: str, modules) -> list:
+    loaded = {name.strip() for name, _, _ in modules}
+    return [name for name in LAZY_MODULES.get(command, ()) if name in loaded]
+
+
+def wall_time(statement: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=ROOT, check=True, capture_output=True)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Время запуска CLI по подкомандам (python -X importtime)")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--top", type=int, default=8, help="самых дорогих модулей верхнего уровня")
+    arg_parser.add_argument("--check", action="store_true", help="код выхода 1, если подкоманда грузит ленивые модули")
+    args = arg_parser.parse_args()
+    regressions = {}
+
+    baseline = wall_time("pass", args.repeat)
+    print(f"{'interpreter':>8}: {baseline * 1000:7.1f} ms")
+
+    for command, statement in TARGETS.items():
+        elapsed = wall_time(statement, args.repeat)
+        modules = import_profile(statement)
+        # модули верхнего уровня — без отступа в имени
+        top_level = sorted((m for m in modules if not m[0].startswith(" ")), key=lambda m: m[2], reverse=True)
+        total_ms = sum(m[2] for m in top_level) / 1000
+        heaviest = ", ".join(f"{name} {cumulative / 1000:.0f}ms" for name, _, cumulative in top_level[:args.top])
+        print(f"{command:>8}: {elapsed * 1000:7.1f} ms wall, {total_ms:7.1f} ms imports, {len(modules)} modules")
+        print(f"{'':>10}{heaviest}")
+        eager = eager_imports(command, modules)
+        print(f"{'':>10}lazy modules: {'imported eagerly: ' + ', '.join(eager) if eager else 'not imported'}")
+        if eager:
+            regressions[command] = eager
+
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
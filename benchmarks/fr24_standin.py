@@ -0,0 +1,180 @@
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+SAMPLE_PAYLOAD = Path(__file__).parent / "data" / "fr24_aer_arrivals_sample.json"
+REAL_AIRPORTS = ["AER", "GDZ", "AAQ", "SIP", "KHE", "NLV", "ODS", "CND", "VAR", "BOJ",
+                 "IST", "ONQ", "NOP", "SZF", "OGU", "TZX", "RZV", "BUS", "KUT"]
+MAX_PAGE_SIZE = 100
+
+
+def airport_codes(count: int) -> List[str]:
+    # сначала наши 19 аэропортов, дальше детерминированные синтетические коды
+    codes = REAL_AIRPORTS[:count]
+    taken = set(REAL_AIRPORTS)
+    for letters in itertools.product(string.ascii_uppercase, repeat=3):
+        if len(codes) >= count:
+            break
+        code = "".join(letters)
+        if code[0] in "QZ" and code not in taken:
+            codes.append(code)
+    return codes
+
+
+def load_templates(path: Path) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    schedule = payload["result"]["response"]["airport"]["pluginData"]["schedule"]
+    return [flight for direction in ("arrivals", "departures") for flight in schedule.get(direction, {}).get("data", [])]
+
+
+def _compile_template(flight: dict) -> str:
+    # заменяем изменяемые поля метками и дальше собираем рейсы форматированием строки, без json.dumps на каждый
+    flight = json.loads(json.dumps(flight))
+    info = flight.setdefault("flight", {})
+    info.setdefault("identification", {}).setdefault("number", {})["default"] = "@NUMBER@"
+    info.setdefault("status", {})["text"] = "@STATUS@"
+    airport = info.setdefault("airport", {})
+    airport.setdefault("origin", {}).setdefault("code", {}).update({"iata": "@ORIGIN@", "icao": "@ORIGIN_ICAO@"})
+    airport.setdefault("destination", {}).setdefault("code", {}).update({"iata": "@DEST@", "icao": "@DEST_ICAO@"})
+    info.setdefault("time", {})["scheduled"] = {"departure": "@DEP@", "arrival": "@ARR@"}
+    text = json.dumps(flight, separators=(",", ":"))
+    for name in ("DEP", "ARR"):
+        text = text.replace(f'"@{name}@"', f"@{name}@")
+    return text
+
+
+class SyntheticSchedule:
+    def __init__(self, airports: List[str], flights_per_airport: int, templates: List[dict],
+                 start: Optional[float] = None, days: float = 2.0, seed: int = 42):
+        self.airports = airports
+        self.flights_per_airport = flights_per_airport
+        self.templates = [_compile_template(t) for t in templates]
+        # окно расписания — от суток назад, чтобы рейсы попадали в окна отчётов и карты
+        self.start = int(start if start is not None else time.time() - 86400)
+        self.span = int(days * 86400)
+        self.seed = seed
+        self.version = 0  # увеличение версии меняет статусы — имитация обновления расписания
+
+    def _flight(self, airport: str, direction: str, index: int) -> str:
+        rnd = random.Random(f"{self.seed}:{airport}:{direction}:{index}")
+        other = rnd.choice(self.airports)
+        arrival = self.start + rnd.randrange(self.span)
+        departure = arrival - rnd.randrange(3600, 6 * 3600)
+        origin, destination = (other, airport) if direction == "arrivals" else (airport, other)
+        status = "Landed" if (index + self.version) % 3 else "Scheduled"
+        text = self.templates[index % len(self.templates)]
+        # номер рейса уникален в пределах аэропорта и направления, чтобы ключи flights не пересекались
+        number = f"{airport}{'A' if direction == 'arrivals' else 'D'}{index}"
+        return (text.replace("@NUMBER@", number)
+                .replace("@STATUS@", status)
+                .replace("@ORIGIN_ICAO@", f"X{origin}")
+                .replace("@DEST_ICAO@", f"X{destination}")
+                .replace("@ORIGIN@", origin)
+                .replace("@DEST@", destination)
+                .replace("@DEP@", str(departure))
+                .replace("@ARR@", str(arrival)))
+
+    def page(self, airport: str, direction: str, page: int, limit: int) -> Tuple[bytes, str]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        total_pages = max(1, -(-self.flights_per_airport // limit))
+        first = (page - 1) * limit
+        flights = [self._flight(airport, direction, i)
+                   for i in range(first, min(first + limit, self.flights_per_airport))]
+        body = (
+            '{"result":{"response":{"airport":{"pluginData":{'
+            f'"details":{{"name":"{airport} Airport","code":{{"iata":"{airport}","icao":"X{airport}"}}}},'
+            f'"schedule":{{"{direction}":{{"page":{{"current":{page},"total":{total_pages}}},'
+            f'"data":[{",".join(flights)}]}}}}}}}}}}}}}}'
+        ).encode("utf-8")
+        return body, hashlib.md5(body).hexdigest()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    schedule: SyntheticSchedule = None
+    latency: float = 0.0
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        airport = query.get("code", [""])[0].upper()
+        direction = query.get("plugin-setting[schedule][mode]", ["arrivals"])[0]
+        page = int(query.get("page", ["1"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+
+        if airport not in self.schedule.airports:
+            self.send_error(404, "Unknown airport")
+            return
+        if self.latency:
+            time.sleep(self.latency)
+
+        body, etag = self.schedule.page(airport, direction, page, limit)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FR24StandIn:
+    def __init__(self, schedule: SyntheticSchedule, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        handler = type("Handler", (StandInHandler,), {"schedule": schedule, "latency": latency})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.schedule = schedule
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/common/v1/airport.json"
+
+    def start(self) -> "FR24StandIn":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fr24-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Локальный стенд FR24 airport.json с синтетическим расписанием")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8024)
+    arg_parser.add_argument("--airports", type=int, default=19)
+    arg_parser.add_argument("--flights-per-airport", type=int, default=200)
+    arg_parser.add_argument("--payload", type=Path, default=SAMPLE_PAYLOAD, help="записанный ответ FR24 как шаблон рейсов")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="искусственная задержка ответа, с")
+    args = arg_parser.parse_args()
+
+    schedule = SyntheticSchedule(airport_codes(args.airports), args.flights_per_airport, load_templates(args.payload))
+    stand_in = FR24StandIn(schedule, args.host, args.port, args.latency)
+    print(f"Serving {len(schedule.airports)} airports x {args.flights_per_airport} flights at {stand_in.url}")
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        stand_in.stop()
+
+
+if __name__ == "__main__":
+    main()
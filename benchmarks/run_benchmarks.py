@@ -0,0 +1,418 @@
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows — пиковую память не меряем
+    resource = None
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+import psycopg2
+from psycopg2 import sql
+
+from app.collections_day_and_hour.day_collections import FlightReport
+from app.collections_day_and_hour.hour_collections import HourlyFlightReport
+from app.data_digest.airport_store import AirportStore, SOURCE_DATASET
+from app.data_digest.digest import AirportGeocoder, FlightVisualizer, MAX_FLIGHTS, RENDER_MODES
+from app.data_digest.routes import RouteGeometryCache
+from app.data_parser.database import FlightDatabase
+from app.data_parser.extractor import FlightExtractor
+from app.data_parser.http_client import FR24Client
+from app.data_parser.parser import DB_CONFIG, DIRECTIONS, MAX_PAGE_SIZE, FlightParser
+from app.data_parser.pool import close_all_pools, get_pool
+from fr24_standin import SAMPLE_PAYLOAD, FR24StandIn, SyntheticSchedule, airport_codes, load_templates
+
+logger = logging.getLogger("benchmarks")
+
+BENCH_DB_CONFIG = dict(DB_CONFIG, database="air_data_bench")
+
+# схема как в README: обычная (не секционированная) flights, обе таблицы сводок и история статусов
+SCHEMA_SQL = """
+CREATE TABLE flights (
+    id SERIAL PRIMARY KEY,
+    flight_number VARCHAR(10) NOT NULL,
+    airline VARCHAR(50) NOT NULL,
+    origin CHAR(3) NOT NULL,
+    destination CHAR(3) NOT NULL,
+    scheduled_time TIMESTAMP NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    aircraft_model VARCHAR(50) NOT NULL,
+    icao_code CHAR(4) NOT NULL,
+    last_update TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    scheduled_departure TIMESTAMP NOT NULL,
+    CONSTRAINT flights_flight_number_scheduled_time_key UNIQUE (flight_number, scheduled_time)
+);
+CREATE INDEX flights_destination_scheduled_time_idx ON flights (destination, scheduled_time);
+CREATE INDEX flights_origin_scheduled_time_idx ON flights (origin, scheduled_time);
+CREATE INDEX flights_scheduled_time_idx ON flights (scheduled_time);
+CREATE INDEX flights_last_update_idx ON flights (last_update);
+
+CREATE TABLE daily_flight_summary (
+    id SERIAL PRIMARY KEY,
+    flight_day DATE NOT NULL,
+    airline VARCHAR(50) NOT NULL,
+    aircraft_model VARCHAR(50) NOT NULL,
+    total_flights INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT daily_flight_summary_bucket_key UNIQUE (flight_day, airline, aircraft_model)
+);
+
+CREATE TABLE hourly_flight_summary (
+    id SERIAL PRIMARY KEY,
+    flight_hour TIMESTAMP NOT NULL,
+    airline VARCHAR(50) NOT NULL,
+    aircraft_model VARCHAR(50) NOT NULL,
+    total_flights INTEGER NOT NULL,
+    CONSTRAINT hourly_flight_summary_bucket_key UNIQUE (flight_hour, airline, aircraft_model)
+);
+
+CREATE TABLE flight_status_history (
+    id BIGSERIAL PRIMARY KEY,
+    flight_number VARCHAR(10) NOT NULL,
+    scheduled_time TIMESTAMP NOT NULL,
+    old_status VARCHAR(50),
+    new_status VARCHAR(50) NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX flight_status_history_flight_idx ON flight_status_history (flight_number, scheduled_time, changed_at);
+"""
+
+
+class Scale:
+    def __init__(self, airports: int, flights: int):
+        self.airports = airports
+        self.flights = flights
+
+    @property
+    def label(self) -> str:
+        return f"{self.airports}x{self.flights}"
+
+    def per_schedule(self, directions: int) -> int:
+        # flights — всего рейсов в прогоне, поровну на аэропорт и направление
+        return max(1, self.flights // (self.airports * directions))
+
+
+def _scale(value: str) -> Scale:
+    try:
+        airports, flights = (int(part.replace("_", "").replace("k", "000").replace("M", "000000"))
+                             for part in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Масштаб задаётся как АЭРОПОРТЫ:РЕЙСЫ, например 19:1k или 500:1M: {value}")
+    if airports < 1 or flights < 1:
+        raise argparse.ArgumentTypeError(f"Масштаб должен быть положительным: {value}")
+    return Scale(airports, flights)
+
+
+def percentile(samples: List[float], p: float) -> Optional[float]:
+    # ближайший ранг: на малом числе замеров p99 — это просто максимум, без интерполяции
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def stage_result(name: str, flights: int, wall: float, samples: List[float], **extra) -> dict:
+    result = {
+        "stage": name,
+        "flights": flights,
+        "wall_s": round(wall, 4),
+        "flights_per_s": round(flights / wall, 1) if wall > 0 else None,
+        "calls": len(samples),
+        "p50_ms": None if not samples else round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": None if not samples else round(percentile(samples, 99) * 1000, 2),
+        # пик за весь процесс к концу стадии: ru_maxrss не сбрасывается
+        "peak_rss_mb": None if resource is None else round(peak_rss_mb(), 1),
+    }
+    result.update(extra)
+    return result
+
+
+def prepare_database(db_config: dict, reset: bool):
+    admin = psycopg2.connect(**dict(db_config, database="postgres"))
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            name = sql.Identifier(db_config["database"])
+            if reset:
+                cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(name))
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_config["database"],))
+            if not cur.fetchone():
+                cur.execute(sql.SQL("CREATE DATABASE {}").format(name))
+    finally:
+        admin.close()
+
+    conn = psycopg2.connect(**db_config)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('flights')")
+            if cur.fetchone()[0] is None:
+                cur.execute(SCHEMA_SQL)
+    finally:
+        conn.close()
+
+
+def truncate_tables(pool):
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE flights, daily_flight_summary, hourly_flight_summary, flight_status_history "
+                        "RESTART IDENTITY")
+        conn.commit()
+
+
+def bench_fetch_parse_store(schedule: SyntheticSchedule, stand_in: FR24StandIn, db: FlightDatabase,
+                            workers: int) -> dict:
+    # tracked_airports не передаём: стенд генерирует прилёты и вылеты независимо, одних и тех же рейсов
+    # с двух сторон в нём нет и сверять в режиме both нечего
+    parser = FlightParser(db, max_per_host=workers, page_size=MAX_PAGE_SIZE, max_pages=None, mode="both",
+                          api_url=stand_in.url)
+    # лимиты FR24 здесь не нужны: меряем собственную пропускную способность парсера
+    parser.client = FR24Client(parser.session, max_retries=0, rate=1e9, burst=1e9, max_per_host=workers)
+
+    started = time.perf_counter()
+    results = parser.process_airports(schedule.airports, max_workers=workers, retry_rounds=0)
+    wall = time.perf_counter() - started
+    parser.session.close()
+
+    return stage_result(
+        "fetch_parse_store", sum(r.flights for r in results), wall, [r.elapsed for r in results],
+        pages=sum(r.pages for r in results),
+        inserted=sum(r.inserted for r in results),
+        updated=sum(r.updated for r in results),
+        failed=[f"{r.airport}/{r.direction}: {r.error}" for r in results if not r.ok],
+    )
+
+
+def bench_store(schedule: SyntheticSchedule, db: FlightDatabase) -> dict:
+    # следующая версия расписания меняет часть статусов — меряем путь обновления, а не вставки
+    schedule.version += 1
+    extractor = FlightExtractor()
+    samples, flights = [], 0
+    total_pages = max(1, -(-schedule.flights_per_airport // MAX_PAGE_SIZE))
+
+    for airport in schedule.airports:
+        for direction in DIRECTIONS:
+            for page in range(1, total_pages + 1):
+                body, _ = schedule.page(airport, direction, page, MAX_PAGE_SIZE)
+                data = json.loads(body)["result"]["response"]["airport"]["pluginData"]["schedule"][direction]["data"]
+                records = extractor.extract_page(data, airport, direction, f"X{airport}")
+                if not records:
+                    continue
+                # генерация и разбор страницы в замер не входят — только запись
+                started = time.perf_counter()
+                if db.save_flights(records):
+                    flights += len(records)
+                samples.append(time.perf_counter() - started)
+
+    return stage_result("store", flights, sum(samples), samples, batch_size=MAX_PAGE_SIZE)
+
+
+def bench_reports(schedule: SyntheticSchedule, pool, flights: int) -> List[dict]:
+    first_day = datetime.fromtimestamp(schedule.start).date()
+    last_day = datetime.fromtimestamp(schedule.start + schedule.span).date()
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    reporter = FlightReport(BENCH_DB_CONFIG, pool=pool)
+    hourly_reporter = HourlyFlightReport(BENCH_DB_CONFIG, pool=pool)
+
+    results = []
+    for name, refresh in (
+            ("report_daily", lambda day: reporter.refresh_days([day], schedule.airports)),
+            ("report_hourly", lambda day: hourly_reporter.refresh_hours(
+                [datetime.combine(day, datetime.min.time()) + timedelta(hours=h) for h in range(24)],
+                schedule.airports)),
+    ):
+        samples = []
+        for day in days:
+            started = time.perf_counter()
+            refresh(day)
+            samples.append(time.perf_counter() - started)
+        results.append(stage_result(name, flights, sum(samples), samples, days=len(days)))
+    return results
+
+
+def bench_digest(schedule: SyntheticSchedule, pool, render_mode: str, max_rows: Optional[int],
+                 repeat: int, workdir: str) -> dict:
+    visualizer = FlightVisualizer(BENCH_DB_CONFIG, pool=pool)
+    # синтетические коды FR24 не знает: координаты кладём в отдельное хранилище заранее, геокодер не вызывается
+    store = AirportStore(os.path.join(workdir, "airports.sqlite3"))
+    visualizer.geocoder = AirportGeocoder(store)
+    known = store.get_many(schedule.airports)
+    store.put_many({
+        code: (40 + (index % 20) * 1.5, 20 + (index // 20 % 25) * 2.0)
+        for index, code in enumerate(schedule.airports) if not known.get(code)
+    }, source=SOURCE_DATASET, overwrite_dataset=True)
+    # дуги считаются в каждом повторе: кэш геометрии на диск не пишем и не читаем
+    output_file = os.path.join(workdir, "flights_map.html")
+    since = datetime.fromtimestamp(schedule.start) - timedelta(hours=1)
+
+    samples, routes_added = [], 0
+    for _ in range(repeat):
+        visualizer.route_geometry = RouteGeometryCache(None)
+        started = time.perf_counter()
+        flight_map, routes_added, _ = visualizer.create_map(render_mode, since=since, max_rows=max_rows)
+        flight_map.save(output_file)
+        samples.append(time.perf_counter() - started)
+
+    return stage_result("digest", routes_added * len(samples), sum(samples), samples, render_mode=render_mode,
+                        routes_per_map=routes_added, max_rows=max_rows,
+                        html_kib=round(os.path.getsize(output_file) / 1024, 1))
+
+
+def run_scale(scale: Scale, args, templates: List[dict], pool) -> dict:
+    schedule = SyntheticSchedule(airport_codes(scale.airports), scale.per_schedule(len(DIRECTIONS)), templates,
+                                 days=args.days)
+    truncate_tables(pool)
+    db = FlightDatabase(BENCH_DB_CONFIG, pool=pool)
+    stand_in = FR24StandIn(schedule, latency=args.latency).start()
+    logger.warning(f"Scale {scale.label}: {len(schedule.airports)} airports, "
+                   f"{schedule.flights_per_airport} flights per airport and direction")
+
+    stages = []
+    try:
+        if "fetch" in args.stages:
+            stages.append(bench_fetch_parse_store(schedule, stand_in, db, args.workers))
+        if "store" in args.stages:
+            stages.append(bench_store(schedule, db))
+    finally:
+        stand_in.stop()
+
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM flights")
+            stored = cur.fetchone()[0]
+        conn.rollback()
+
+    if "report" in args.stages:
+        stages.extend(bench_reports(schedule, pool, stored))
+    if "digest" in args.stages:
+        with tempfile.TemporaryDirectory(prefix="flights_bench_") as workdir:
+            stages.append(bench_digest(schedule, pool, args.render_mode, args.digest_max_rows, args.repeat, workdir))
+
+    return {
+        "scale": scale.label,
+        "airports": len(schedule.airports),
+        "flights_requested": scale.flights,
+        "flights_stored": stored,
+        "stages": stages,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(report: dict, baseline: Optional[dict]):
+    previous: Dict[Tuple[str, str], dict] = {}
+    for run in (baseline or {}).get("runs", []):
+        for stage in run["stages"]:
+            previous[(run["scale"], stage["stage"])] = stage
+
+    print(f"{'scale':>12} {'stage':>18} {'flights':>9} {'flights/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    for run in report["runs"]:
+        for stage in run["stages"]:
+            line = (f"{run['scale']:>12} {stage['stage']:>18} {stage['flights']:>9} "
+                    f"{stage['flights_per_s'] or 0:>11.0f} {stage['p50_ms'] or 0:>9.1f} "
+                    f"{stage['p99_ms'] or 0:>9.1f} {stage['peak_rss_mb'] or 0:>8.0f}")
+            before = previous.get((run["scale"], stage["stage"]))
+            if before and before.get("flights_per_s") and stage["flights_per_s"]:
+                change = stage["flights_per_s"] / before["flights_per_s"] - 1
+                line += f"  {change:+.0%} vs {baseline.get('revision') or 'baseline'}"
+            print(line)
+            if stage.get("failed"):
+                print(f"{'':>31} failed: {', '.join(stage['failed'][:5])}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="Пропускная способность parse → store → report → digest на локальном стенде FR24 и отдельной БД")
+    arg_parser.add_argument("--scale", type=_scale, action="append", default=None,
+                            help="АЭРОПОРТЫ:РЕЙСЫ, можно несколько раз (19:1k, 100:100k, 500:1M); по умолчанию 19:1k")
+    arg_parser.add_argument("--stages", nargs="+", choices=("fetch", "store", "report", "digest"),
+                            default=["fetch", "store", "report", "digest"])
+    arg_parser.add_argument("--workers", type=int, default=8)
+    arg_parser.add_argument("--days", type=float, default=2, help="на сколько дней растянуть синтетическое расписание")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа стенда, с")
+    arg_parser.add_argument("--payload", type=Path, default=SAMPLE_PAYLOAD, help="записанный ответ FR24 как шаблон")
+    arg_parser.add_argument("--render-mode", choices=RENDER_MODES, default="geojson")
+    arg_parser.add_argument("--digest-max-rows", type=lambda v: None if int(v) <= 0 else int(v), default=MAX_FLIGHTS,
+                            help="лимит рейсов на карте, 0 — все")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="повторов построения карты")
+    arg_parser.add_argument("--host", default=BENCH_DB_CONFIG["host"])
+    arg_parser.add_argument("--port", type=int, default=BENCH_DB_CONFIG["port"])
+    arg_parser.add_argument("--user", default=BENCH_DB_CONFIG["user"])
+    arg_parser.add_argument("--password", default=BENCH_DB_CONFIG["password"])
+    arg_parser.add_argument("--dbname", default=BENCH_DB_CONFIG["database"], help="отдельная БД, таблицы очищаются")
+    arg_parser.add_argument("--reset", action="store_true", help="пересоздать БД бенчмарка")
+    arg_parser.add_argument("--output", type=Path, default=None, help="куда записать результаты в JSON")
+    arg_parser.add_argument("--baseline", type=Path, default=None, help="JSON прошлого прогона для сравнения")
+    arg_parser.add_argument("--verbose", action="store_true", help="не глушить INFO-логи приложения")
+    args = arg_parser.parse_args()
+
+    if args.dbname == DB_CONFIG["database"]:
+        arg_parser.error(f"Бенчмарк очищает таблицы — укажите отдельную БД, а не {DB_CONFIG['database']}")
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        # folium предупреждает о ключе CartoDB на каждой карте
+        warnings.filterwarnings("ignore", category=UserWarning, module="folium")
+
+    BENCH_DB_CONFIG.update(host=args.host, port=args.port, user=args.user, password=args.password,
+                           database=args.dbname)
+    prepare_database(BENCH_DB_CONFIG, args.reset)
+    pool = get_pool(BENCH_DB_CONFIG, min_size=1, max_size=args.workers + 1)
+    templates = load_templates(args.payload)
+
+    report = {
+        "revision": git_revision(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "workers": args.workers,
+        "runs": [],
+    }
+    try:
+        for scale in args.scale or [Scale(19, 1000)]:
+            report["runs"].append(run_scale(scale, args, templates, pool))
+    finally:
+        close_all_pools()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+# как в benchmarks/: пакет app импортируется из корня репозитория
+sys.path.append(str(Path(__file__).parent.parent))
+
+SCHEMA = Path(__file__).parent / "schema.sql"
+
+
+@pytest.fixture
+def pg_config():
+    # тесты с настоящим Postgres идут, только если задан FLIGHTS_TEST_DSN, например
+    # FLIGHTS_TEST_DSN="host=localhost user=postgres password=rosatom dbname=postgres";
+    # на каждый тест создаётся и потом удаляется отдельная база со схемой из README
+    dsn = os.environ.get("FLIGHTS_TEST_DSN")
+    if not dsn:
+        pytest.skip("FLIGHTS_TEST_DSN is not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+    from psycopg2 import extensions
+
+    try:
+        admin = psycopg2.connect(dsn)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres is not available: {e}")
+    admin.autocommit = True
+    name = f"flights_test_{uuid.uuid4().hex[:8]}"
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {name}")
+
+    db_config = dict(extensions.parse_dsn(dsn), dbname=name)
+    conn = psycopg2.connect(**db_config)
+    with conn, conn.cursor() as cur:
+        cur.execute(SCHEMA.read_text(encoding="utf-8"))
+    conn.close()
+
+    from app.data_parser.pool import close_all_pools
+
+    try:
+        yield db_config
+    finally:
+        close_all_pools()
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.close()
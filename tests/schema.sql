@@ -0,0 +1,47 @@
+-- схема из README: flights с ключом (flight_number, scheduled_time), сводки и история статусов
+CREATE TABLE flights (
+    id SERIAL PRIMARY KEY,
+    flight_number VARCHAR(10) NOT NULL,
+    airline VARCHAR(50) NOT NULL,
+    origin CHAR(3) NOT NULL,
+    destination CHAR(3) NOT NULL,
+    scheduled_time TIMESTAMP NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    aircraft_model VARCHAR(50) NOT NULL,
+    icao_code CHAR(4) NOT NULL,
+    last_update TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    scheduled_departure TIMESTAMP NOT NULL,
+    CONSTRAINT flights_flight_number_scheduled_time_key UNIQUE (flight_number, scheduled_time)
+);
+
+CREATE INDEX flights_destination_scheduled_time_idx ON flights (destination, scheduled_time);
+CREATE INDEX flights_origin_scheduled_time_idx ON flights (origin, scheduled_time);
+CREATE INDEX flights_scheduled_time_idx ON flights (scheduled_time);
+
+CREATE TABLE daily_flight_summary (
+    id SERIAL PRIMARY KEY,
+    flight_day DATE NOT NULL,
+    airline VARCHAR(50) NOT NULL,
+    aircraft_model VARCHAR(50) NOT NULL,
+    total_flights INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT daily_flight_summary_bucket_key UNIQUE (flight_day, airline, aircraft_model)
+);
+
+CREATE TABLE hourly_flight_summary (
+    id SERIAL PRIMARY KEY,
+    flight_hour TIMESTAMP NOT NULL,
+    airline VARCHAR(50) NOT NULL,
+    aircraft_model VARCHAR(50) NOT NULL,
+    total_flights INTEGER NOT NULL,
+    CONSTRAINT hourly_flight_summary_bucket_key UNIQUE (flight_hour, airline, aircraft_model)
+);
+
+CREATE TABLE flight_status_history (
+    id BIGSERIAL PRIMARY KEY,
+    flight_number VARCHAR(10) NOT NULL,
+    scheduled_time TIMESTAMP NOT NULL,
+    old_status VARCHAR(50),
+    new_status VARCHAR(50) NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
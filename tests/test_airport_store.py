@@ -0,0 +1,40 @@
+import re
+from pathlib import Path
+
+from app.data_digest.airport_store import AirportStore, build_dataset
+
+SAMPLE = Path(__file__).parent.parent / "benchmarks" / "data" / "fr24_aer_arrivals_sample.json"
+
+
+def test_bundled_dataset_covers_sample_airports(tmp_path):
+    store = AirportStore(str(tmp_path / "coords.sqlite3"))
+    assert store.seed_from_csv() > 5000
+
+    codes = set(re.findall(r'"iata":\s*"([A-Z]{3})"', SAMPLE.read_text(encoding="utf-8")))
+    found = store.get_many(codes)
+    assert codes <= found.keys()
+    assert all(found[code] is not None for code in codes)
+    # не только Россия и соседи: крупные аэропорты мира тоже без геокодера
+    world = store.get_many(["LAX", "ORD", "JFK", "LHR", "NRT", "SYD", "GRU"])
+    assert len(world) == 7 and None not in world.values()
+    store.close()
+
+
+def test_build_dataset_keeps_iata_airports_of_selected_types(tmp_path):
+    source = tmp_path / "airports.csv"
+    source.write_text(
+        "id,ident,type,name,latitude_deg,longitude_deg,iso_country,iata_code\n"
+        "1,UWKD,large_airport,Kazan International Airport,55.606201,49.278702,RU,KZN\n"
+        "2,XXXX,heliport,Helipad,1,1,RU,ZZZ\n"
+        "3,YYYY,medium_airport,No IATA,2,2,RU,\n"
+        "4,UUBW,medium_airport,Zhukovsky International Airport,55.5533,38.15,RU,zia\n"
+        "5,XKZN,small_airport,Old Kazan Strip,55.7,49.1,RU,KZN\n",
+        encoding="utf-8",
+    )
+    target = tmp_path / "extract.csv"
+
+    assert build_dataset(str(source), str(target)) == 2
+    store = AirportStore(str(tmp_path / "coords.sqlite3"))
+    assert store.seed_from_csv(str(target)) == 2
+    assert store.get_many(["KZN", "ZIA", "ZZZ"]) == {"KZN": (55.606201, 49.278702), "ZIA": (55.5533, 38.15)}
+    store.close()
@@ -0,0 +1,113 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from app.data_archive.archive import PART_FILE, STATE_FILE, FlightArchive  # noqa: E402
+from app.data_parser.database import FlightDatabase  # noqa: E402
+from app.data_parser.extractor import FlightRecord  # noqa: E402
+from app.data_parser.pool import ConnectionPool  # noqa: E402
+
+D1, D2, D3 = datetime(2025, 7, 1), datetime(2025, 7, 2), datetime(2025, 7, 3)
+
+
+def flight(number, scheduled_time, origin="SVO", destination="AER", status="Scheduled"):
+    return FlightRecord(number, "Aeroflot", origin, destination, scheduled_time, scheduled_time - timedelta(hours=2),
+                        status, "Airbus A320", "UUEE")
+
+
+@pytest.fixture
+def db(pg_config):
+    pool = ConnectionPool(pg_config, min_size=0, max_size=2)
+    db = FlightDatabase(pg_config, pool=pool)
+    db.upsert_flights([
+        flight("SU1", D1 + timedelta(hours=10)),
+        flight("SU2", D1 + timedelta(hours=23), origin="LED", destination="KZN"),
+        flight("SU3", D2 + timedelta(hours=8), origin="AER", destination="SVO"),
+        flight("SU4", D3 + timedelta(hours=1)),
+    ])
+    yield db
+    pool.closeall()
+
+
+def part(archive, day):
+    return os.path.join(archive.root, f"flight_day={day.isoformat()}", PART_FILE)
+
+
+def execute(db, query, params=None):
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        conn.commit()
+
+
+def test_export_changed_rewrites_only_days_changed_since_the_watermark(db, tmp_path):
+    archive = FlightArchive(str(tmp_path), pool=db.pool)
+    assert archive.export_changed() == 4
+    assert archive.days() == [D1.date(), D2.date(), D3.date()]
+    watermark = json.loads((tmp_path / STATE_FILE).read_text())["watermark"]
+
+    # ничего не менялось, но последние строки ещё в интервале перекрытия — перевыгружаются, а не теряются
+    archive.overlap = timedelta(0)
+    assert archive.export_changed() == 0
+
+    stamps = {day: os.stat(part(archive, day)).st_mtime_ns for day in archive.days()}
+    execute(db, "UPDATE flights SET status = 'Landed', last_update = %s WHERE flight_number = 'SU3'",
+            (datetime.fromisoformat(watermark) + timedelta(seconds=1),))
+    assert archive.export_changed() == 1
+
+    # поверх существующего каталога flight_day=2025-07-02 пишется новый part, остальные дни не тронуты
+    assert os.stat(part(archive, D1.date())).st_mtime_ns == stamps[D1.date()]
+    assert os.stat(part(archive, D3.date())).st_mtime_ns == stamps[D3.date()]
+    assert archive.read(["flight_number", "status"], since=D2, until=D3)["status"].tolist() == ["Landed"]
+    assert sorted(os.listdir(os.path.dirname(part(archive, D2.date())))) == [PART_FILE]
+    assert json.loads((tmp_path / STATE_FILE).read_text())["watermark"] > watermark
+
+
+def test_day_gone_from_flights_keeps_its_archived_copy(db, tmp_path):
+    archive = FlightArchive(str(tmp_path), pool=db.pool)
+    archive.export_range(D1.date(), D3.date())
+    execute(db, "DELETE FROM flights WHERE scheduled_time < %s", (D2,))
+
+    assert archive.export_range(D1.date(), D2.date()) == 1
+    assert archive.read(["flight_number"], since=D1, until=D2)["flight_number"].tolist() in (["SU1", "SU2"],
+                                                                                             ["SU2", "SU1"])
+
+    archive.drop_days([D1.date()])
+    assert archive.days() == [D2.date(), D3.date()]
+    assert archive.export_days([D1.date()]) == 0
+    assert archive.days() == [D2.date(), D3.date()]
+
+
+def test_read_pushes_window_airports_and_changes_down(db, tmp_path):
+    archive = FlightArchive(str(tmp_path), pool=db.pool)
+    archive.export_range(D1.date(), D3.date())
+
+    def numbers(**kwargs):
+        return sorted(archive.read(["flight_number"], **kwargs)["flight_number"])
+
+    assert numbers() == ["SU1", "SU2", "SU3", "SU4"]
+    # по умолчанию [since, until); флагами — как BETWEEN отчётов и (since, until] карты
+    assert numbers(since=D1 + timedelta(hours=10), until=D2 + timedelta(hours=8)) == ["SU1", "SU2"]
+    assert numbers(since=D1 + timedelta(hours=10), until=D2 + timedelta(hours=8),
+                   since_inclusive=False, until_inclusive=True) == ["SU2", "SU3"]
+    assert numbers(airports=["KZN"]) == ["SU2"]
+    assert numbers(airports=["AER"], since=D2) == ["SU3", "SU4"]
+    assert numbers(changed_since=datetime.now() + timedelta(days=1)) == []
+
+    df = archive.read(["airline", "scheduled_time", "last_update"])
+    assert isinstance(df["airline"].dtype, pd.CategoricalDtype)
+    assert df["scheduled_time"].dtype == df["last_update"].dtype == "datetime64[ns]"
+
+
+def test_empty_archive_reads_as_typed_empty_frame(tmp_path):
+    df = FlightArchive(str(tmp_path / "missing")).read(["flight_number", "origin", "scheduled_time"],
+                                                       airports=["AER"])
+    assert df.empty and list(df.columns) == ["flight_number", "origin", "scheduled_time"]
+    assert isinstance(df["origin"].dtype, pd.CategoricalDtype)
+    assert df["scheduled_time"].dtype == "datetime64[ns]"
+    with pytest.raises(ValueError):
+        FlightArchive(str(tmp_path)).read(["no_such_column"])
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from app.atomic import atomic_write
+
+
+def test_replaces_file_and_keeps_its_permissions(tmp_path):
+    path = tmp_path / "flights.prom"
+    path.write_text("old", encoding="utf-8")
+    os.chmod(path, 0o640)
+
+    with atomic_write(str(path)) as f:
+        f.write("новые метрики")
+
+    assert path.read_text(encoding="utf-8") == "новые метрики"
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["flights.prom"]
+
+
+def test_new_file_is_world_readable(tmp_path):
+    path = tmp_path / "state.pkl"
+    with atomic_write(str(path), "wb") as f:
+        f.write(b"\x80")
+    assert os.stat(path).st_mode & 0o777 == 0o644
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("{}", encoding="utf-8")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path)) as f:
+            f.write('{"half": ')
+            raise RuntimeError("disk full")
+
+    assert path.read_text(encoding="utf-8") == "{}"
+    assert os.listdir(tmp_path) == ["cache.json"]
@@ -0,0 +1,77 @@
+import re
+from datetime import datetime
+
+import pytest
+
+from app.data_parser.database import CopyRowStream, _copy_value
+
+_ESCAPES = {"\\\\": "\\", "\\t": "\t", "\\n": "\n", "\\r": "\r"}
+
+
+def decode_copy(text):
+    # обратное преобразование текстового формата COPY: строки по \n, поля по \t, \N — NULL
+    rows = []
+    for line in text.split("\n")[:-1]:
+        rows.append(tuple(
+            None if field == "\\N" else re.sub(r"\\[\\tnr]", lambda m: _ESCAPES[m.group()], field)
+            for field in line.split("\t")
+        ))
+    return rows
+
+
+ROWS = [
+    ("SU1120", "Aeroflot", "SVO", "AER", datetime(2025, 7, 1, 14, 5), None, "Scheduled", "Airbus A320", "UUEE"),
+    ("A4\t07", "Azimuth\nAirlines", "C:\\", "AER", datetime(2025, 7, 1, 14, 30, 15), datetime(2025, 7, 1, 12),
+     "Landed\r\n", "Sukhoi \\N Superjet", "N/A"),
+    ("", "Кириллица", "KZN", "AER", datetime(2025, 7, 2), None, "\\", "\\\\t", "USSS"),
+]
+
+
+def expected(rows):
+    return [tuple(None if v is None else v.isoformat(sep=" ") if isinstance(v, datetime) else v for v in row)
+            for row in rows]
+
+
+def test_copy_value_escapes_control_characters_and_nulls():
+    assert _copy_value(None) == "\\N"
+    assert _copy_value("a\tb\nc\rd\\e") == "a\\tb\\nc\\rd\\\\e"
+    assert _copy_value(datetime(2025, 7, 1, 14, 5)) == "2025-07-01 14:05:00"
+    # строка "\N" — не NULL: обратная косая черта экранируется
+    assert _copy_value("\\N") == "\\\\N"
+
+
+def test_full_read_round_trips_rows():
+    stream = CopyRowStream(ROWS)
+    assert decode_copy(stream.read()) == expected(ROWS)
+    assert stream.rows == len(ROWS)
+    assert stream.read() == ""
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 8192])
+def test_chunked_reads_respect_size_and_join_to_full_output(size):
+    full = CopyRowStream(ROWS).read()
+    stream = CopyRowStream(ROWS)
+
+    chunks = []
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        assert len(chunk) <= size
+        chunks.append(chunk)
+
+    assert "".join(chunks) == full
+    assert stream.rows == len(ROWS)
+
+
+def test_rows_are_pulled_lazily():
+    pulled = []
+
+    def rows():
+        for row in ROWS:
+            pulled.append(row)
+            yield row
+
+    stream = CopyRowStream(rows())
+    stream.read(10)
+    assert len(pulled) == 1
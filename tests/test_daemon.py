@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.data_parser.daemon import AirportSchedule, PollingDaemon
+from app.data_parser.http_client import CircuitBreaker
+from app.data_parser.parser import AirportResult
+
+
+def make_daemon(**kwargs) -> PollingDaemon:
+    parser = SimpleNamespace(directions=("arrivals",), client=SimpleNamespace(breaker=CircuitBreaker()),
+                             db=SimpleNamespace(write_latency=None))
+    options = dict(max_workers=4, min_interval=60.0, max_interval=1800.0, density_reference=20.0, smoothing=0.5)
+    options.update(kwargs)
+    return PollingDaemon(parser, ["AER"], pool=None, **options)
+
+
+def ok(inserted=0, updated=0, unchanged=0) -> AirportResult:
+    return AirportResult("AER", True, inserted + updated + unchanged, 0.1,
+                         inserted=inserted, updated=updated, unchanged=unchanged)
+
+
+def test_interval_halves_on_change_and_grows_when_quiet():
+    daemon = make_daemon()
+    schedule = AirportSchedule("AER", "arrivals", 400.0)
+
+    assert daemon.next_interval(schedule, ok(updated=1, unchanged=9)) == 200.0
+    schedule.interval = 200.0
+    assert daemon.next_interval(schedule, ok(unchanged=10)) == 300.0
+
+
+def test_interval_is_clamped_to_min_and_max():
+    daemon = make_daemon()
+    fast = AirportSchedule("AER", "arrivals", 80.0)
+    assert daemon.next_interval(fast, ok(inserted=5)) == 60.0
+
+    slow = AirportSchedule("AER", "arrivals", 1500.0)
+    assert daemon.next_interval(slow, ok(unchanged=5)) == 1800.0
+
+
+def test_dense_schedule_lowers_the_upper_bound():
+    daemon = make_daemon()
+    schedule = AirportSchedule("AER", "arrivals", 1500.0)
+    # 80 рейсов при density_reference=20 — потолок 1800 * 20 / 80
+    assert daemon.next_interval(schedule, ok(unchanged=80)) == pytest.approx(450.0)
+    assert schedule.density == 80
+
+
+def test_failure_backs_off_exponentially_up_to_max():
+    daemon = make_daemon()
+    schedule = AirportSchedule("AER", "arrivals", 600.0)
+    failed = AirportResult("AER", False, 0, 0.1, "timeout")
+
+    assert daemon.next_interval(schedule, failed) == 1200.0
+    schedule.interval = 1200.0
+    assert daemon.next_interval(schedule, failed) == 1800.0
+    assert schedule.failures == 2
+
+
+def test_open_circuit_waits_for_breaker_reset():
+    daemon = make_daemon()
+    breaker = daemon.parser.client.breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("AER")
+    schedule = AirportSchedule("AER", "arrivals", 60.0)
+
+    assert daemon.next_interval(schedule, AirportResult("AER", False, 0, 0.1, "503")) == breaker.reset_timeout
+
+
+def test_slow_writes_limit_polls_to_one():
+    daemon = make_daemon(max_write_latency=2.0)
+    assert daemon._concurrency_limit() == 4
+
+    daemon.parser.db.write_latency = 3.5
+    assert daemon._concurrency_limit() == 1
+
+    daemon.parser.db.write_latency = 0.4
+    assert daemon._concurrency_limit() == 4
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import pytest
+
+from app.data_parser.database import MERGE_SQL, MERGE_WITH_HISTORY_SQL, FlightDatabase
+from app.data_parser.extractor import FlightRecord
+from app.data_parser.partitions import PartitionManager
+from app.data_parser.pool import ConnectionPool
+
+T = datetime(2025, 7, 1, 14, 5)
+
+
+def flight(number="SU1120", status="Scheduled", scheduled_time=T, model="Airbus A320"):
+    return FlightRecord(number, "Aeroflot", "SVO", "AER", scheduled_time, datetime(2025, 7, 1, 11),
+                        status, model, "UUEE")
+
+
+@pytest.fixture
+def db(pg_config):
+    pool = ConnectionPool(pg_config, min_size=0, max_size=2)
+    yield FlightDatabase(pg_config, pool=pool)
+    pool.closeall()
+
+
+def rows(db, query):
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(query)
+        return cur.fetchall()
+
+
+def history(db):
+    return rows(db, "SELECT flight_number, old_status, new_status FROM flight_status_history ORDER BY id")
+
+
+def test_merge_sql_keeps_the_last_staged_row_per_key():
+    for sql in (MERGE_SQL, MERGE_WITH_HISTORY_SQL):
+        assert "DISTINCT ON (flight_number, scheduled_time)" in sql
+        assert "ORDER BY flight_number, scheduled_time, seq DESC" in sql
+    assert "flight_status_history" not in MERGE_SQL
+
+
+def test_counts_split_batch_into_inserted_updated_unchanged(db):
+    assert db.upsert_flights([flight("SU1"), flight("SU2")]) == {
+        "inserted": 2, "updated": 0, "unchanged": 0, "status_changes": 2}
+
+    counts = db.upsert_flights([flight("SU1"), flight("SU2", status="Delayed"), flight("SU3")])
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1, "status_changes": 2}
+    assert db.pop_touched_hours() == {datetime(2025, 7, 1, 14)}
+
+    # неизменившийся батч ничего не пишет и не трогает часы для пересчёта сводок
+    assert db.upsert_flights([flight("SU1"), flight("SU2", status="Delayed")])["unchanged"] == 2
+    assert db.pop_touched_hours() == set()
+
+
+def test_last_row_of_a_duplicated_key_wins(db):
+    for _ in range(5):
+        counts = db.upsert_flights([flight(status="Scheduled"), flight(status="Estimated 14:20"),
+                                    flight(status="Landed 14:18")])
+        assert rows(db, "SELECT status FROM flights") == [("Landed 14:18",)]
+    assert counts == {"inserted": 0, "updated": 0, "unchanged": 1, "status_changes": 0}
+    assert history(db) == [("SU1120", None, "Landed 14:18")]
+
+
+def test_history_records_only_status_transitions(db):
+    db.upsert_flights([flight(status="Scheduled")])
+    db.upsert_flights([flight(status="Scheduled")])
+    # изменение без смены статуса — обновление flights, но не история
+    assert db.upsert_flights([flight(status="Scheduled", model="Airbus A321")])["updated"] == 1
+    db.upsert_flights([flight(status="Estimated 14:20")])
+    db.upsert_flights([flight(status="Landed 14:18")])
+
+    assert history(db) == [
+        ("SU1120", None, "Scheduled"),
+        ("SU1120", "Scheduled", "Estimated 14:20"),
+        ("SU1120", "Estimated 14:20", "Landed 14:18"),
+    ]
+
+
+def test_without_history_table_only_flights_are_written(db):
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE flight_status_history")
+        conn.commit()
+
+    assert db.upsert_flights([flight()]) == {"inserted": 1, "updated": 0, "unchanged": 0, "status_changes": 0}
+    assert db.status_history is False
+    assert db.upsert_flights([flight(status="Delayed")])["updated"] == 1
+
+
+PARTITIONED_FLIGHTS = """
+    DROP TABLE flights;
+    CREATE TABLE flights (
+        id BIGSERIAL,
+        flight_number VARCHAR(10) NOT NULL,
+        airline VARCHAR(50) NOT NULL,
+        origin CHAR(3) NOT NULL,
+        destination CHAR(3) NOT NULL,
+        scheduled_time TIMESTAMP NOT NULL,
+        status VARCHAR(50) NOT NULL,
+        aircraft_model VARCHAR(50) NOT NULL,
+        icao_code CHAR(4) NOT NULL,
+        last_update TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        scheduled_departure TIMESTAMP NOT NULL,
+        PRIMARY KEY (id, scheduled_time),
+        CONSTRAINT flights_flight_number_scheduled_time_key UNIQUE (flight_number, scheduled_time)
+    ) PARTITION BY RANGE (scheduled_time);
+"""
+
+
+def test_partitions_are_created_from_staged_bounds_for_a_streamed_batch(db):
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(PARTITIONED_FLIGHTS)
+        conn.commit()
+    db.partitions = PartitionManager(db.pool, granularity="day")
+
+    # генератор, а не список: рейсы не копятся в памяти ради границ батча
+    batch = (flight(f"SU{i}", scheduled_time=datetime(2025, 7, 1 + i % 3, 10)) for i in range(30))
+    assert db.upsert_flights(batch)["inserted"] == 30
+    assert db.partitions.list_partitions() == ["flights_p20250701", "flights_p20250702", "flights_p20250703"]
+    assert rows(db, "SELECT COUNT(*) FROM flights") == [(30,)]
+
+    assert db.upsert_flights(iter([flight("SU0", status="Delayed", scheduled_time=datetime(2025, 7, 1, 10)),
+                                   flight("SU99", scheduled_time=datetime(2025, 7, 9))])) == {
+        "inserted": 1, "updated": 1, "unchanged": 0, "status_changes": 2}
+    assert "flights_p20250709" in db.partitions.list_partitions()
@@ -0,0 +1,129 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from app.data_digest.digest import LOAD_COLUMNS, FlightVisualizer
+from app.data_digest.routes import RouteGeometryCache
+from app.data_parser.database import FlightDatabase
+from app.data_parser.extractor import FlightRecord
+from app.data_parser.pool import ConnectionPool
+
+T = datetime(2025, 7, 1, 12)
+
+
+def row(number, airline, origin, scheduled_time, model="Airbus A320"):
+    # порядок LOAD_COLUMNS: flight_number, airline, origin, destination, aircraft_model,
+    # scheduled_time, scheduled_departure, status
+    return (number, airline, origin, "AER", model, scheduled_time, scheduled_time - timedelta(hours=2), "Scheduled")
+
+
+class FakeCursor:
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params):
+        self.conn.executed.append((self.name, " ".join(query.split()), list(params)))
+
+    def fetchmany(self, size):
+        self.conn.sizes.append(size)
+        return self.conn.chunks.pop(0) if self.conn.chunks else []
+
+
+class FakeConnection:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.executed = []
+        self.sizes = []
+        self.rollbacks = 0
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    def __init__(self, chunks):
+        self.conn = FakeConnection(chunks)
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+def visualizer(pool):
+    vis = FlightVisualizer({}, pool=pool)
+    vis.route_geometry = RouteGeometryCache(None)
+    return vis
+
+
+def test_chunks_are_merged_with_union_of_categories():
+    pool = FakePool([
+        [row("SU1", "Aeroflot", "SVO", T), row("SU2", "Aeroflot", "LED", T - timedelta(hours=1))],
+        [row("DP3", "Pobeda", "VKO", T - timedelta(hours=2), model="Boeing 737")],
+    ])
+
+    df = visualizer(pool).load_flights_data(since=T - timedelta(days=1), chunk_size=2)
+
+    # именованный курсор, пачки по chunk_size, транзакция чтения закрыта
+    assert pool.conn.executed[0][0] == "digest_flights"
+    assert pool.conn.sizes == [2, 2, 2]
+    assert pool.conn.rollbacks == 1
+
+    assert list(df.columns) == list(LOAD_COLUMNS)
+    assert df["flight_number"].tolist() == ["SU1", "SU2", "DP3"]
+    for column in ("airline", "origin", "destination", "aircraft_model", "status"):
+        assert isinstance(df[column].dtype, pd.CategoricalDtype), column
+    assert set(df["airline"].cat.categories) == {"Aeroflot", "Pobeda"}
+    assert set(df["origin"].cat.categories) == {"SVO", "LED", "VKO"}
+    assert df["scheduled_time"].dtype == "datetime64[ns]"
+    assert df["scheduled_departure"].dtype == "datetime64[ns]"
+    assert df["flight_number"].dtype == object
+
+
+def test_window_and_cap_reach_the_query():
+    pool = FakePool([])
+    since, until, changed = T - timedelta(days=2), T, T - timedelta(hours=1)
+
+    df = visualizer(pool).load_flights_data(since=since, until=until, changed_since=changed, max_rows=5)
+    _, query, params = pool.conn.executed[0]
+    assert "scheduled_time > %s AND scheduled_time <= %s AND last_update > %s" in query
+    assert query.endswith("ORDER BY scheduled_time DESC LIMIT %s")
+    assert params == [since, until, changed, 5]
+    # пустой результат — те же колонки и типы
+    assert list(df.columns) == list(LOAD_COLUMNS) and df.empty
+    assert isinstance(df["airline"].dtype, pd.CategoricalDtype)
+
+    visualizer(pool).load_flights_data(since=since, max_rows=None)
+    _, query, params = pool.conn.executed[1]
+    assert "LIMIT" not in query and params == [since]
+
+
+def test_window_and_row_cap_against_postgres(pg_config):
+    pool = ConnectionPool(pg_config, min_size=0, max_size=1)
+    FlightDatabase(pg_config, pool=pool).upsert_flights([
+        FlightRecord(f"SU{i}", "Aeroflot" if i % 2 else "Pobeda", "SVO", "AER", T - timedelta(hours=i),
+                     T - timedelta(hours=i + 2), "Scheduled", "Airbus A320", "UUEE")
+        for i in range(10)
+    ])
+    vis = visualizer(pool)
+
+    # окно (since, until]: SU9 ровно на since не входит, SU0 ровно на until входит
+    df = vis.load_flights_data(since=T - timedelta(hours=9), until=T, max_rows=None, chunk_size=3)
+    assert df["flight_number"].tolist() == [f"SU{i}" for i in range(9)]
+    assert set(df["airline"].cat.categories) == {"Aeroflot", "Pobeda"}
+
+    # cap берёт самые поздние рейсы окна
+    df = vis.load_flights_data(since=T - timedelta(days=1), until=T - timedelta(hours=2), max_rows=4, chunk_size=3)
+    assert df["flight_number"].tolist() == ["SU2", "SU3", "SU4", "SU5"]
+    pool.closeall()
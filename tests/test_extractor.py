@@ -0,0 +1,65 @@
+import copy
+import json
+from pathlib import Path
+
+import pytest
+
+from app.data_parser.extractor import FlightExtractor
+from app.data_parser.parser import FlightParser
+
+SAMPLE = Path(__file__).parent.parent / "benchmarks" / "data" / "fr24_aer_arrivals_sample.json"
+
+
+@pytest.fixture(scope="module")
+def sample_flights():
+    payload = json.loads(SAMPLE.read_text(encoding="utf-8"))
+    return payload["result"]["response"]["airport"]["pluginData"]["schedule"]["arrivals"]["data"]
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return FlightParser(db_handler=None)
+
+
+def reference(parser, flights, airport, direction):
+    parsed = (parser.parse_flight(flight, airport, direction) for flight in flights)
+    return [flight for flight in parsed if flight is not None]
+
+
+@pytest.mark.parametrize("direction", ["arrivals", "departures"])
+def test_extract_page_matches_parse_flight(parser, sample_flights, direction):
+    records = FlightExtractor().extract_page(sample_flights, "AER", direction, parser._airport_icao.get("AER", "N/A"))
+    assert [record._asdict() for record in records] == reference(parser, sample_flights, "AER", direction)
+
+
+@pytest.mark.parametrize("bad_value", [{"ts": 1}, [1751371200], "1751371200", 10 ** 20, float("nan")])
+@pytest.mark.parametrize("field", ["arrival", "departure"])
+def test_malformed_timestamp_skips_only_that_record(parser, sample_flights, field, bad_value):
+    flights = copy.deepcopy(sample_flights[:5])
+    flights[2]["flight"]["time"]["scheduled"][field] = bad_value
+
+    records = FlightExtractor().extract_page(flights, "AER")
+    expected = reference(parser, flights, "AER", "arrivals")
+    assert len(records) == len(flights) - 1
+    assert [record._asdict() for record in records] == expected
+
+
+def test_missing_times_match_parse_flight(parser, sample_flights):
+    flights = copy.deepcopy(sample_flights[:3])
+    del flights[0]["flight"]["time"]["scheduled"]["arrival"]
+    flights[1]["flight"]["time"]["scheduled"]["departure"] = None
+    flights[2]["flight"]["time"] = "n/a"
+
+    records = FlightExtractor().extract_page(flights, "AER")
+    assert [record._asdict() for record in records] == reference(parser, flights, "AER", "arrivals")
+
+
+def test_non_dict_nodes_read_as_missing_like_parse_flight(parser, sample_flights):
+    flights = copy.deepcopy(sample_flights[:3])
+    flights[0]["flight"]["airport"] = None
+    flights[1]["flight"]["identification"] = "SU1120"
+    flights[2]["flight"]["status"] = ["Landed"]
+
+    for direction in ("arrivals", "departures"):
+        records = FlightExtractor().extract_page(flights, "AER", direction)
+        assert [record._asdict() for record in records] == reference(parser, flights, "AER", direction)
@@ -0,0 +1,88 @@
+import pytest
+
+from app.data_parser import http_client
+from app.data_parser.http_client import CircuitBreaker, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(http_client.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(http_client.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_bucket_allows_burst_then_paces_at_rate(clock):
+    bucket = TokenBucket(rate=4.0, capacity=2.0)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.25)]
+
+
+def test_bucket_refills_over_time_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3.0)
+    for _ in range(3):
+        bucket.acquire()
+
+    clock.now += 60
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_breaker_opens_after_threshold_per_key(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=120.0)
+    for _ in range(2):
+        breaker.record_failure("AER")
+    assert breaker.allow("AER") and not breaker.is_open("AER")
+
+    breaker.record_failure("AER")
+    assert breaker.is_open("AER")
+    assert not breaker.allow("AER")
+    assert breaker.allow("IST")
+
+
+def test_breaker_half_opens_after_timeout_and_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=120.0)
+    breaker.record_failure("AER")
+    assert not breaker.allow("AER")
+
+    clock.now += 120
+    assert breaker.allow("AER")
+    # пробная попытка одна: следующий запрос снова ждёт reset_timeout
+    assert not breaker.allow("AER")
+
+    breaker.record_success("AER")
+    assert not breaker.is_open("AER")
+    assert breaker.allow("AER")
+
+
+def test_breaker_reopens_when_half_open_probe_fails(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+    breaker.record_failure("AER")
+    breaker.record_failure("AER")
+
+    clock.now += 60
+    assert breaker.allow("AER")
+    breaker.record_failure("AER")
+    assert breaker.is_open("AER")
+    assert not breaker.allow("AER")
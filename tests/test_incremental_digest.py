@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from app.data_digest.digest import FlightVisualizer, RenderResult
+from app.data_digest.incremental import IncrementalDigest, STATE_COLUMNS
+
+
+class FakeMap:
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write("<html></html>")
+
+
+class FakeVisualizer:
+    # повторяет семантику запроса load_flights_data поверх DataFrame вместо flights
+    concat_frames = staticmethod(FlightVisualizer.concat_frames)
+
+    def __init__(self, rows):
+        self.table = FlightVisualizer._chunk_frame(rows, STATE_COLUMNS)
+        self.renders = 0
+
+    def load_flights_data(self, since, max_rows=None, columns=None, changed_since=None, **kwargs):
+        df = self.table[self.table["scheduled_time"] > since]
+        if changed_since is not None:
+            df = df[df["last_update"] > changed_since]
+        df = df.sort_values("scheduled_time", ascending=False, kind="stable")
+        if max_rows is not None:
+            df = df.head(max_rows)
+        return df.reset_index(drop=True)
+
+    def render_map(self, flights_df, render_mode="polyline", sidecar_file=None):
+        self.renders += 1
+        return RenderResult(FakeMap(), len(flights_df), [], f"page-{len(flights_df)}")
+
+
+def make_rows(count, now):
+    updated = now - timedelta(minutes=1)
+    return [
+        (f"SU{index:04d}", "Aeroflot", "SVO", "LED", "Airbus A320",
+         now - timedelta(hours=index + 1), now - timedelta(hours=index + 2), "Scheduled", updated)
+        for index in range(count)
+    ]
+
+
+def test_refresh_without_changes_is_noop_when_window_is_capped(tmp_path):
+    now = datetime.now()
+    visualizer = FakeVisualizer(make_rows(25, now))
+    digest = IncrementalDigest(visualizer, state_file=str(tmp_path / "state.pkl"))
+    output = str(tmp_path / "map.html")
+
+    assert digest.refresh(output_file=output, max_rows=10) is not None
+    assert digest.refresh(output_file=output, max_rows=10) is None
+    assert digest.refresh(output_file=output, max_rows=10) is None
+    assert visualizer.renders == 1
+
+
+def test_refresh_patches_new_flight_inside_capped_window(tmp_path):
+    now = datetime.now()
+    visualizer = FakeVisualizer(make_rows(25, now))
+    digest = IncrementalDigest(visualizer, state_file=str(tmp_path / "state.pkl"))
+    output = str(tmp_path / "map.html")
+    digest.refresh(output_file=output, max_rows=10)
+
+    newest = FlightVisualizer._chunk_frame(
+        [("SU9999", "Aeroflot", "SVO", "AER", "Airbus A321",
+          now - timedelta(minutes=30), now - timedelta(hours=3), "Scheduled", now)], STATE_COLUMNS)
+    visualizer.table = FlightVisualizer.concat_frames([visualizer.table, newest], STATE_COLUMNS)
+
+    result = digest.refresh(output_file=output, max_rows=10)
+    assert result is not None
+    assert result.routes_added == 10
+    assert digest.refresh(output_file=output, max_rows=10) is None
@@ -0,0 +1,57 @@
+from app.data_parser.parser import FlightParser
+
+from test_response_cache import FakeClient, FakeDatabase, schedule_payload
+
+
+def make_parser(payloads, mode="both", tracked=("SVO", "AER")):
+    db = FakeDatabase()
+    parser = FlightParser(db, mode=mode, tracked_airports=tracked, client=FakeClient(payloads),
+                          prefetch_pages=0)
+    return parser, db
+
+
+def test_departure_is_written_when_arrival_side_never_wrote_it():
+    # прилёты AER не дошли до рейса (упали, открыт breaker, рейс дальше max_pages) — вылет пишем сами
+    parser, db = make_parser({("SVO", "departures"): schedule_payload("departures", "SVO", "AER")})
+
+    result = parser.ingest_airport("SVO", "departures")
+    assert result.ok and result.inserted == 1 and result.skipped == 0
+    assert [(f.origin, f.destination, f.flight_number) for f in db.writes[0]] == [("SVO", "AER", "SU1120")]
+
+
+def test_flight_seen_from_both_airports_is_written_once():
+    parser, db = make_parser({
+        ("AER", "arrivals"): schedule_payload("arrivals", "SVO", "AER"),
+        ("SVO", "departures"): schedule_payload("departures", "SVO", "AER"),
+    })
+
+    results = parser.process_airports(["AER", "SVO"], max_workers=1, retry_rounds=0)
+    # задачи идут в порядке (AER, arrivals), (AER, departures), (SVO, arrivals), ...
+    assert sum(len(batch) for batch in db.writes) == 1
+    assert sum(r.skipped for r in results) == 1
+
+
+def test_departure_with_newer_status_is_still_written():
+    parser, db = make_parser({
+        ("AER", "arrivals"): schedule_payload("arrivals", "SVO", "AER", status="Scheduled"),
+        ("SVO", "departures"): schedule_payload("departures", "SVO", "AER", status="Departed 10:05"),
+    })
+
+    parser.ingest_airport("AER", "arrivals")
+    result = parser.ingest_airport("SVO", "departures")
+    assert result.skipped == 0
+    assert [f.status for f in db.writes[-1]] == ["Departed 10:05"]
+
+
+def test_untracked_destination_and_single_mode_never_skip():
+    payloads = {
+        ("AER", "arrivals"): schedule_payload("arrivals", "SVO", "AER"),
+        ("SVO", "departures"): schedule_payload("departures", "SVO", "AER"),
+    }
+    parser, db = make_parser(payloads, tracked=("SVO",))
+    parser.ingest_airport("AER", "arrivals")
+    assert parser.ingest_airport("SVO", "departures").skipped == 0
+
+    parser, db = make_parser(payloads, mode="departures")
+    parser.ingest_airport("AER", "arrivals")
+    assert parser.ingest_airport("SVO", "departures").skipped == 0
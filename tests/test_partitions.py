@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import psycopg2.errors
+import pytest
+
+from app.data_parser import partitions as partitions_module
+from app.data_parser.partitions import PartitionManager
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if "PARTITION OF" in str(query) and self.conn.pool.failures:
+            self.conn.pool.failures -= 1
+            raise psycopg2.errors.DuplicateTable("relation already exists")
+        self.conn.statements.append(query)
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.pool.commits += 1
+
+
+class FakePool:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.commits = 0
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+
+def test_missing_partitions_cover_every_period_once():
+    manager = PartitionManager(FakePool(), granularity="month")
+    periods = manager.missing_partitions(datetime(2025, 11, 20), datetime(2026, 2, 3))
+    assert periods == [datetime(2025, 11, 1), datetime(2025, 12, 1), datetime(2026, 1, 1), datetime(2026, 2, 1)]
+    assert manager.partition_name(periods[1]) == "flights_p202512"
+    assert manager.shift_periods(datetime(2025, 1, 1), -2) == datetime(2024, 11, 1)
+
+
+def test_ensure_partitions_commits_separately_and_caches_names():
+    pool = FakePool()
+    manager = PartitionManager(pool, granularity="day")
+
+    assert manager.ensure_partitions(datetime(2025, 7, 1, 10), datetime(2025, 7, 2, 3)) == 2
+    assert pool.commits == 1
+    # повторный вызов на тех же датах DDL не выполняет
+    assert manager.ensure_partitions(datetime(2025, 7, 1, 12), datetime(2025, 7, 2)) == 0
+    assert pool.commits == 1
+
+
+def test_ensure_partitions_retries_lost_race(monkeypatch):
+    monkeypatch.setattr(partitions_module.time, "sleep", lambda _: None)
+    pool = FakePool(failures=1)
+    manager = PartitionManager(pool, granularity="day")
+
+    assert manager.ensure_partitions(datetime(2025, 7, 1), datetime(2025, 7, 1)) == 1
+    assert pool.commits == 1
+
+
+def test_ensure_partitions_gives_up_after_all_attempts(monkeypatch):
+    monkeypatch.setattr(partitions_module.time, "sleep", lambda _: None)
+    manager = PartitionManager(FakePool(failures=partitions_module.DDL_ATTEMPTS), granularity="day")
+
+    with pytest.raises(psycopg2.Error):
+        manager.ensure_partitions(datetime(2025, 7, 1), datetime(2025, 7, 1))
+    assert manager.missing_partitions(datetime(2025, 7, 1), datetime(2025, 7, 1)) == [datetime(2025, 7, 1)]
+
+
+def test_ensure_partitions_can_use_the_writers_connection(monkeypatch):
+    monkeypatch.setattr(partitions_module.time, "sleep", lambda _: None)
+
+    class WriterConnection(FakeConnection):
+        rollbacks = 0
+
+        def rollback(self):
+            self.rollbacks += 1
+
+    pool = FakePool(failures=1)
+    conn = WriterConnection(pool)
+    pool.connection = None  # из пула второе соединение не берётся
+    manager = PartitionManager(pool, granularity="day")
+
+    assert manager.ensure_partitions(datetime(2025, 7, 1), datetime(2025, 7, 1), conn=conn) == 1
+    assert conn.rollbacks == 1 and pool.commits == 1
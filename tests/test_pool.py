@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+from psycopg2 import extensions
+
+from app.data_parser import pool as pool_module
+from app.data_parser.pool import ConnectionPool, PoolTimeout, close_all_pools, get_pool
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = 0
+        self.autocommit = False
+        self.alive = True
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, query):
+                if not connection.alive:
+                    raise extensions.QueryCanceledError("server closed the connection")
+
+        return Cursor()
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def fake_pool(**kwargs) -> ConnectionPool:
+    pool = ConnectionPool({"dbname": "fake"}, **kwargs)
+    created = []
+
+    def connect():
+        created.append(FakeConnection(len(created)))
+        return created[-1]
+
+    pool._connect = connect
+    pool.created = created
+    return pool
+
+
+def test_exhausted_pool_times_out_and_counts_the_wait():
+    pool = fake_pool(min_size=0, max_size=2, timeout=0.05)
+    first, second = pool.getconn(), pool.getconn()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert time.monotonic() - started >= 0.05
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["waits"] == 1 and stats["size"] == 2
+
+
+def test_waiter_gets_the_connection_released_by_another_thread():
+    pool = fake_pool(min_size=0, max_size=1, timeout=5)
+    conn = pool.getconn()
+    got = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    time.sleep(0.05)
+    pool.putconn(conn)
+    waiter.join(1)
+
+    assert got == [conn]
+    assert pool.stats()["creations"] == 1
+
+
+def test_idle_connections_are_reused_last_in_first_out():
+    pool = fake_pool(min_size=0, max_size=3)
+    a, b, c = pool.getconn(), pool.getconn(), pool.getconn()
+    for conn in (a, b, c):
+        pool.putconn(conn)
+
+    assert pool.getconn() is c
+    assert pool.getconn() is b
+    assert pool.stats()["creations"] == 3
+
+
+def test_stale_connection_failing_health_check_is_replaced():
+    pool = fake_pool(min_size=0, max_size=2, health_check_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.alive = False
+
+    fresh = pool.getconn()
+    assert fresh is not conn and conn.closed
+    stats = pool.stats()
+    assert stats["health_check_failures"] == 1 and stats["discards"] == 1 and stats["size"] == 1
+
+
+def test_putconn_rolls_back_an_open_transaction():
+    pool = fake_pool(min_size=0, max_size=1)
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INERROR
+    conn.autocommit = True
+    pool.putconn(conn)
+
+    assert conn.rollbacks == 1 and conn.autocommit is False
+    assert pool.getconn() is conn
+
+
+def test_putconn_discards_a_connection_that_cannot_be_rolled_back():
+    pool = fake_pool(min_size=0, max_size=1)
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+
+    def broken_rollback():
+        raise extensions.QueryCanceledError("connection lost")
+
+    conn.rollback = broken_rollback
+    pool.putconn(conn)
+    assert conn.closed and pool.stats()["size"] == 0
+    assert pool.getconn() is not conn
+
+
+def test_get_pool_grows_the_shared_pool_and_warns_about_other_settings(monkeypatch, caplog):
+    monkeypatch.setattr(pool_module, "ConnectionPool", lambda config, **kwargs: fake_pool(**kwargs))
+    try:
+        report_pool = get_pool({"database": "air_data"}, min_size=1, max_size=2)
+        parser_pool = get_pool({"dbname": "air_data"}, min_size=2, max_size=9, timeout=1.0)
+        assert parser_pool is report_pool
+        assert (parser_pool.min_size, parser_pool.max_size) == (2, 9)
+        assert "timeout" in caplog.text
+
+        # следующий, более скромный пользователь пул не сужает
+        get_pool({"dbname": "air_data"}, min_size=1, max_size=2)
+        assert report_pool.max_size == 9
+    finally:
+        close_all_pools()
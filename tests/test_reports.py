@@ -0,0 +1,150 @@
+from datetime import date, datetime
+
+import pytest
+from psycopg2 import extensions
+
+from app.collections_day_and_hour.day_collections import FlightReport
+from app.collections_day_and_hour.hour_collections import HourlyFlightReport
+from app.data_parser.database import FlightDatabase
+from app.data_parser.extractor import FlightRecord
+from app.data_parser.parser import refresh_reports
+from app.data_parser.pool import ConnectionPool
+
+AIRPORTS = ["AER", "SVO"]
+
+
+def flight(number, origin, destination, scheduled_time, airline="Aeroflot", model="Airbus A320"):
+    return FlightRecord(number, airline, origin, destination, scheduled_time, scheduled_time,
+                        "Scheduled", model, "UUEE")
+
+
+@pytest.fixture
+def pool(pg_config):
+    pool = ConnectionPool(pg_config, min_size=0, max_size=2)
+    yield pool
+    pool.closeall()
+
+
+def rows(pool, query):
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(query)
+        return cur.fetchall()
+
+
+def test_hourly_summary_counts_window_slots_once_per_flight(pool):
+    FlightDatabase({}, pool=pool).upsert_flights([
+        flight("SU1", "SVO", "AER", datetime(2025, 7, 1, 14, 5)),
+        flight("SU2", "AER", "LED", datetime(2025, 7, 1, 14, 59)),
+        flight("SU3", "LED", "KZN", datetime(2025, 7, 1, 14, 30)),  # не наши аэропорты
+        flight("SU4", "SVO", "AER", datetime(2025, 7, 1, 15, 0)),   # другой час
+        flight("SU5", "SVO", "AER", datetime(2025, 7, 2, 14, 0)),   # за окном
+    ])
+
+    summary = HourlyFlightReport({}, pool=pool).get_hourly_summary(AIRPORTS, 14, "2025-07-01", "2025-07-01")
+    # SU1 летит между двумя нашими аэропортами и учитывается один раз
+    assert summary == [(datetime(2025, 7, 1, 14), "Aeroflot", "Airbus A320", 2)]
+
+    summary = HourlyFlightReport({}, pool=pool).get_hourly_summary(AIRPORTS, [14, 15], "2025-07-01", "2025-07-02")
+    assert sorted(summary) == [
+        (datetime(2025, 7, 1, 14), "Aeroflot", "Airbus A320", 2),
+        (datetime(2025, 7, 1, 15), "Aeroflot", "Airbus A320", 1),
+        (datetime(2025, 7, 2, 14), "Aeroflot", "Airbus A320", 1),
+    ]
+
+
+def test_refresh_days_rewrites_only_touched_days(pool):
+    db = FlightDatabase({}, pool=pool)
+    db.upsert_flights([
+        flight("SU1", "SVO", "AER", datetime(2025, 7, 1, 10)),
+        flight("SU2", "SVO", "AER", datetime(2025, 7, 2, 10), model="Boeing 737"),
+    ])
+    reporter = FlightReport({}, pool=pool)
+    assert reporter.refresh_days([date(2025, 7, 1), date(2025, 7, 2)], AIRPORTS) == 2
+
+    # на 2 июля модель сменилась: старая строка сводки удаляется, 1 июля не трогаем
+    db.upsert_flights([flight("SU2", "SVO", "AER", datetime(2025, 7, 2, 10))])
+    rows_before = rows(pool, "SELECT flight_day, created_at FROM daily_flight_summary WHERE flight_day = '2025-07-01'")
+    assert reporter.refresh_days([date(2025, 7, 2)], AIRPORTS) == 2
+    assert rows(pool, "SELECT flight_day, created_at FROM daily_flight_summary "
+                      "WHERE flight_day = '2025-07-01'") == rows_before
+    assert rows(pool, "SELECT flight_day, aircraft_model, total_flights FROM daily_flight_summary "
+                      "ORDER BY flight_day") == [
+        (date(2025, 7, 1), "Airbus A320", 1),
+        (date(2025, 7, 2), "Airbus A320", 1),
+    ]
+    # повторный пересчёт без изменений ничего не пишет
+    assert reporter.refresh_days([date(2025, 7, 2)], AIRPORTS) == 0
+
+
+def test_refresh_hours_upserts_and_removes_buckets(pool):
+    db = FlightDatabase({}, pool=pool)
+    db.upsert_flights([
+        flight("SU1", "SVO", "AER", datetime(2025, 7, 1, 14, 10)),
+        flight("SU2", "AER", "LED", datetime(2025, 7, 1, 14, 20), airline="Pobeda"),
+    ])
+    reporter = HourlyFlightReport({}, pool=pool)
+    assert reporter.refresh_hours(db.pop_touched_hours(), AIRPORTS) == 2
+
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM flights WHERE flight_number = 'SU2'")
+        conn.commit()
+    assert reporter.refresh_hours([datetime(2025, 7, 1, 14)], AIRPORTS) == 1
+    assert rows(pool, "SELECT flight_hour, airline, total_flights FROM hourly_flight_summary") == [
+        (datetime(2025, 7, 1, 14), "Aeroflot", 1),
+    ]
+
+
+def test_refresh_reports_limits_touched_buckets_to_window_and_fills_missing(pool):
+    db = FlightDatabase({}, pool=pool)
+    db.upsert_flights([
+        flight("SU1", "SVO", "AER", datetime(2025, 7, 1, 14)),
+        flight("SU2", "SVO", "AER", datetime(2025, 7, 2, 14)),
+        flight("SU3", "SVO", "AER", datetime(2025, 7, 5, 14)),  # за окном, хотя тот же час суток
+    ])
+    db.pop_touched_hours()
+
+    # ничего не менялось, но сводок за окно ещё нет — строятся целиком
+    refresh_reports(pool, set(), "2025-07-01", "2025-07-02", 14, AIRPORTS)
+    assert rows(pool, "SELECT flight_day FROM daily_flight_summary ORDER BY 1") == [
+        (date(2025, 7, 1),), (date(2025, 7, 2),)]
+    assert rows(pool, "SELECT flight_hour FROM hourly_flight_summary ORDER BY 1") == [
+        (datetime(2025, 7, 1, 14),), (datetime(2025, 7, 2, 14),)]
+
+    db.upsert_flights([flight("SU3", "SVO", "AER", datetime(2025, 7, 5, 14), model="Boeing 737"),
+                       flight("SU4", "SVO", "AER", datetime(2025, 7, 1, 14, 30))])
+    refresh_reports(pool, db.pop_touched_hours(), "2025-07-01", "2025-07-02", 14, AIRPORTS)
+    assert rows(pool, "SELECT flight_hour, total_flights FROM hourly_flight_summary ORDER BY 1") == [
+        (datetime(2025, 7, 1, 14), 2), (datetime(2025, 7, 2, 14), 1)]
+    assert rows(pool, "SELECT COUNT(*) FROM daily_flight_summary WHERE flight_day = '2025-07-05'") == [(0,)]
+
+
+def test_report_queries_use_scheduled_time_indexes(pool, monkeypatch):
+    # с выключенным seq scan планировщик берёт индекс, только если условие по scheduled_time sargable
+    plans = []
+
+    class ExplainingCursor(extensions.cursor):
+        def execute(self, query, params=None):
+            if "FROM flights" in query:
+                super().execute("EXPLAIN " + query, params)
+                plans.append("\n".join(row[0] for row in self.fetchall()))
+            return super().execute(query, params)
+
+    connect = pool._connect
+
+    def explaining_connect():
+        conn = connect()
+        conn.cursor_factory = ExplainingCursor
+        with conn.cursor() as cur:
+            cur.execute("SET enable_seqscan = off")
+        conn.commit()
+        return conn
+
+    monkeypatch.setattr(pool, "_connect", explaining_connect)
+    HourlyFlightReport({}, pool=pool).get_hourly_summary(AIRPORTS, [8, 14], "2025-07-01", "2025-07-07")
+    FlightReport({}, pool=pool).refresh_days([date(2025, 7, 1)], AIRPORTS)
+    HourlyFlightReport({}, pool=pool).refresh_hours([datetime(2025, 7, 1, 14)], AIRPORTS)
+
+    assert len(plans) == 3
+    for plan in plans:
+        assert "Seq Scan on flights" not in plan
+        assert "scheduled_time_idx" in plan
@@ -0,0 +1,139 @@
+import json
+import time
+
+from app.data_parser.parser import FlightParser
+from app.data_parser.response_cache import ResponseCache
+
+
+def test_conditional_headers_come_from_stored_validators():
+    cache = ResponseCache(path=None)
+    key = ResponseCache.key("AER", "arrivals", 1)
+    assert cache.conditional_headers(key) == {}
+
+    cache.update(key, etag='"abc"', last_modified="Wed, 01 Jan 2025 00:00:00 GMT", total_pages=3)
+    assert cache.conditional_headers(key) == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Wed, 01 Jan 2025 00:00:00 GMT",
+    }
+    assert cache.get(key)["total_pages"] == 3
+
+
+def test_expired_entries_are_dropped():
+    cache = ResponseCache(path=None, ttl=60)
+    key = ResponseCache.key("AER", "arrivals", 1)
+    cache.update(key, etag='"abc"')
+    cache._entries[key]["stored_at"] = time.time() - 61
+
+    assert cache.get(key) is None
+    assert cache.conditional_headers(key) == {}
+    assert key not in cache._entries
+
+
+def test_cache_survives_save_and_load(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path, ttl=60)
+    cache.update("AER:arrivals:1", etag='"fresh"')
+    cache.update("AER:arrivals:2", etag='"stale"')
+    cache._entries["AER:arrivals:2"]["stored_at"] = time.time() - 61
+    cache.save()
+
+    reloaded = ResponseCache(path=path, ttl=60)
+    assert reloaded.get("AER:arrivals:1")["etag"] == '"fresh"'
+    assert reloaded.get("AER:arrivals:2") is None
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, etag=None):
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode() if payload is not None else b""
+        self.headers = {"ETag": etag} if etag else {}
+
+
+class FakeClient:
+    # payloads: {(аэропорт, направление): ответ}; ETag у каждого расписания свой, остальные расписания пустые
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.requests = []
+
+    def get(self, url, params=None, key=None, headers=None):
+        schedule = (params["code"], params["plugin-setting[schedule][mode]"])
+        etag = f'"{schedule[0]}-{schedule[1]}"'
+        self.requests.append(headers or {})
+        if headers and headers.get("If-None-Match") == etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.payloads.get(schedule, {}), etag)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.writes = []
+
+    def upsert_flights(self, flights):
+        self.writes.append(list(flights))
+        return {"inserted": len(flights), "updated": 0, "unchanged": 0}
+
+
+def schedule_payload(direction, origin, destination, status="Scheduled"):
+    flight = {"flight": {
+        "identification": {"number": {"default": "SU1120"}},
+        "airline": {"name": "Aeroflot"},
+        "airport": {"origin": {"code": {"iata": origin}}, "destination": {"code": {"iata": destination}}},
+        "time": {"scheduled": {"arrival": 1751371200, "departure": 1751360400}},
+        "status": {"text": status},
+        "aircraft": {"model": {"text": "Airbus A320"}},
+    }}
+    schedule = {direction: {"data": [flight], "page": {"current": 1, "total": 1}}}
+    return {"result": {"response": {"airport": {"pluginData": {"schedule": schedule}}}}}
+
+
+def test_page_with_only_skipped_flights_is_remembered():
+    # в режиме both вылет SVO -> AER уже записан со стороны прилёта, страница вылетов целиком пропускается
+    client = FakeClient({
+        ("AER", "arrivals"): schedule_payload("arrivals", "SVO", "AER"),
+        ("SVO", "departures"): schedule_payload("departures", "SVO", "AER"),
+    })
+    db = FakeDatabase()
+    parser = FlightParser(db, mode="both", tracked_airports=["SVO", "AER"], client=client,
+                          response_cache=ResponseCache(path=None), prefetch_pages=0)
+
+    assert parser.ingest_airport("AER", "arrivals").inserted == 1
+    first = parser.ingest_airport("SVO", "departures")
+    assert first.ok and first.skipped == 1 and first.cached == 0
+
+    second = parser.ingest_airport("SVO", "departures")
+    assert client.requests[2] == {"If-None-Match": '"SVO-departures"'}
+    assert second.ok and second.cached == 1
+    assert len(db.writes) == 1
+
+
+def test_save_writes_a_snapshot_taken_under_the_lock(tmp_path, monkeypatch):
+    from app.data_parser import response_cache as response_cache_module
+
+    path = tmp_path / "cache.json"
+    cache = ResponseCache(path=str(path))
+    cache.update("AER:arrivals:1", etag='"v1"')
+    dump = json.dump
+
+    def dump_while_worker_updates(obj, f):
+        # воркер обновляет запись, пока кэш пишется на диск
+        cache.update("AER:arrivals:1", etag='"v2"')
+        dump(obj, f)
+
+    monkeypatch.setattr(response_cache_module.json, "dump", dump_while_worker_updates)
+    cache.save()
+    assert json.loads(path.read_text())["AER:arrivals:1"]["etag"] == '"v1"'
+
+
+def test_unchanged_page_refreshes_the_entry():
+    client = FakeClient({("AER", "arrivals"): schedule_payload("arrivals", "SVO", "AER")})
+    cache = ResponseCache(path=None, ttl=60)
+    parser = FlightParser(FakeDatabase(), client=client, response_cache=cache, prefetch_pages=0)
+    key = ResponseCache.key("AER", "arrivals", 1)
+
+    parser.ingest_airport("AER", "arrivals")
+    cache._entries[key]["stored_at"] = time.time() - 50
+    assert parser.ingest_airport("AER", "arrivals").cached == 1
+
+    # 304 продлил запись: спустя ещё 50 с она жива и следующий опрос снова условный
+    assert time.time() - cache.get(key)["stored_at"] < 5
+    assert client.requests[-1] == {"If-None-Match": '"AER-arrivals"'}
@@ -0,0 +1,57 @@
+import numpy as np
+
+from app.data_digest.routes import (MAX_ARC_POINTS, MIN_ARC_POINTS, RouteGeometryCache, arc_point_counts,
+                                    great_circle_arcs, great_circle_distances)
+
+SVO = (55.972599, 37.4146)
+AER = (43.449902, 39.9566)
+PKC = (53.167889, 158.453669)  # Петропавловск-Камчатский
+ANC = (61.1744, -149.996002)   # Анкоридж
+
+
+def arcs(*routes):
+    starts = np.array([r[0] for r in routes], dtype=float)
+    ends = np.array([r[1] for r in routes], dtype=float)
+    counts = arc_point_counts(great_circle_distances(starts, ends))
+    return counts, np.split(great_circle_arcs(starts, ends, counts), np.cumsum(counts)[:-1])
+
+
+def test_distance_matches_known_route():
+    distance = great_circle_distances(np.array([SVO]), np.array([AER]))[0]
+    assert 1395 < distance < 1415
+
+
+def test_point_count_grows_with_distance_within_bounds():
+    counts = arc_point_counts(np.array([0.0, 50.0, 1390.0, 20000.0]))
+    assert counts.tolist() == [MIN_ARC_POINTS, MIN_ARC_POINTS, 15, MAX_ARC_POINTS]
+
+
+def test_arcs_start_and_end_at_airports():
+    counts, (short, long) = arcs((SVO, AER), (SVO, ANC))
+    assert len(short) == counts[0] and len(long) == counts[1] == MAX_ARC_POINTS
+    for points, (start, end) in ((short, (SVO, AER)), (long, (SVO, ANC))):
+        np.testing.assert_allclose(points[0], start, atol=1e-9)
+        np.testing.assert_allclose([points[-1][0], (points[-1][1] + 180) % 360 - 180], end, atol=1e-9)
+
+
+def test_arc_across_antimeridian_does_not_jump_over_the_map():
+    _, (east, west) = arcs((PKC, ANC), (ANC, PKC))
+    for points in (east, west):
+        assert np.abs(np.diff(points[:, 1])).max() < 10
+    # дуга продолжается за 180°, а не возвращается через всю карту к -150
+    assert east[-1][1] > 180 and west[-1][1] < -180
+
+
+def test_identical_endpoints_give_a_degenerate_arc():
+    _, (arc,) = arcs((SVO, SVO))
+    np.testing.assert_allclose(arc, [SVO, SVO], atol=1e-9)
+
+
+def test_cache_recomputes_route_when_airport_coordinates_change():
+    cache = RouteGeometryCache(None)
+    first = cache.get_many([("SVO", "AER")], {"SVO": SVO, "AER": AER})[("SVO", "AER")]
+    assert cache.get_many([("SVO", "AER")], {"SVO": SVO, "AER": AER})[("SVO", "AER")] is first
+
+    moved = cache.get_many([("SVO", "AER"), ("SVO", "XXX")], {"SVO": SVO, "AER": (43.5, 40.0), "XXX": None})
+    assert list(moved) == [("SVO", "AER")]
+    assert moved[("SVO", "AER")] is not first
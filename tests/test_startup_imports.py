@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / "benchmarks"))
+
+from bench_startup import TARGETS, eager_imports, import_profile  # noqa: E402
+
+
+@pytest.mark.parametrize("command", sorted(TARGETS))
+def test_subcommand_does_not_import_lazy_modules(command):
+    assert eager_imports(command, import_profile(TARGETS[command])) == []
+
+
+def test_metrics_server_and_profilers_still_work(tmp_path):
+    from urllib.request import urlopen
+
+    from app.metrics import MetricsRegistry, profile
+
+    registry = MetricsRegistry(enabled=True)
+    registry.inc("parsed_total", 3)
+    server = registry.serve(0, host="127.0.0.1")
+    try:
+        body = urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics").read().decode()
+    finally:
+        registry.shutdown()
+    assert "flights_parsed_total 3" in body
+
+    output = tmp_path / "stats.prof"
+    with profile("cprofile", str(output), top=3):
+        sum(range(1000))
+    assert output.exists()